@@ -2,8 +2,8 @@ from ._log import setup as setup_log
 from ._loop import setup as setup_loop
 from .cfg import global_config
 from .entrypoint import DEntryPoint, EntryPoint
-from .eventbus import DEventBus, EventBus
-from .protocols import Event
+from .eventbus import BrokerThread, DEventBus, EventBus, ShardedEventBus
+from .protocols import Event, QueueConfig
 from .registry import registry
 from .version import __version__
 from .wrapper import DataClassEvent, make_evented
@@ -13,8 +13,11 @@ setup_loop()
 
 __all__ = [
     "Event",
+    "QueueConfig",
     "EventBus",
     "DEventBus",
+    "BrokerThread",
+    "ShardedEventBus",
     "EntryPoint",
     "DEntryPoint",
     "registry",
@@ -1,5 +1,31 @@
 import json
-from typing import Callable, Dict, List, Optional, Type, TypeVar, Union
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import is_dataclass
+from pydoc import locate
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
+
+from .compressors import Compressor, LzmaCompressor, ZlibCompressor, lzma
+from .dataclass_codec import DataclassCodec, compile_dataclass
+from .serializers import JsonSerializer, MsgpackSerializer, Serializer, msgpack
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore
 
 T = TypeVar("T")
 
@@ -9,17 +35,118 @@ T = TypeVar("T")
 
 Json = Union[dict, Dict, list, List, str, int, float, bool, None]
 
-SFunction = Callable[[Type[T]], bytes]
-DFunction = Callable[[bytes], T]
+# Codecs can split the payload into multiple frames (i.e. metadata + buffer)
+Frames = Union[bytes, List[bytes]]
+SFunction = Callable[[Type[T]], Frames]
+DFunction = Callable[[Frames], T]
+
+
+def encode_ndarray(x: Any) -> List[Any]:
+    """Encode a NumPy array into a metadata frame and a raw buffer frame
+
+    Args:
+        x (np.ndarray): Array to encode
+
+    Raises:
+        ValueError: If the array holds Python objects
+
+    Returns:
+        List[Any]: Metadata (dtype, shape, strides) and the array's buffer
+
+    """
+    if x.dtype.hasobject:
+        raise ValueError("Cannot encode ndarray with object dtype")
+
+    # Only non-contiguous arrays are copied, others send their own memory
+    if not (x.flags.c_contiguous or x.flags.f_contiguous):
+        x = np.ascontiguousarray(x)
+    meta = {"dtype": x.dtype.str, "shape": x.shape, "strides": x.strides}
+    return [json.dumps(meta).encode("utf-8"), x.ravel(order="K").view(np.uint8).data]
+
+
+def decode_ndarray(x: List[Any]) -> Any:
+    """Decode a NumPy array from its metadata and buffer frames, without copying
+
+    Args:
+        x (List[Any]): Metadata and buffer frames
+
+    Returns:
+        np.ndarray: Read-only array backed by the received buffer
+
+    """
+    [meta_frame, buffer] = x
+    meta = json.loads(str(meta_frame, "utf-8"))
+    flat = np.frombuffer(buffer, dtype=np.dtype(meta["dtype"]))
+    return np.lib.stride_tricks.as_strided(
+        flat, shape=meta["shape"], strides=meta["strides"], writeable=False
+    )
+
+
+class CompressionThresholds(MutableMapping[str, Optional[int]]):
+    """Compression thresholds per exact topic or wildcard pattern
+
+    The wildcard patterns are sorted (most specific first) and matched
+    against each topic only once, until the thresholds are changed.
+
+    Attributes:
+        matches (Dict[str, Optional[str]]): Most specific pattern of each
+            topic (None if no pattern), cached by ``compression_threshold``
+        size (int): Maximum number of cached topics
+
+    """
+
+    size: int = 1024
+
+    def __init__(self, thresholds: Optional[Dict[str, Optional[int]]] = None):
+        self._thresholds: Dict[str, Optional[int]] = dict(thresholds or {})
+        self._patterns: Optional[List[str]] = None
+        self.matches: Dict[str, Optional[str]] = {}
+
+    @property
+    def patterns(self) -> List[str]:
+        """Wildcard patterns, the most specific first"""
+        if self._patterns is None:
+            patterns = [x for x in self._thresholds if "*" in x]
+            self._patterns = sorted(patterns, key=len, reverse=True)
+        return self._patterns
+
+    def _changed(self):
+        self._patterns = None
+        self.matches.clear()
+
+    def __getitem__(self, key: str) -> Optional[int]:
+        return self._thresholds[key]
+
+    def __setitem__(self, key: str, value: Optional[int]):
+        self._thresholds[key] = value
+        self._changed()
+
+    def __delitem__(self, key: str):
+        del self._thresholds[key]
+        self._changed()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._thresholds)
+
+    def __len__(self) -> int:
+        return len(self._thresholds)
+
+    def __repr__(self) -> str:
+        return repr(self._thresholds)
 
 
 class _GlobalConfig:
     """Global configuration for serialization and deserialization
 
+    JSON-like data and ``DataClassJsonMixin`` payloads are (de)serialized by
+    a serializer backend (``json`` by default, ``msgpack`` if installed and selected).
+
     Examples:
         >>> from aiodistbus import cfg
         >>> cfg.global_config.encoders[pathlib.Path] = lambda x: str(x).encode()
         >>> cfg.global_config.decoders[pathlib.Path] = lambda x: pathlib.Path(x.decode())
+        >>> cfg.global_config.serializer = "msgpack"
+        >>> cfg.global_config.compression_thresholds["telemetry.*"] = 256
 
     """
 
@@ -27,19 +154,315 @@ class _GlobalConfig:
         self.encoders: Dict[Union[Type, Optional[Type]], SFunction[Type]] = {
             str: lambda x: x.encode("utf-8"),
             bytes: lambda x: x,
-            Json: lambda x: json.dumps(x).encode("utf-8"),
+            bytearray: lambda x: x,
+            memoryview: lambda x: x,
         }
+        # Decoders can receive any buffer (i.e. a memoryview of a zmq.Frame)
         self.decoders: Dict[Union[Type, Optional[Type]], DFunction[Type]] = {
-            str: lambda x: x.decode(),
-            bytes: lambda x: x,
-            Json: lambda x: json.loads(x.decode()),
+            str: lambda x: str(x, "utf-8"),
+            bytes: lambda x: bytes(x),
+            bytearray: lambda x: bytearray(x),
+            memoryview: lambda x: memoryview(x),
         }
 
-    def get_encoder(self, dtype: Union[Type, Optional[Type]]) -> SFunction[Type]:
+        # Serializer backends
+        self.serializer: str = "json"
+        self.serializers: Dict[str, Serializer] = {}
+        self._serializer_ids: Dict[int, Serializer] = {}
+        self.register_serializer(JsonSerializer())
+
+        # Compression backends, only applied to payloads above the threshold
+        # of their topic (exact topic or wildcard pattern, None to disable)
+        self.compression_threshold: int = 1024
+        self._compression_thresholds = CompressionThresholds()
+        self.compressors: Dict[str, Compressor] = {}
+        self._compressor_ids: Dict[int, Compressor] = {}
+        self.register_compressor(ZlibCompressor())
+        if lzma is not None:
+            self.register_compressor(LzmaCompressor())
+
+        # Optional codecs
+        if np is not None:
+            self.encoders[np.ndarray] = encode_ndarray
+            self.decoders[np.ndarray] = decode_ndarray
+        if msgpack is not None:
+            self.register_serializer(MsgpackSerializer())
+
+        # Codecs of a fresh interpreter, the only ones of the process pool
+        self._builtin_codecs: List[Any] = [
+            *self.decoders.values(),
+            *self.serializers.values(),
+            *self.compressors.values(),
+        ]
+
+        # Compiled dataclass codecs, built on first use
+        self._dataclass_codecs: Dict[Type, DataclassCodec] = {}
+
+        # Cache of dtype strings (i.e. "builtins.int") to types, None if unknown
+        self.dtype_cache_size: int = 1024
+        self._dtypes: OrderedDict[str, Optional[Type]] = OrderedDict()
+        for dtype in [*self.encoders, *Json.__args__]:  # type: ignore[attr-defined]
+            self.register_dtype(dtype)
+
+        # Shared executor of the "thread" handlers, created on first use
+        self.thread_pool_size: Optional[int] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # Shared executor of the "process" handlers, created on first use
+        self.process_pool_size: Optional[int] = None
+        self._process_executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def compression_thresholds(self) -> CompressionThresholds:
+        """Compression thresholds per exact topic or wildcard pattern"""
+        return self._compression_thresholds
+
+    @compression_thresholds.setter
+    def compression_thresholds(self, thresholds: Dict[str, Optional[int]]):
+        self._compression_thresholds = CompressionThresholds(thresholds)
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        """Get the thread pool shared by the handlers with the "thread" mode
+
+        Created on first use, with ``thread_pool_size`` workers (None for the
+        ``ThreadPoolExecutor`` default).
+
+        Returns:
+            ThreadPoolExecutor: Shared executor
+
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.thread_pool_size, thread_name_prefix="aiodistbus"
+            )
+        return self._executor
+
+    def set_executor(self, executor: Optional[ThreadPoolExecutor]):
+        """Replace the shared thread pool (the previous one is not shut down)
+
+        Args:
+            executor (Optional[ThreadPoolExecutor]): Executor to use, None to
+                create a new one on next use
+
+        """
+        self._executor = executor
+
+    def get_process_executor(self) -> ProcessPoolExecutor:
+        """Get the process pool shared by the handlers with the "process" mode
+
+        Created on first use, with ``process_pool_size`` workers (None for the
+        ``ProcessPoolExecutor`` default). The workers are spawned rather than
+        forked, as the event loop and the zmq context are not fork-safe.
+
+        Returns:
+            ProcessPoolExecutor: Shared executor
+
+        """
+        if self._process_executor is None:
+            self._process_executor = ProcessPoolExecutor(
+                self.process_pool_size,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._process_executor
+
+    def set_process_executor(self, executor: Optional[ProcessPoolExecutor]):
+        """Replace the shared process pool (the previous one is not shut down)
+
+        Args:
+            executor (Optional[ProcessPoolExecutor]): Executor to use, None to
+                create a new one on next use
+
+        """
+        self._process_executor = executor
+
+    def is_builtin_decoding(
+        self, dtype: Optional[Type], serializer: int, compressor: int = 0
+    ) -> bool:
+        """Check if data can be decoded by the workers of the process pool
+
+        The workers are spawned, so they only have the built-in codecs, and
+        not the ones registered (or replaced) since.
+
+        Args:
+            dtype (Optional[Type]): Type to decode to, None for raw data
+            serializer (int): Id of the serializer backend
+            compressor (int, optional): Id of the compressor. Defaults to 0
+                (not compressed).
+
+        Returns:
+            bool: True if only relying on built-in codecs
+
+        """
+        try:
+            codecs: List[Any] = [
+                self.get_serializer(serializer),
+                self.get_compressor(compressor),
+            ]
+        except ValueError:
+            return False
+        json_like = dtype in Json.__args__  # type: ignore
+        if dtype in self.decoders and not json_like:
+            codecs.append(self.decoders[dtype])
+        elif not (dtype is None or json_like or is_dataclass(dtype)):
+            return False
+        return all(
+            any(c is b for b in self._builtin_codecs) for c in codecs if c is not None
+        )
+
+    def get_dataclass_codec(self, dtype: Type) -> DataclassCodec:
+        """Get the codec of a dataclass, compiling it the first time it is used
+
+        Args:
+            dtype (Type): Dataclass type
+
+        Returns:
+            DataclassCodec: Converter to/from JSON-like data
+
+        """
+        codec = self._dataclass_codecs.get(dtype)
+        if codec is None:
+            codec = self._dataclass_codecs[dtype] = compile_dataclass(dtype)
+        return codec
+
+    def register_dtype(self, dtype: Type):
+        """Register a type, so its dtype string is resolved without an import
+
+        Types that are not importable (i.e. defined within a function) can
+        only be resolved once registered. Handlers' dtypes are registered
+        automatically. Typing aliases (i.e. ``List``) are skipped, as the
+        dtype strings of the events are the ones of their classes.
+
+        Args:
+            dtype (Type): Type to register
+
+        """
+        if not isinstance(dtype, type):
+            return
+        self._cache_dtype(f"{dtype.__module__}.{dtype.__name__}", dtype)
+
+    def _cache_dtype(self, dtype_str: str, dtype: Optional[Type]):
+        self._dtypes[dtype_str] = dtype
+        self._dtypes.move_to_end(dtype_str)
+        while len(self._dtypes) > self.dtype_cache_size:
+            self._dtypes.popitem(last=False)
+
+    def locate_dtype(self, dtype_str: str) -> Type:
+        """Resolve a dtype string to its type
+
+        Registered and previously resolved types are cached. Otherwise, the
+        type is located by its import path only once: unknown dtypes are
+        cached too and fail immediately afterwards.
+
+        Args:
+            dtype_str (str): dtype string (i.e. "builtins.int")
+
+        Raises:
+            ValueError: If the type cannot be located
+
+        Returns:
+            Type: Resolved type
+
+        """
+        if dtype_str in self._dtypes:
+            self._dtypes.move_to_end(dtype_str)
+            dtype = self._dtypes[dtype_str]
+        else:
+            located = locate(dtype_str)
+            dtype = located if isinstance(located, type) else None
+            self._cache_dtype(dtype_str, dtype)
+
+        if dtype is None:
+            raise ValueError(f"Unknown dtype: {dtype_str}")
+        return dtype
+
+    def register_serializer(self, serializer: Serializer):
+        """Register a serializer backend
+
+        Args:
+            serializer (Serializer): Serializer backend
+
+        Raises:
+            ValueError: If the serializer's id is already in use
+
+        """
+        if serializer.id in self._serializer_ids:
+            raise ValueError(f"Serializer id {serializer.id} already registered")
+        self.serializers[serializer.name] = serializer
+        self._serializer_ids[serializer.id] = serializer
+
+    def get_serializer(self, key: Union[str, int, None] = None) -> Serializer:
+        """Get serializer backend by name or id
+
+        Args:
+            key (Union[str, int, None], optional): Name or id of the serializer.
+                Defaults to None (the default serializer).
+
+        Raises:
+            ValueError: If serializer not found
+
+        Returns:
+            Serializer: Serializer backend
+
+        """
+        if key is None:
+            key = self.serializer
+        serializer = (
+            self._serializer_ids.get(key)
+            if isinstance(key, int)
+            else self.serializers.get(key)
+        )
+        if serializer is None:
+            raise ValueError(f"Serializer not found for {key}")
+        return serializer
+
+    def register_compressor(self, compressor: Compressor):
+        """Register a compression backend
+
+        Args:
+            compressor (Compressor): Compression backend
+
+        Raises:
+            ValueError: If the compressor's id is already in use (or reserved)
+
+        """
+        if compressor.id in self._compressor_ids or not 0 < compressor.id < 16:
+            raise ValueError(f"Compressor id {compressor.id} not available")
+        self.compressors[compressor.name] = compressor
+        self._compressor_ids[compressor.id] = compressor
+
+    def get_compressor(self, key: Union[str, int]) -> Optional[Compressor]:
+        """Get compression backend by name or id
+
+        Args:
+            key (Union[str, int]): Name or id of the compressor
+
+        Raises:
+            ValueError: If compressor not found
+
+        Returns:
+            Optional[Compressor]: Compression backend, None for "none" (or 0)
+
+        """
+        if key in ("none", 0):
+            return None
+        compressor = (
+            self._compressor_ids.get(key)
+            if isinstance(key, int)
+            else self.compressors.get(key)
+        )
+        if compressor is None:
+            raise ValueError(f"Compressor not found for {key}")
+        return compressor
+
+    def get_encoder(
+        self, dtype: Union[Type, Optional[Type]], serializer: Optional[str] = None
+    ) -> SFunction[Type]:
         """Get encoder for type
 
         Args:
             dtype (Union[Type, Optional[Type]]): Type to encode
+            serializer (Optional[str], optional): Serializer backend for
+                JSON-like data. Defaults to None (the default serializer).
 
         Raises:
             ValueError: If encoder not found
@@ -49,17 +472,23 @@ class _GlobalConfig:
 
         """
         if dtype in Json.__args__:  # type: ignore
-            return self.encoders[Json]  # type: ignore
+            return self.get_serializer(serializer).dumps
         elif dtype in self.encoders:
             return self.encoders[dtype]
         else:
             raise ValueError(f"Encoder not found for {dtype}")
 
-    def get_decoder(self, dtype: Union[Type, Optional[Type]]) -> DFunction[Type]:
+    def get_decoder(
+        self,
+        dtype: Union[Type, Optional[Type]],
+        serializer: Union[str, int, None] = None,
+    ) -> DFunction[Type]:
         """Get decoder for type
 
         Args:
             dtype (Union[Type, Optional[Type]]): Type to decode
+            serializer (Union[str, int, None], optional): Serializer backend for
+                JSON-like data. Defaults to None (the default serializer).
 
         Raises:
             ValueError: If decoder not found
@@ -69,7 +498,8 @@ class _GlobalConfig:
 
         """
         if dtype in Json.__args__:  # type: ignore
-            return self.decoders[Json]  # type: ignore
+            # JSON-like data is always a single frame
+            return cast(DFunction[Type], self.get_serializer(serializer).loads)
         elif dtype in self.decoders:
             return self.decoders[dtype]
         else:
@@ -86,4 +516,18 @@ global_config = _GlobalConfig()
 EVENT_BLACKLIST = [
     "aiodistbus.eventbus.close",
     "aiodistbus.eventbus.pulse",
+    "aiodistbus.eventbus.capabilities",
+    "aiodistbus.eventbus.subscriptions",
 ]
+
+########################################################################
+## Handler Execution
+########################################################################
+
+# "inline" runs sync handlers on the event loop, "thread" in the shared
+# executor (see ``global_config.get_executor``) and "process" in the shared
+# process pool (see ``global_config.get_process_executor``)
+HANDLER_MODES = ["inline", "thread", "process"]
+
+# What a full handler queue does with a new event (see ``QueueConfig``)
+OVERFLOW_POLICIES = ["block", "drop_oldest", "drop_newest", "error"]
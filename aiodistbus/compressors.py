@@ -0,0 +1,70 @@
+import zlib
+from abc import ABC, abstractmethod
+
+from .protocols import CompressionStats
+
+try:
+    import lzma
+except ImportError:
+    lzma = None  # type: ignore
+
+
+class Compressor(ABC):
+    """Compression backend for payload frames
+
+    Each backend has a unique ``id`` (sent in the header flags, 0 meaning not
+    compressed) and ``name`` (used to select it in ``DEventBus`` and
+    ``DEntryPoint``). Its ``stats`` count the processed bytes and CPU time.
+
+    """
+
+    id: int
+    name: str
+    priority: int = 0
+
+    def __init__(self):
+        self.stats = CompressionStats()
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        ...
+
+    @abstractmethod
+    def decompress(self, data: bytes) -> bytes:
+        ...
+
+
+class ZlibCompressor(Compressor):
+    """Fast general purpose compression, using the standard library's ``zlib``"""
+
+    id = 1
+    name = "zlib"
+    priority = 10
+
+    def __init__(self, level: int = 1):
+        super().__init__()
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class LzmaCompressor(Compressor):
+    """Slower but denser compression, using the standard library's ``lzma``"""
+
+    id = 2
+    name = "lzma"
+    priority = 5
+
+    def __init__(self, preset: int = 1):
+        super().__init__()
+        self.preset = preset
+
+    def compress(self, data: bytes) -> bytes:
+        return lzma.compress(data, preset=self.preset)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lzma.decompress(data)
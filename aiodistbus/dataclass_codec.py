@@ -0,0 +1,172 @@
+from dataclasses import dataclass, fields, is_dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+    get_type_hints,
+)
+
+# Converter between a value and its JSON-like form (None if no-op)
+Converter = Optional[Callable[[Any], Any]]
+
+PRIMITIVES = (str, int, float, bool, type(None))
+
+
+class UnsupportedType(TypeError):
+    pass
+
+
+@dataclass
+class DataclassCodec:
+    """Specialized conversion of a dataclass to/from JSON-like data
+
+    Attributes:
+        encode (Callable[[Any], Any]): Dataclass instance -> JSON-like dict
+        decode (Callable[[Any], Any]): JSON-like dict -> dataclass instance
+        compiled (bool): False if fell back to ``to_dict``/``from_dict``
+
+    """
+
+    encode: Callable[[Any], Any]
+    decode: Callable[[Any], Any]
+    compiled: bool = True
+
+
+def compile_dataclass(dtype: Type) -> DataclassCodec:
+    """Build a codec for a dataclass, resolving its fields' types only once
+
+    Supports nested dataclasses, ``List``, ``Dict`` (with ``str`` keys),
+    ``Optional`` and ``Any`` fields of JSON-like types. Other types, or
+    dataclasses_json configurations (i.e. letter case or field overrides),
+    fall back to ``DataClassJsonMixin.to_dict``/``from_dict``.
+
+    Args:
+        dtype (Type): Dataclass to compile
+
+    Raises:
+        UnsupportedType: If the dataclass cannot be compiled and has no
+            ``DataClassJsonMixin`` fallback
+
+    Returns:
+        DataclassCodec: Codec for the dataclass
+
+    """
+    try:
+        encode, decode = _compile_dataclass(dtype, {})
+        return DataclassCodec(encode, decode)
+    except UnsupportedType:
+        if not hasattr(dtype, "from_dict"):
+            raise
+        return DataclassCodec(
+            lambda x: x.to_dict(encode_json=True), dtype.from_dict, False
+        )
+
+
+def _compile(dtype: Any, seen: Dict[Type, List]) -> Tuple[Converter, Converter]:
+    if dtype in PRIMITIVES:
+        return None, None
+    if dtype is Any:
+        return _encode_any, None
+    if isinstance(dtype, type) and is_dataclass(dtype):
+        if dtype in seen:
+            # Recursive dataclasses refer to the codec being compiled
+            codec = seen[dtype]
+            return (lambda x: codec[0](x)), (lambda x: codec[1](x))
+        return _compile_dataclass(dtype, seen)
+
+    origin = getattr(dtype, "__origin__", None)
+    args = getattr(dtype, "__args__", ())
+    if dtype is list or origin is list:
+        enc, dec = _compile(args[0], seen) if args else (_encode_any, None)
+        return _list(enc), _list(dec)
+    if dtype is dict or origin is dict:
+        if args and args[0] is not str:
+            raise UnsupportedType(f"Unsupported key type: {dtype}")
+        enc, dec = _compile(args[1], seen) if args else (_encode_any, None)
+        return _dict(enc), _dict(dec)
+    if origin is Union:
+        options = [x for x in args if x is not type(None)]
+        if len(options) != 1:
+            raise UnsupportedType(f"Unsupported Union: {dtype}")
+        enc, dec = _compile(options[0], seen)
+        return _optional(enc), _optional(dec)
+
+    raise UnsupportedType(f"Unsupported type: {dtype}")
+
+
+def _compile_dataclass(
+    dtype: Type, seen: Dict[Type, List]
+) -> Tuple[Callable[[Any], Any], Callable[[Any], Any]]:
+    if getattr(dtype, "dataclass_json_config", None):
+        raise UnsupportedType(f"Configured dataclass: {dtype}")
+    codec = seen[dtype] = [None, None]
+
+    hints = _type_hints(dtype)
+    names: List[str] = []
+    encoders: List[Tuple[str, Converter]] = []
+    decoders: List[Tuple[str, Callable]] = []
+    for f in fields(dtype):
+        if not f.init or "dataclasses_json" in f.metadata:
+            raise UnsupportedType(f"Unsupported field: {dtype.__name__}.{f.name}")
+        enc, dec = _compile(hints[f.name], seen)
+        names.append(f.name)
+        encoders.append((f.name, enc))
+        if dec:
+            decoders.append((f.name, dec))
+
+    def encode(obj: Any) -> Dict[str, Any]:
+        data = {}
+        for name, enc in encoders:
+            value = getattr(obj, name)
+            data[name] = value if enc is None else enc(value)
+        return data
+
+    def decode(data: Dict[str, Any]) -> Any:
+        kwargs = {name: data[name] for name in names if name in data}
+        for name, dec in decoders:
+            if name in kwargs:
+                kwargs[name] = dec(kwargs[name])
+        return dtype(**kwargs)
+
+    codec[:] = [encode, decode]
+    return encode, decode
+
+
+def _type_hints(dtype: Type) -> Dict[str, Any]:
+    try:
+        return get_type_hints(dtype)
+    except NameError as e:
+        raise UnsupportedType(f"Unresolved type: {e}") from e
+
+
+def _list(conv: Converter) -> Converter:
+    if conv is None:
+        return None
+    return lambda x: [conv(v) for v in x]
+
+
+def _dict(conv: Converter) -> Converter:
+    if conv is None:
+        return None
+    return lambda x: {k: conv(v) for k, v in x.items()}
+
+
+def _optional(conv: Converter) -> Converter:
+    if conv is None:
+        return None
+    return lambda x: None if x is None else conv(x)
+
+
+def _encode_any(x: Any) -> Any:
+    if is_dataclass(x) and not isinstance(x, type):
+        return {f.name: _encode_any(getattr(x, f.name)) for f in fields(x)}
+    if isinstance(x, (list, tuple)):
+        return [_encode_any(v) for v in x]
+    if isinstance(x, dict):
+        return {k: _encode_any(v) for k, v in x.items()}
+    return x
@@ -1,18 +1,50 @@
 import asyncio
+import functools
 import logging
+import pickle
+import time
 import uuid
 from abc import ABC, abstractmethod
 from collections import deque
-from typing import Any, Callable, Coroutine, Dict, List, Optional, Type
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Set, Tuple, Type
 
+from ..cfg import HANDLER_MODES, OVERFLOW_POLICIES, global_config
+from ..handler_queue import HandlerQueue
 from ..partial_func import create_async_callable, create_callable
-from ..protocols import Event, Handler
+from ..protocols import (
+    Event,
+    Handler,
+    HandlerStats,
+    Header,
+    LazyEvent,
+    QueueConfig,
+    QueueStats,
+)
 from ..registry import Registry
-from ..utils import safe_coro
+from ..router import TopicRouter
+from ..utils import COMPRESSION_MASK, reconstruct_payload, safe_coro
 
 logger = logging.getLogger("aiodistbus")
 
 
+def _process_call(
+    func: Callable,
+    unpack: bool,
+    dtype: Optional[Type],
+    event: Event,
+    encoded: Optional[Tuple[Header, List[bytes], Optional[Type]]],
+) -> Any:
+    # Runs in a worker of the process pool, where the data is decoded
+    if encoded is not None:
+        event.data = reconstruct_payload(*encoded)
+    if not unpack:
+        return func(event)
+    elif type(event.data) is not type(None) and dtype:
+        return func(event.data)
+    else:
+        return func()
+
+
 class AEntryPoint(ABC):
     def __init__(self):
         """Abstract entrypoint for eventbus"""
@@ -21,11 +53,23 @@ class AEntryPoint(ABC):
         self.id = str(uuid.uuid4())
         self._handlers: Dict[str, Handler] = {}
         self._wildcards: Dict[str, Handler] = {}
+        self._wildcard_router = TopicRouter()
         self._received: deque[str] = deque(maxlen=1000)
-        self._tasks: List[asyncio.Task] = []
+        self._tasks: Set[asyncio.Task] = set()
+        self._queues: Dict[str, HandlerQueue] = {}
+
+        # Latency of the sync handlers, per execution mode
+        self.handler_stats: Dict[str, HandlerStats] = {
+            mode: HandlerStats() for mode in HANDLER_MODES
+        }
 
     def _wrapper(
-        self, func: Callable, unpack: bool = True, create_task: bool = False
+        self,
+        func: Callable,
+        unpack: bool = True,
+        create_task: bool = False,
+        mode: str = "inline",
+        emit_result: Optional[str] = None,
     ) -> Callable:
         """Wrapper for handlers
 
@@ -35,11 +79,26 @@ class AEntryPoint(ABC):
             func (Callable): Function to wrap
             unpack (bool, optional): Unpack the event. Defaults to True.
             create_task (bool, optional): Create a task for the handler. Defaults to False.
+            mode (str, optional): Execution mode of sync functions. Defaults to "inline".
+            emit_result (Optional[str], optional): Event type of the results of
+                "process" functions. Defaults to None.
 
         Returns:
             Callable: Wrapped function
 
         """
+        # Select according to function type
+        if asyncio.iscoroutinefunction(func):
+            return self._async_wrapper(func, unpack, create_task)
+        elif mode == "process":
+            return self._process_wrapper(func, unpack, emit_result)
+        else:
+            return self._sync_wrapper(func, unpack, mode)
+
+    def _async_wrapper(
+        self, func: Callable, unpack: bool = True, create_task: bool = False
+    ) -> Callable:
+
         # Wrapper for async functions
         async def awrapper(event: Event):
             coro: Optional[Coroutine] = None
@@ -60,15 +119,22 @@ class AEntryPoint(ABC):
                     coro, f"Error in (type: {event.type}, handler {func.__name__})"
                 )
                 if create_task:
-                    self._tasks.append(asyncio.create_task(scoro))
+                    task = asyncio.create_task(scoro)
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
                 else:
                     await scoro
 
             self._received.append(event.id)
 
-        # Wrapper for sync functions
-        async def wrapper(event: Event):
+        return awrapper
 
+    def _sync_wrapper(
+        self, func: Callable, unpack: bool = True, mode: str = "inline"
+    ) -> Callable:
+        stats = self.handler_stats[mode]
+
+        def call(event: Event) -> bool:
             try:
                 if unpack:
                     if (
@@ -84,14 +150,120 @@ class AEntryPoint(ABC):
                 logger.error(
                     f"Error in handler (type: {event.type}, handler {func.__name__}): {e}"
                 )
+                return False
+            return True
 
-            self._received.append(event.id)
+        # Wrapper for sync functions, run inline by the buses
+        def wrapper(event: Event):
+            tic = time.perf_counter()
+            self._record(stats, event, tic, call(event))
 
-        # Select according to function type
-        if asyncio.iscoroutinefunction(func):
-            return awrapper
-        else:
-            return wrapper
+        # Or in the shared thread pool, not blocking the event loop
+        async def thread_wrapper(event: Event):
+            tic = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            ok = await loop.run_in_executor(global_config.get_executor(), call, event)
+            self._record(stats, event, tic, ok)
+
+        return thread_wrapper if mode == "thread" else wrapper
+
+    def _process_wrapper(
+        self, func: Callable, unpack: bool = True, emit_result: Optional[str] = None
+    ) -> Callable:
+        stats = self.handler_stats["process"]
+        name = getattr(func, "__name__", repr(func))
+
+        async def process_wrapper(event: Event):
+            dtype = self._handlers[event.type].dtype if unpack else None
+
+            # Still encoded data is sent as is, instead of pickling the objects,
+            # unless its codecs are only registered in this process
+            tic = time.perf_counter()
+            encoded = self._worker_encoded(event, dtype)
+            try:
+                data = None if encoded else event.data
+                remote = Event(event.type, data, event.dtype, event.id, event.timestamp)
+                loop = asyncio.get_running_loop()
+                executor = global_config.get_process_executor()
+                result = await loop.run_in_executor(
+                    executor, _process_call, func, unpack, dtype, remote, encoded
+                )
+            except Exception as e:
+                logger.error(
+                    f"Error in handler (type: {event.type}, handler {name}): {e}"
+                )
+                self._record(stats, event, tic, False)
+                return
+            self._record(stats, event, tic, True)
+
+            if emit_result and result is not None:
+                await self.emit(emit_result, result)
+
+        return process_wrapper
+
+    def _worker_encoded(
+        self, event: Event, dtype: Optional[Type]
+    ) -> Optional[Tuple[Header, List[bytes], Optional[Type]]]:
+        if not isinstance(event, LazyEvent) or event.encoded is None:
+            return None
+        h, payload = event.encoded
+        if not dtype and h.dtype and h.dtype != "builtins.NoneType":
+            try:
+                dtype = global_config.locate_dtype(h.dtype)
+            except ValueError:
+                return None
+        if not global_config.is_builtin_decoding(
+            dtype, h.serializer, h.flags & COMPRESSION_MASK
+        ):
+            return None
+        return h, [bytes(p) for p in payload], dtype
+
+    def _record(self, stats: HandlerStats, event: Event, tic: float, ok: bool):
+        latency = time.perf_counter() - tic
+        stats.calls += 1
+        stats.errors += not ok
+        stats.total_time += latency
+        stats.max_time = max(stats.max_time, latency)
+        self._received.append(event.id)
+
+    def _check_handler(
+        self,
+        func: Callable,
+        mode: str,
+        emit_result: Optional[str],
+        create_task: bool,
+        queue: Optional[QueueConfig],
+    ):
+        if mode not in HANDLER_MODES:
+            raise ValueError(f"Unknown handler mode: {mode}")
+        if mode != "inline" and asyncio.iscoroutinefunction(func):
+            raise ValueError(f"Async handlers can only run inline: {func.__name__}")
+        if emit_result and mode != "process":
+            raise ValueError("Only the results of process handlers are emitted")
+        if mode == "process":
+            try:
+                pickle.dumps(func)
+            except Exception as e:
+                raise ValueError(f"Process handlers must be picklable: {e}") from e
+        if queue:
+            if create_task:
+                raise ValueError("Queued handlers can't create a task per event")
+            if queue.overflow not in OVERFLOW_POLICIES:
+                raise ValueError(f"Unknown overflow policy: {queue.overflow}")
+            if queue.size < 1 or queue.workers < 1:
+                raise ValueError("Queues need a positive size and number of workers")
+
+    def _open_queues(self):
+        for queue in self._queues.values():
+            queue.open()
+
+    async def _close_queues(self):
+        # Kept, as the handlers still refer to them when reconnecting
+        for queue in self._queues.values():
+            await queue.close()
+        for task in self._tasks:
+            if task is not asyncio.current_task():
+                task.cancel()
 
     @abstractmethod
     async def _update_handlers(
@@ -125,14 +297,23 @@ class AEntryPoint(ABC):
 
         # Obtain the handlers
         for event_type, handler in registry.get_handlers(namespace).items():
-            # Create a partial function
-            if asyncio.iscoroutinefunction(handler.function):
+            # Create a partial function (picklable for the process pool)
+            if handler.mode == "process":
+                partial_func = functools.partial(handler.function, *b_args, **b_kwargs)
+            elif asyncio.iscoroutinefunction(handler.function):
                 # partial_func = AsyncPartialFunc(handler.function, *args, **kwargs)
                 partial_func = create_async_callable(handler.function, b_args, b_kwargs)
             else:
                 # partial_func = PartialFunc(handler.function, *args, **kwargs)
                 partial_func = create_callable(handler.function, b_args, b_kwargs)
-            await self.on(event_type, partial_func, handler.dtype)
+            await self.on(
+                event_type,
+                partial_func,
+                handler.dtype,
+                mode=handler.mode,
+                emit_result=handler.emit_result,
+                queue=handler.queue,
+            )
 
     async def on(
         self,
@@ -141,6 +322,9 @@ class AEntryPoint(ABC):
         dtype: Optional[Type] = None,
         create_task: bool = False,
         unpack: bool = True,
+        mode: str = "inline",
+        emit_result: Optional[str] = None,
+        queue: Optional[QueueConfig] = None,
     ):
         """Register a handler
 
@@ -149,6 +333,28 @@ class AEntryPoint(ABC):
             func (Callable): Function to call
             dtype (Optional[Type], optional): Data type. Defaults to None.
             create_task (bool, optional): Create a task for the handler. Defaults to False.
+            unpack (bool, optional): Call the handler with the event's data, instead
+                of the event. Without it, the data is only decoded when accessed.
+                Defaults to True.
+            mode (str, optional): Execution mode of a sync handler: "inline" (on
+                the event loop), "thread" (in ``global_config.get_executor()``,
+                for blocking handlers) or "process" (in
+                ``global_config.get_process_executor()``, for CPU-bound and
+                picklable handlers, the data is decoded in the worker). Their
+                latency is tracked per mode in ``handler_stats``. Defaults to
+                "inline".
+            emit_result (Optional[str], optional): Emit the results of a
+                "process" handler (unless None) as events of this type.
+                Defaults to None.
+            queue (Optional[QueueConfig], optional): Deliver the events through a
+                bounded queue, consumed by ``queue.workers`` workers, with ordered
+                delivery per topic and an overflow policy. Its depth and drops
+                are tracked in ``queue_stats``. Defaults to None (the handler is
+                called by the bus).
+
+        Raises:
+            ValueError: If the mode is unknown, not "inline" for an async handler,
+                the handler can't run in the process pool or the queue is invalid
 
         Examples:
             >>> from aiodistbus import AEntryPoint
@@ -159,15 +365,33 @@ class AEntryPoint(ABC):
             >>> await ep.on("test", test_handler)
 
         """
+        self._check_handler(func, mode, emit_result, create_task, queue)
+
+        # Known dtypes are resolved without locating them
+        if dtype:
+            global_config.register_dtype(dtype)
+
+        # Wildcard handlers are called with the event
+        if "*" in event_type:
+            unpack = False
+        wrapped_func = self._wrapper(func, unpack, create_task, mode, emit_result)
+
+        # Replace the queue of a previous handler
+        if event_type in self._queues:
+            await self._queues.pop(event_type).close()
+        if queue:
+            self._queues[event_type] = HandlerQueue(wrapped_func, queue)
+            wrapped_func = self._queues[event_type].put
+
         # Track handlers (supporting wildcards)
+        handler = Handler(
+            event_type, wrapped_func, dtype, unpack, mode, emit_result, queue
+        )
         if "*" not in event_type:
-            wrapped_func = self._wrapper(func, unpack=unpack, create_task=create_task)
-            handler = Handler(event_type, wrapped_func, dtype)
             self._handlers[event_type] = handler
         else:
-            wrapped_func = self._wrapper(func, unpack=False, create_task=create_task)
-            handler = Handler(event_type, wrapped_func, dtype)
             self._wildcards[event_type] = handler
+            self._wildcard_router.insert(event_type)
 
         await self._update_handlers(event_type)
 
@@ -183,9 +407,30 @@ class AEntryPoint(ABC):
             del self._handlers[event_type]
         else:
             del self._wildcards[event_type]
+            self._wildcard_router.remove(event_type)
+        if event_type in self._queues:
+            await self._queues.pop(event_type).close()
 
         await self._update_handlers(event_type, remove=True)
 
+    def queue_stats(self) -> Dict[str, QueueStats]:
+        """Stats of the handler queues
+
+        Returns:
+            Dict[str, QueueStats]: Depth, processed and dropped events, by event type
+
+        """
+        return {
+            event_type: queue.stats
+            for event_type, queue in self._queues.items()
+            if not queue.closed
+        }
+
+    async def join(self):
+        """Wait until the queued events have been handled"""
+        for queue in list(self._queues.values()):
+            await queue.join()
+
     @abstractmethod
     async def emit(
         self, event_type: str, data: Any, id: Optional[str] = None
@@ -1,24 +1,107 @@
 import asyncio
+import json
 import logging
-import zlib
-from typing import Any, Callable, Coroutine, List, Optional, Union
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Union
 
 import asyncio_atexit
 import zmq
 import zmq.asyncio
 
-from ..protocols import Event
+from ..cfg import EVENT_BLACKLIST, global_config
+from ..compressors import Compressor
+from ..handler_queue import HandlerQueue
+from ..protocols import Agreement, Event, Handler, QueueConfig, QueueStats
+from ..serializers import Serializer
 from ..timer import Timer
-from ..utils import encode, reconstruct, verify_checksum, wildcard_search
+from ..utils import (
+    INTEGRITY_MODES,
+    TOPIC_TERMINATOR,
+    WIRE_VERSION,
+    bus_verified,
+    checksum_flags,
+    compress,
+    decode_topic,
+    encode,
+    encode_frames,
+    local_capabilities,
+    reconstruct,
+    shard_index,
+    subscription_prefix,
+    unpack_frames,
+    verify_checksum,
+)
 from .aentrypoint import AEntryPoint
 
 logger = logging.getLogger("aiodistbus")
 
 
 class DEntryPoint(AEntryPoint):
-    def __init__(self, pulse_ttl: Union[int, float] = 50, pulse_limit: int = 4):
+    def __init__(
+        self,
+        pulse_ttl: Union[int, float] = 50,
+        pulse_limit: int = 4,
+        copy: bool = True,
+        serializer: Optional[str] = None,
+        compression: Optional[str] = None,
+        integrity: Optional[str] = None,
+        track_subscriptions: bool = False,
+        dispatchers: int = 0,
+        dispatch_queue_size: int = 1000,
+        ordered: bool = True,
+    ):
+        """Distributed entrypoint
+
+        Args:
+            pulse_ttl (Union[int, float], optional): Pulse check interval. Defaults to 50.
+            pulse_limit (int, optional): Missed pulses before closing. Defaults to 4.
+            copy (bool, optional): If False, payloads are sent and received without
+                copying them. Handlers with a ``memoryview`` dtype then get a view
+                of the received ``zmq.Frame``. Defaults to True.
+            serializer (Optional[str], optional): Serializer backend for JSON-like
+                data and dataclasses. Defaults to None (negotiated with the
+                DEventBus during the handshake).
+            compression (Optional[str], optional): Compression backend for large
+                payloads ("none" to disable), see
+                ``global_config.compression_thresholds``. Defaults to None
+                (negotiated with the DEventBus during the handshake).
+            integrity (Optional[str], optional): Integrity mode: "crc32",
+                "adler32", "sender" (only verified by the DEventBus) or "none".
+                Defaults to None (negotiated with the DEventBus during the
+                handshake).
+            track_subscriptions (bool, optional): Receive the live subscriptions
+                of the DEventBus, see ``has_subscribers``. Defaults to False.
+            dispatchers (int, optional): Number of tasks calling the handlers, while
+                the received events wait in a bounded queue. Slow handlers then
+                don't stop the socket from being read. Defaults to 0 (the handlers
+                are called before receiving the next event).
+            dispatch_queue_size (int, optional): Bound of the dispatch queue (of
+                each dispatcher if ordered), the socket isn't read while full.
+                Defaults to 1000.
+            ordered (bool, optional): Dispatch the events of a topic in the order
+                they were received, by always the same dispatcher. Defaults to True.
+
+        Raises:
+            ValueError: If the integrity mode is unknown or the number of
+                dispatchers is negative
+
+        """
         super().__init__()
 
+        # Transport
+        self.copy = copy
+        self.serializer = serializer
+        self._serializer: Serializer = global_config.get_serializer(serializer)
+        if integrity and integrity not in INTEGRITY_MODES:
+            raise ValueError(f"Unknown integrity mode: {integrity}")
+        self.integrity = integrity
+        self._agreement: Agreement = Agreement(
+            WIRE_VERSION, self._serializer.name, checksum=integrity or "crc32"
+        )
+        self.compression = compression
+        self._compressor: Optional[Compressor] = global_config.get_compressor(
+            compression or "none"
+        )
+
         # Pulse
         self.pulse_ttl = pulse_ttl
         self.pulse_timer: Optional[Timer] = None
@@ -32,61 +115,272 @@ class DEntryPoint(AEntryPoint):
         self._connected: asyncio.Event = asyncio.Event()
         self._lock: asyncio.Lock = asyncio.Lock()
         self.run_task: Optional[asyncio.Task] = None
+        self.control_task: Optional[asyncio.Task] = None
         self.ctx: Optional[zmq.asyncio.Context] = None
         self.snapshot: Optional[zmq.asyncio.Socket] = None
         self.subscriber: Optional[zmq.asyncio.Socket] = None
         self.publisher: Optional[zmq.asyncio.Socket] = None
+        self._ip: Optional[str] = None
+        self._port: Optional[int] = None
+
+        # Other shards of a sharded DEventBus, the PUSH socket of each shard,
+        # and the subscriptions reported by each shard while connecting
+        self._shard_snapshots: List[zmq.asyncio.Socket] = []
+        self._publishers: List[zmq.asyncio.Socket] = []
+        self._pending_shards: int = 0
+        self._shard_subscriptions: Dict[zmq.asyncio.Socket, Set[bytes]] = {}
+
+        # Subscription prefix of each event type, and the DEventBus's live ones
+        self.track_subscriptions = track_subscriptions
+        self._subscriptions: Dict[str, bytes] = {}
+
+        # If the DEventBus sends the control events over the handshake socket,
+        # they aren't subscribed to (as also published for older clients)
+        self._control_channel: bool = False
+        self._remote_subscriptions: Optional[List[bytes]] = None
+
+        # Received events waiting for the dispatchers (if any)
+        if dispatchers < 0:
+            raise ValueError(f"Invalid number of dispatchers: {dispatchers}")
+        self._dispatch_queue: Optional[HandlerQueue] = None
+        if dispatchers:
+            self._dispatch_queue = HandlerQueue(
+                self._dispatch_event,
+                QueueConfig(dispatch_queue_size, dispatchers, ordered),
+            )
 
         asyncio_atexit.register(self.close)
 
-    async def snapshot_reactor(self):
-        assert self.snapshot, "SNAPSHOT socket not initialized"
+    async def snapshot_reactor(self, snapshot: Optional[zmq.asyncio.Socket] = None):
+        snapshot = snapshot or self.snapshot
+        assert snapshot, "SNAPSHOT socket not initialized"
 
-        msg = await self.snapshot.recv_multipart()
+        msg = await snapshot.recv_multipart()
         dmsg = msg[0].decode("utf-8")
 
         if dmsg == "aiodistbus.eventbus.handshake":
-            self._connected.set()
+            await self._handshake_reactor(snapshot, msg)
+
+        # The first shard (if sharded) owns the control events
+        elif dmsg == "aiodistbus.eventbus.control":
+            if not self._connected.is_set():
+                await self._settle(snapshot, msg[1:])
+            if snapshot is self.snapshot:
+                if not self._control_channel:
+                    self._use_control_channel()
+                await self.control_reactor(msg[1:])
+
+    async def _handshake_reactor(self, snapshot: zmq.asyncio.Socket, msg: List[bytes]):
+
+        if len(msg) > 3:
+            self._shard_subscriptions[snapshot] = {
+                p.encode("utf-8", "surrogateescape") for p in json.loads(msg[3])
+            }
+
+        # The first shard (if sharded) owns the negotiation, the other shards
+        # only confirm the connection
+        if snapshot is self.snapshot:
+            # Older DEventBus only send the serializer name (or nothing)
+            if len(msg) > 3 and self.track_subscriptions:
+                self._remote_subscriptions_sub(json.loads(msg[3]))
+            if len(msg) > 2:
+                agreement = Agreement.from_json(msg[2].decode("utf-8"))
+            elif len(msg) > 1:
+                agreement = Agreement(WIRE_VERSION, msg[1].decode("utf-8"))
+            else:
+                agreement = Agreement(1)
+            self._apply_agreement(agreement)
+            if len(msg) > 4 and not self._publishers:
+                await self._connect_shards(json.loads(msg[4]))
+        else:
+            self._pending_shards -= 1
+        self._check_connected()
+
+    async def _settle(self, snapshot: zmq.asyncio.Socket, frames: List[bytes]):
+        if decode_topic(frames[0]) != "aiodistbus.eventbus.subscriptions":
+            return
+        event = await reconstruct(frames[0], frames[1], frames[2:-1], list)
+        self._shard_subscriptions[snapshot] = {
+            p.encode("utf-8", "surrogateescape") for p in event.data or []
+        }
+        self._check_connected()
+
+    def _check_connected(self):
+        # Connected once all the shards (if sharded) replied
+        if self._pending_shards != 0:
+            return
+
+        # and reported this client's subscriptions, not to drop its events
+        if self._publishers:
+            prefixes = set(self._subscriptions.values())
+            for snapshot in [self.snapshot, *self._shard_snapshots]:
+                if not prefixes <= self._shard_subscriptions.get(snapshot, set()):
+                    return
+        self._shard_subscriptions.clear()
+        self._connected.set()
+
+    async def _send_connect(self, snapshot: zmq.asyncio.Socket):
+        # Send a connect msg, along with the supported formats
+        await snapshot.send_multipart(
+            [
+                "aiodistbus.eventbus.connect".encode("utf-8"),
+                local_capabilities().to_json().encode("utf-8"),
+            ]
+        )
+
+    async def _connect_shards(self, ports: List[int]):
+        assert self.ctx, "Context not initialized"
+        assert self.subscriber, "SUB socket not initialized"
+        assert self.publisher, "PUSH socket not initialized"
+
+        # Receive from all the shards, and send each event type to its shard
+        if len(ports) < 2:
+            return
+        for port in ports:
+            if port == self._port:
+                self._publishers.append(self.publisher)
+                continue
+
+            snapshot = self.ctx.socket(zmq.DEALER)
+            snapshot.setsockopt(zmq.IDENTITY, self.id.encode("utf-8"))
+            snapshot.connect(f"tcp://{self._ip}:{port}")
+            self.subscriber.connect(f"tcp://{self._ip}:{port+1}")
+            publisher = self.ctx.socket(zmq.PUSH)
+            publisher.connect(f"tcp://{self._ip}:{port+2}")
+            snapshot.linger = 0
+            publisher.linger = 0
+
+            self.control_poller.register(snapshot, zmq.POLLIN)
+            self._shard_snapshots.append(snapshot)
+            self._publishers.append(publisher)
+            self._pending_shards += 1
+            await self._send_connect(snapshot)
+
+    def _apply_agreement(self, agreement: Agreement):
+        precise = self._agreement.version >= 3
+        self._agreement = agreement
+        if precise != (agreement.version >= 3):
+            self._resubscribe()
+
+        # Use the agreed serializer, unless one was selected
+        if (
+            self.serializer is None
+            and agreement.serializer in global_config.serializers
+        ):
+            self._serializer = global_config.serializers[agreement.serializer]
+        if self.compression is None and (
+            agreement.compression in global_config.compressors
+            or agreement.compression == "none"
+        ):
+            self._compressor = global_config.get_compressor(agreement.compression)
+        if self.integrity:
+            self._agreement.checksum = self.integrity
+
+    async def _capabilities_sub(self, agreement: dict):
+        self._apply_agreement(Agreement.from_dict(agreement))
+
+    def _remote_subscriptions_sub(self, subscriptions: List[str]):
+        self._remote_subscriptions = [
+            p.encode("utf-8", "surrogateescape") for p in subscriptions
+        ]
+
+    async def _subscriptions_sub(self, subscriptions: list):
+        self._remote_subscriptions_sub(subscriptions)
 
     async def subscriber_reactor(self):
         assert self.subscriber, "SUB socket not initialized"
 
-        [topic, event, checksum] = await self.subscriber.recv_multipart()
+        frames = await self.subscriber.recv_multipart(copy=self.copy)
+        b_topic = frames[0] if self.copy else frames[0].bytes
+        topic = decode_topic(b_topic)
+        # logger.debug(f"SUBSCRIBER: Received {topic} - {len(self._received)}")
 
-        # Before further processing, perform checksum
-        if not verify_checksum(event, checksum):
-            logger.error(f"aiodistbus: Checksum failed: {event.decode('utf-8')}")
+        # Obtain the handlers (legacy subscriptions only filter by prefix)
+        handlers = self._match(topic)
+        if not handlers:
             return
 
-        topic = topic.decode("utf-8")
-        event = event.decode("utf-8")
-        # logger.debug(f"SUBSCRIBER: Received {topic} - {event} - {len(self._received)}")
+        # Control events published before unsubscribing, already received
+        if self._control_channel and topic in EVENT_BLACKLIST:
+            return
+        if not self.copy:
+            frames = unpack_frames(frames)
+        event = await self._decode(topic, frames, handlers)
+        if event is None:
+            return
+
+        # Blocks while the dispatch queue is full
+        if self._dispatch_queue:
+            await self._dispatch_queue.put(event)
+        else:
+            await self._dispatch(handlers, event)
+
+    async def control_reactor(self, frames: List[bytes]):
+        topic = decode_topic(frames[0])
+        handlers = self._match(topic)
+        if not handlers:
+            return
+
+        # Control events skip the dispatch queue, not to wait behind the data
+        event = await self._decode(topic, frames, handlers)
+        if event is not None:
+            await self._dispatch(handlers, event)
+
+    async def _decode(
+        self, topic: str, frames: List[Any], handlers: List[Handler]
+    ) -> Optional[Event]:
+        [b_topic, header, *payload, checksum] = frames
+
+        # Before further processing, perform checksum (unless done by the DEventBus)
+        if not bus_verified(header) and not verify_checksum(
+            [header, *payload], checksum
+        ):
+            logger.error(f"aiodistbus: Checksum failed: {topic}")
+            return None
 
-        # Reconstruct the data
+        # Reconstruct (and decompress) the data, unless only accessed by handlers
+        # or decoded by the process pool
         if topic in self._handlers:
             known_type = self._handlers[topic].dtype
         else:
             known_type = None
+        lazy = not any(h.unpack and h.mode != "process" for h in handlers)
         try:
-            event = await reconstruct(event, known_type)
+            return await reconstruct(b_topic, header, payload, known_type, lazy)
         except Exception as e:
-            logger.error(f"aiodistbus: Failed to reconstruct: {event} - {e}")
-            return
+            logger.error(f"aiodistbus: Failed to reconstruct: {topic} - {e}")
+            return None
 
-        # Obtain the handlers
-        coros: List[Coroutine] = []
+    def _match(self, topic: str) -> List[Handler]:
+        handlers: List[Handler] = []
         if topic in self._handlers:
-            coros.append(self._handlers[topic].function(event))
-        for match in wildcard_search(topic, self._wildcards.keys()):
-            coros.append(self._wildcards[match].function(event))
-
-        # Await the handlers
-        if len(coros) > 0:
-            await asyncio.gather(*coros)
+            handlers.append(self._handlers[topic])
+        for match in self._wildcard_router.match(topic):
+            handlers.append(self._wildcards[match])
+        return handlers
+
+    async def _dispatch_event(self, event: Event):
+        # Handlers removed since the event was received are skipped
+        await self._dispatch(self._match(event.type), event)
+
+    async def _dispatch(self, handlers: List[Handler], event: Event):
+
+        # Sync handlers run inline, then the async ones are awaited
+        coros: List[Awaitable] = []
+        for handler in handlers:
+            coro = handler.function(event)
+            if coro is not None:
+                coros.append(coro)
+        try:
+            if len(coros) == 1:
+                await coros[0]
+            elif coros:
+                await asyncio.gather(*coros)
+        except asyncio.QueueFull as e:
+            logger.error(f"aiodistbus: {e}")
 
     async def _run(self):
         assert self.subscriber, "SUB socket not initialized"
-        assert self.snapshot, "SNAPSHOT socket not initialized"
 
         # After connect and identify established, listen
         while self._running:
@@ -97,35 +391,73 @@ class DEntryPoint(AEntryPoint):
             if len(events) == 0:
                 continue
 
-            if self.snapshot in events:
-                await self.snapshot_reactor()
-
             if self.subscriber in events:
                 await self.subscriber_reactor()
 
+    async def _control_run(self):
+        assert self.snapshot, "SNAPSHOT socket not initialized"
+
+        # The handshake and control events are received apart from the data,
+        # so a saturated SUB socket (or dispatch queue) doesn't delay them
+        while self._running:
+            event_list = await self.control_poller.poll(timeout=1000)
+            events = dict(event_list)
+
+            # Empty if no events
+            if len(events) == 0:
+                continue
+
+            for snapshot in [self.snapshot, *self._shard_snapshots]:
+                if snapshot in events:
+                    await self.snapshot_reactor(snapshot)
+
+    def _use_control_channel(self):
+        self._control_channel = True
+        for event_type in EVENT_BLACKLIST:
+            self._unsubscribe(event_type)
+
+    def _subscribe(self, event_type: str):
+        assert self.subscriber, "SUB socket not initialized"
+        if self._control_channel and event_type in EVENT_BLACKLIST:
+            return
+
+        # Control events keep a plain prefix, to still be received while the
+        # wire version changes (i.e. the capabilities event)
+        precise = self._agreement.version >= 3 and event_type not in EVENT_BLACKLIST
+        prefix = subscription_prefix(event_type, precise)
+        self.subscriber.setsockopt(zmq.SUBSCRIBE, prefix)
+        self._subscriptions[event_type] = prefix
+
+    def _unsubscribe(self, event_type: str):
+        assert self.subscriber, "SUB socket not initialized"
+
+        prefix = self._subscriptions.pop(event_type, None)
+        if prefix is not None:
+            self.subscriber.setsockopt(zmq.UNSUBSCRIBE, prefix)
+
+    def _resubscribe(self):
+        if not self.subscriber:
+            return
+
+        for event_type in list(self._subscriptions):
+            self._unsubscribe(event_type)
+            self._subscribe(event_type)
+
     async def _update_handlers(
         self, event_type: Optional[str] = None, remove: bool = False
     ):
         if not self.subscriber:
             return
 
-        if remove and event_type:
-            self.subscriber.setsockopt(zmq.UNSUBSCRIBE, event_type.encode("utf-8"))
-
         if event_type:
-            if "*" in event_type:
-                topic = event_type.replace(".*", "")
-                topic = topic.replace("*", "")
-                self.subscriber.setsockopt(zmq.SUBSCRIBE, topic.encode("utf-8"))
-            else:
-                self.subscriber.setsockopt(zmq.SUBSCRIBE, event_type.encode("utf-8"))
+            if remove:
+                self._unsubscribe(event_type)
+            elif event_type not in self._subscriptions:
+                self._subscribe(event_type)
         else:
-            for event_type in self._handlers.keys():
-                self.subscriber.setsockopt(zmq.SUBSCRIBE, event_type.encode("utf-8"))
-            for event_type in self._wildcards.keys():
-                topic = event_type.replace(".*", "")
-                topic = topic.replace("*", "")
-                self.subscriber.setsockopt(zmq.SUBSCRIBE, topic.encode("utf-8"))
+            for event_type in [*self._handlers, *self._wildcards]:
+                if event_type not in self._subscriptions:
+                    self._subscribe(event_type)
 
     async def _pulse_sub(self):
         self.pulse_count += 1
@@ -157,6 +489,37 @@ class DEntryPoint(AEntryPoint):
     def running(self) -> bool:
         return self._running
 
+    @property
+    def dispatch_stats(self) -> Optional[QueueStats]:
+        """Stats of the dispatch queue, None without dispatchers"""
+        return self._dispatch_queue.stats if self._dispatch_queue else None
+
+    async def join(self):
+        """Wait until the received (and queued) events have been handled"""
+        if self._dispatch_queue:
+            await self._dispatch_queue.join()
+        await super().join()
+
+    def has_subscribers(self, event_type: str) -> bool:
+        """Check if an event type has subscribers, as last reported by the
+        DEventBus (which drops the events without any). Producers can use it
+        to skip or throttle the generation of unneeded events.
+
+        Args:
+            event_type (str): Event type
+
+        Returns:
+            bool: True if subscribed, or unknown (i.e. without
+                ``track_subscriptions`` or with an older DEventBus)
+
+        """
+        if self._remote_subscriptions is None:
+            return True
+        topic = event_type.encode("utf-8")
+        if self._agreement.version >= 3:
+            topic += TOPIC_TERMINATOR
+        return any(topic.startswith(p) for p in self._remote_subscriptions)
+
     async def emit(
         self, event_type: str, data: Optional[Any] = None, id: Optional[str] = None
     ) -> Optional[Event]:
@@ -177,8 +540,8 @@ class DEntryPoint(AEntryPoint):
 
         # Encode data
         try:
-            encoded_data = encode(data)
-        except ValueError:
+            encoded_data = encode(data, self._serializer.name)
+        except (ValueError, TypeError, OverflowError):
             logger.error(f"aiodistbus: Failed to encode: {data}")
             return None
 
@@ -192,22 +555,28 @@ class DEntryPoint(AEntryPoint):
         else:
             event = Event(event_type, encoded_data, dtype=dtype_str)
 
-        # Serliaze the event
-        serialized_event = event.to_json().encode()
+        # Serialize the event into frames (topic, header, payload, checksum)
+        flags = checksum_flags(self._agreement.checksum)
+        if self._compressor:
+            event.data, compression = compress(
+                event_type, encoded_data, self._compressor
+            )
+            flags |= compression
+        frames = encode_frames(
+            event, self._serializer.id, self._agreement.version, flags
+        )
 
-        # Compute checksum
-        checksum = zlib.crc32(serialized_event)
+        # The returned event keeps the uncompressed data
+        event.data = encoded_data
 
-        # Send the data
+        # Send the data (to its shard, if sharded and all the clients receive
+        # from every shard)
         # logger.debug(f"PUBLISHER: {event}")
+        publisher = self.publisher
+        if self._publishers and self._agreement.shards:
+            publisher = self._publishers[shard_index(event_type, len(self._publishers))]
         try:
-            await self.publisher.send_multipart(
-                [
-                    event_type.encode("utf-8"),
-                    serialized_event,
-                    checksum.to_bytes(4, "big"),
-                ]
-            )
+            await publisher.send_multipart(frames, copy=self.copy)
         except zmq.error.ZMQError:
             logger.error("Could not send event")
             return None
@@ -231,6 +600,8 @@ class DEntryPoint(AEntryPoint):
             asyncio.TimeoutError: If timeout is reached
 
         """
+        self._ip = ip
+        self._port = port
         self.ctx = zmq.asyncio.Context()
         self.snapshot = self.ctx.socket(zmq.DEALER)
         self.snapshot.setsockopt(zmq.IDENTITY, self.id.encode("utf-8"))
@@ -247,20 +618,29 @@ class DEntryPoint(AEntryPoint):
 
         # Keeping track of state
         self._running = True
+        self._open_queues()
+        if self._dispatch_queue:
+            self._dispatch_queue.open()
 
         # Update the subscriber's topics
         await self.on("aiodistbus.eventbus.close", self.close, create_task=True)
         await self.on("aiodistbus.eventbus.pulse", self._pulse_sub)
+        await self.on("aiodistbus.eventbus.capabilities", self._capabilities_sub, dict)
+        if self.track_subscriptions:
+            await self.on(
+                "aiodistbus.eventbus.subscriptions", self._subscriptions_sub, list
+            )
         await self._update_handlers()
 
-        # Using a poller for the subscriber
+        # Using a poller for the subscriber, and another for the control channel
         self.poller = zmq.asyncio.Poller()
         self.poller.register(self.subscriber, zmq.POLLIN)
-        self.poller.register(self.snapshot, zmq.POLLIN)
+        self.control_poller = zmq.asyncio.Poller()
+        self.control_poller.register(self.snapshot, zmq.POLLIN)
         self.run_task = asyncio.create_task(self._run())
+        self.control_task = asyncio.create_task(self._control_run())
 
-        # Send a connect msg
-        await self.snapshot.send("aiodistbus.eventbus.connect".encode("utf-8"))
+        await self._send_connect(self.snapshot)
         if timeout:
             await asyncio.wait_for(self._connected.wait(), timeout=timeout)
         else:
@@ -272,6 +652,30 @@ class DEntryPoint(AEntryPoint):
         self.pulse_timer = Timer(self._pulse_check, self.pulse_ttl)
         self.pulse_timer.start()
 
+    async def _send_disconnect(self, snapshot: zmq.asyncio.Socket):
+        # Let the DEventBus renegotiate without this client
+        try:
+            await snapshot.send(b"aiodistbus.eventbus.disconnect", flags=zmq.NOBLOCK)
+        except zmq.error.ZMQError:
+            pass
+
+    async def _close_sockets(self):
+        for snapshot in [self.snapshot, *self._shard_snapshots]:
+            if snapshot and not snapshot.closed:
+                await self._send_disconnect(snapshot)
+                snapshot.close(linger=100)
+        if self.subscriber and not self.subscriber.closed:
+            self.subscriber.close()
+        for publisher in [self.publisher, *self._publishers]:
+            if publisher and not publisher.closed:
+                publisher.close()
+        self._subscriptions.clear()
+        self._shard_snapshots.clear()
+        self._publishers.clear()
+        self._pending_shards = 0
+        self._shard_subscriptions.clear()
+        self._control_channel = False
+
     async def close(self):
         """Close the EventBus client"""
 
@@ -279,22 +683,21 @@ class DEntryPoint(AEntryPoint):
         async with self._lock:
             if self._running:
 
-                # Stop the main task
+                # Stop the main and control tasks
                 self._running = False
                 self._connected.clear()
                 if self.run_task:
                     await self.run_task
+                if self.control_task:
+                    await self.control_task
 
-                # Stop the timer
+                # Stop the timer and the handler queues
                 if self.pulse_timer:
                     await self.pulse_timer.stop()
+                if self._dispatch_queue:
+                    await self._dispatch_queue.close()
+                await self._close_queues()
 
                 if self.ctx and not self.ctx.closed:
-                    if self.snapshot and not self.snapshot.closed:
-                        self.snapshot.close()
-                    if self.subscriber and not self.subscriber.closed:
-                        self.subscriber.close()
-                    if self.publisher and not self.publisher.closed:
-                        self.publisher.close()
-
+                    await self._close_sockets()
                     self.ctx.term()
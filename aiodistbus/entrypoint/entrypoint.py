@@ -52,6 +52,7 @@ class EntryPoint(AEntryPoint):
         """
         # Add bus and default handlers
         self._bus = bus
+        self._open_queues()
         await self.on("aiodistbus.eventbus.close", self.close)
         await self._update_handlers()
 
@@ -75,7 +76,7 @@ class EntryPoint(AEntryPoint):
 
         # Constructing event
         if id:
-            event = Event(event_type, data, id)
+            event = Event(event_type, data, id=id)
         else:
             event = Event(event_type, data)
 
@@ -90,3 +91,4 @@ class EntryPoint(AEntryPoint):
         if self._bus:
             self._bus._remove(self.id)
             self._bus = None
+        await self._close_queues()
@@ -1,4 +1,6 @@
+from .broker_thread import BrokerThread
 from .deventbus import DEventBus
 from .eventbus import EventBus
+from .sharded import ShardedEventBus
 
-__all__ = ["EventBus", "DEventBus"]
+__all__ = ["EventBus", "DEventBus", "BrokerThread", "ShardedEventBus"]
@@ -1,7 +1,6 @@
 import logging
 import uuid
 from abc import ABC, abstractmethod
-from collections import defaultdict
 from typing import Dict
 
 from ..protocols import Subscriptions
@@ -21,7 +20,7 @@ class AEventBus(ABC):
         # State information
         self._running = False
         self._uuid = str(uuid.uuid4())
-        self._subs: Dict[str, Dict[str, Subscriptions]] = defaultdict(dict)
+        self._subs: Dict[str, Dict[str, Subscriptions]] = {}
 
     @property
     def running(self) -> bool:
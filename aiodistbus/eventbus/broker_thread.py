@@ -0,0 +1,156 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Coroutine, Dict, List, Optional
+
+import asyncio_atexit
+
+from ..protocols import Event
+from .deventbus import DEventBus
+from .eventbus import EventBus
+
+logger = logging.getLogger("aiodistbus")
+
+
+class _ThreadsafeBus:
+    """Local eventbus as seen from the broker's thread
+
+    The events are handed to the local eventbus's loop without waiting for
+    them to be handled, so the broker isn't slowed down by the application.
+    Only ``max_pending`` events can be in flight though: past that, the
+    broker waits for the application to catch up.
+
+    """
+
+    def __init__(
+        self, bus: EventBus, loop: asyncio.AbstractEventLoop, max_pending: int
+    ):
+        self.bus = bus
+        self.loop = loop
+        self.max_pending = max_pending
+        self._pending: Optional[asyncio.Semaphore] = None
+
+    @property
+    def _dtypes(self) -> Dict[str, Any]:
+        return self.bus._dtypes
+
+    def _done(self, future: concurrent.futures.Future, event: Event):
+        assert self._pending
+        self._pending.release()
+        if not future.cancelled() and future.exception():
+            logger.error(
+                f"aiodistbus: Failed to forward ({event.type}): {future.exception()}"
+            )
+
+    async def _emit(self, event: Event):
+        # Created within the broker's loop
+        if not self._pending:
+            self._pending = asyncio.Semaphore(self.max_pending)
+
+        await self._pending.acquire()
+        try:
+            future = asyncio.run_coroutine_threadsafe(self.bus._emit(event), self.loop)
+        except RuntimeError:
+            # The application's loop is closed
+            self._pending.release()
+            raise
+        broker_loop = asyncio.get_running_loop()
+        future.add_done_callback(
+            lambda f: broker_loop.call_soon_threadsafe(self._done, f, event)
+        )
+
+
+class BrokerThread:
+    """DEventBus running on a dedicated thread, with its own event loop
+
+    The sockets, the pulse timer and the forwarding loop of the DEventBus
+    are isolated from the load of the application's event loop. The methods
+    can be awaited from any other event loop.
+
+    Args:
+        ip (str): IP address to bind to. Defaults to '127.0.0.1'
+        port (int, optional): Port to bind to. Defaults to 0.
+        max_pending (int, optional): Events forwarded to a local eventbus
+            but not handled yet, before the broker waits. Defaults to 1000.
+        **kwargs: Other arguments of the DEventBus
+
+    Examples:
+        >>> broker = BrokerThread("127.0.0.1")
+        >>> e1 = DEntryPoint()
+        >>> await e1.connect(broker.ip, broker.port)
+        >>> await broker.close()
+
+    """
+
+    def __init__(
+        self,
+        ip: str = "127.0.0.1",
+        port: int = 0,
+        max_pending: int = 1000,
+        **kwargs: Any,
+    ):
+        if max_pending < 1:
+            raise ValueError(f"Invalid number of pending events: {max_pending}")
+        self.max_pending = max_pending
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run, name="aiodistbus-broker", daemon=True
+        )
+        self._thread.start()
+
+        # Created within the broker's loop (i.e. for its tasks)
+        async def create() -> DEventBus:
+            return DEventBus(ip, port, **kwargs)
+
+        self.dbus: DEventBus = asyncio.run_coroutine_threadsafe(
+            create(), self._loop
+        ).result()
+
+        # Close along with the application's loop
+        asyncio_atexit.register(self.close)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _call(self, coro: Coroutine) -> Any:
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return await asyncio.wrap_future(future)
+
+    @property
+    def ip(self) -> str:
+        return self.dbus.ip
+
+    @property
+    def port(self) -> int:
+        return self.dbus.port
+
+    @property
+    def running(self) -> bool:
+        return self.dbus.running
+
+    async def forward(self, bus: EventBus, event_types: Optional[List[str]] = None):
+        """Forward events to a local eventbus, see ``DEventBus.forward``
+
+        Args:
+            bus (EventBus): Local eventbus, of the calling loop
+            event_types (Optional[List[str]], optional): Event types to forward. Defaults to None.
+
+        """
+        tbus = _ThreadsafeBus(bus, asyncio.get_running_loop(), self.max_pending)
+        await self._call(self.dbus.forward(tbus, event_types))  # type: ignore
+
+    async def flush(self):
+        """Flush the eventbus"""
+        await self._call(self.dbus.flush())
+
+    async def close(self):
+        """Close the eventbus and stop its thread"""
+        if not self._thread.is_alive():
+            return
+
+        await self._call(self.dbus.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
@@ -1,17 +1,29 @@
 import asyncio
 import logging
-import zlib
-from collections import defaultdict
-from typing import Dict, List, Optional, Type, Union
+from typing import Any, Dict, List, Optional, Type, Union
 
 import asyncio_atexit
 import zmq
 import zmq.asyncio
 
-from ..cfg import EVENT_BLACKLIST
-from ..protocols import Event
+from ..cfg import global_config
+from ..protocols import Agreement, BrokerStats, Capabilities, Event
+from ..router import TopicRouter
 from ..timer import Timer
-from ..utils import reconstruct, verify_checksum, wildcard_search
+from ..utils import (
+    INTEGRITY_MODES,
+    LEGACY_CAPABILITIES,
+    TOPIC_TERMINATOR,
+    bus_verified,
+    decode_topic,
+    encode,
+    encode_frames,
+    local_capabilities,
+    negotiate,
+    reconstruct,
+    unpack_frames,
+    verify_checksum,
+)
 from .aeventbus import AEventBus
 from .eventbus import EventBus
 
@@ -28,7 +40,14 @@ class DEventBus(AEventBus):
     """
 
     def __init__(
-        self, ip: str = "127.0.0.1", port: int = 0, pulse: Union[float, int] = 15
+        self,
+        ip: str = "127.0.0.1",
+        port: int = 0,
+        pulse: Union[float, int] = 15,
+        serializer: Optional[str] = None,
+        compression: Optional[str] = None,
+        integrity: Optional[str] = None,
+        batch_size: int = 256,
     ):
         """Initialize the distributed eventbus
 
@@ -36,6 +55,22 @@ class DEventBus(AEventBus):
             ip (str): IP address to bind to. Defaults to '127.0.0.1'
             port (int, optional): Port to bind to. Defaults to 0.
             pulse (Union[float, int], optional): Pulse interval. Defaults to 15.
+            serializer (Optional[str], optional): Preferred serializer backend for
+                the connecting DEntryPoints that don't select one. Defaults to None
+                (the fastest backend understood by all the DEntryPoints).
+            compression (Optional[str], optional): Compression backend for the
+                connecting DEntryPoints that don't select one, if understood by
+                all of them. Defaults to None (no compression).
+            integrity (Optional[str], optional): Integrity mode for the connecting
+                DEntryPoints that don't select one, if understood by all of them:
+                "crc32", "adler32", "sender" (only verified by the DEventBus) or
+                "none". Defaults to None (end-to-end CRC32).
+            batch_size (int, optional): Maximum number of messages read from a
+                ready socket per wakeup, before polling again. Defaults to 256.
+
+        Raises:
+            ValueError: If the integrity mode is unknown or the batch size is
+                not positive
 
         """
         super().__init__()
@@ -44,13 +79,50 @@ class DEventBus(AEventBus):
         self._ip: str = ip
         self._port: int = port
         self._running: bool = False
+        if batch_size < 1:
+            raise ValueError(f"Invalid batch size: {batch_size}")
+        self._batch_size: int = batch_size
+
+        # Capabilities of the connected clients and the agreed formats
+        if serializer:
+            global_config.get_serializer(serializer)
+        self._serializer: Optional[str] = serializer
+        if compression:
+            global_config.get_compressor(compression)
+        self._compression: Optional[str] = compression
+        if integrity and integrity not in INTEGRITY_MODES:
+            raise ValueError(f"Unknown integrity mode: {integrity}")
+        self._integrity: Optional[str] = integrity
+        self._capabilities: Capabilities = local_capabilities()
+        self._clients: Dict[bytes, Capabilities] = {}
+        self._agreement: Agreement = negotiate(
+            self._capabilities, [], serializer, compression, integrity
+        )
+
+        # Live subscriptions (topic frame prefixes) of the DEntryPoints
+        self.stats = BrokerStats()
+        self._subscriptions: Dict[bytes, None] = {}
+        self._subscribed: Dict[bytes, bool] = {}  # Topic frame -> subscribed
+        self._subscribed_size: int = 1024
+        self._subscriptions_changed: bool = False
+
+        # Ports of all the shards, and the handshake socket to the first one
+        # (whose agreement is followed), when run by a ShardedEventBus
+        self._shards: List[int] = []
+        self._leader: Optional[zmq.asyncio.Socket] = None
 
         # Set up clone server sockets
         self.ctx = zmq.asyncio.Context()
         self.snapshot = self.ctx.socket(zmq.ROUTER)
-        self.publisher = self.ctx.socket(zmq.PUB)
+        self.publisher = self.ctx.socket(zmq.XPUB)
         self.collector = self.ctx.socket(zmq.PULL)
 
+        # Report the clients that left without disconnecting as unroutable,
+        # including the ones whose host vanished (no heartbeat reply)
+        self.snapshot.setsockopt(zmq.ROUTER_MANDATORY, 1)
+        self.snapshot.setsockopt(zmq.HEARTBEAT_IVL, int(pulse * 1000))
+        self.snapshot.setsockopt(zmq.HEARTBEAT_TIMEOUT, int(3 * pulse * 1000))
+
         if port == 0:
             port = self.snapshot.bind_to_random_port(f"tcp://{ip}")
             self.publisher.bind(f"tcp://{ip}:{port+1}")
@@ -65,6 +137,7 @@ class DEventBus(AEventBus):
         self.poller = zmq.asyncio.Poller()
         self.poller.register(self.snapshot, zmq.POLLIN)
         self.poller.register(self.collector, zmq.POLLIN)
+        self.poller.register(self.publisher, zmq.POLLIN)
 
         self._running = True
         self._flush_flag = asyncio.Event()
@@ -79,8 +152,9 @@ class DEventBus(AEventBus):
         asyncio_atexit.register(self.close)
 
         # Local event buses
-        self._lbuses_wildcard: Dict[str, List[EventBus]] = defaultdict(list)
-        self._lbuses_subs: Dict[str, List[EventBus]] = defaultdict(list)
+        self._lbuses_wildcard: Dict[str, List[EventBus]] = {}
+        self._lbuses_router = TopicRouter()
+        self._lbuses_subs: Dict[str, List[EventBus]] = {}
 
     @property
     def ip(self):
@@ -90,38 +164,133 @@ class DEventBus(AEventBus):
     def port(self):
         return self._port
 
-    async def _emit(self, topic: bytes, msg: bytes, checksum: Optional[bytes] = None):
-        if checksum is None:
-            checksum = zlib.crc32(msg).to_bytes(4, "big")
-        await self.publisher.send_multipart([topic, msg, checksum])
+    async def _emit(self, frames: List[bytes]):
+        await self.publisher.send_multipart(frames, copy=False)
+
+    async def _send(self, id: bytes, msg: List[Any]) -> bool:
+        try:
+            await self.snapshot.send_multipart([id, *msg], flags=zmq.NOBLOCK)
+        except zmq.error.ZMQError as e:
+            # Otherwise, the client is alive but not reading (full pipe)
+            if e.errno == zmq.EHOSTUNREACH:
+                return False
+        return True
+
+    async def _expire(self, ids: List[bytes]):
+        for id in ids:
+            logger.debug(f"aiodistbus: Client {id!r} left without disconnecting")
+            self._clients.pop(id, None)
+        await self._update_agreement()
+
+    async def _control(self, event: Event):
+        frames = encode_frames(event, version=self._agreement.version)
+
+        # Sent over the ROUTER socket, so never queued behind the data (nor
+        # dropped with it), unless a client doesn't have a control channel.
+        # Those ignore it, yet it tells which clients are gone.
+        gone: List[bytes] = []
+        for id in list(self._clients):
+            if not await self._send(id, [b"aiodistbus.eventbus.control", *frames]):
+                gone.append(id)
+        if not all(c.control for c in self._clients.values()):
+            await self._emit(frames)
+        if gone:
+            await self._expire(gone)
+
+    async def _update_agreement(self):
+        if self._leader:
+            return
+        agreement = negotiate(
+            self._capabilities,
+            self._clients.values(),
+            self._serializer,
+            self._compression,
+            self._integrity,
+        )
+        await self._set_agreement(agreement)
+
+    async def _set_agreement(self, agreement: Agreement):
+        if agreement == self._agreement:
+            return
 
-    async def _snapshot_reactor(self, id: bytes, msg: bytes):
+        # Inform the connected clients of the new formats
+        self._agreement = agreement
+        event = Event(
+            "aiodistbus.eventbus.capabilities",
+            encode(agreement.to_dict(), "json"),
+            dtype="builtins.dict",
+        )
+        await self._control(event)
+
+    async def _snapshot_reactor(self, id: bytes, msg: List[bytes]):
         # logger.debug(f"ROUTER: Received {id}: {msg}")
 
         # Decode message
-        dmsg = msg.decode()
+        dmsg = msg[0].decode()
         if dmsg == "aiodistbus.eventbus.connect":
-            await self.snapshot.send_multipart([id, b"aiodistbus.eventbus.handshake"])
-
-    async def _collector_reactor(self, topic: bytes, msg: bytes, checksum: bytes):
-
-        # Broadcast via socket
-        await self._emit(topic, msg, checksum)
-
-        # Only perform this if we have local buses
-        if len(self._lbuses_wildcard) == 0 and len(self._lbuses_subs) == 0:
-            return
 
-        # If local buses, send them the data
-        dtopic = topic.decode()
+            # Clients without capabilities only understand the legacy format
+            capabilities = LEGACY_CAPABILITIES
+            if len(msg) > 1:
+                try:
+                    capabilities = Capabilities.from_json(msg[1].decode())
+                except Exception as e:
+                    logger.error(f"aiodistbus: Invalid capabilities from {id!r}: {e}")
+            self._clients[id] = capabilities
+            await self._update_agreement()
+
+            # The serializer name is kept for clients that don't parse the agreement
+            handshake = [
+                b"aiodistbus.eventbus.handshake",
+                self._agreement.serializer.encode("utf-8"),
+                self._agreement.to_json().encode("utf-8"),
+                encode(self.subscriptions, "json"),
+                encode(self._shards, "json"),
+            ]
+            if not await self._send(id, handshake):
+                await self._expire([id])
+
+        elif dmsg == "aiodistbus.eventbus.disconnect":
+            if id in self._clients:
+                del self._clients[id]
+                await self._update_agreement()
+
+    async def _follow(self, ip: str, port: int):
+        # Connect to the first shard as a client, then adopt its agreement
+        self._leader = self.ctx.socket(zmq.DEALER)
+        self._leader.linger = 0
+        self._leader.connect(f"tcp://{ip}:{port}")
+        await self._leader.send_multipart(
+            [
+                b"aiodistbus.eventbus.connect",
+                self._capabilities.to_json().encode("utf-8"),
+            ]
+        )
+        while not await self._leader_reactor(await self._leader.recv_multipart()):
+            pass
+        self.poller.register(self._leader, zmq.POLLIN)
+
+    async def _leader_reactor(self, msg: List[bytes]) -> bool:
+        # Only the agreement is followed, from the handshake or later updates
+        if msg[0] == b"aiodistbus.eventbus.handshake":
+            await self._set_agreement(Agreement.from_json(msg[2].decode()))
+            return True
+        elif (
+            msg[0] == b"aiodistbus.eventbus.control"
+            and decode_topic(msg[1]) == "aiodistbus.eventbus.capabilities"
+        ):
+            event = await reconstruct(msg[1], msg[2], msg[3:-1], dict)
+            await self._set_agreement(Agreement.from_dict(event.data))
+        return False
+
+    def _local_buses(self, dtopic: str) -> List[EventBus]:
 
         # Handle wildcard subscriptions
         bus_to_emit: List[EventBus] = []
-        if dtopic not in EVENT_BLACKLIST:
-            for match in wildcard_search(dtopic, self._lbuses_wildcard.keys()):
-                for bus in self._lbuses_wildcard[match]:
-                    # logger.debug(f"{dtopic}: {msg}")
-                    bus_to_emit.append(bus)
+        for match in self._lbuses_router.match(dtopic):
+            for bus in self._lbuses_wildcard[match]:
+                # logger.debug(f"{dtopic}: {msg}")
+                bus_to_emit.append(bus)
 
         # Else, normal subscriptions
         if dtopic in self._lbuses_subs:
@@ -129,6 +298,69 @@ class DEventBus(AEventBus):
                 # logger.debug(f"{dtopic}: {msg}")
                 bus_to_emit.append(bus)
 
+        return bus_to_emit
+
+    def _xpub_reactor(self, msg: bytes):
+
+        # XPUB only reports the first subscription and last unsubscription
+        # of each prefix (including the ones of disconnected DEntryPoints)
+        if msg[:1] == b"\x01":
+            self._subscriptions[msg[1:]] = None
+        elif msg[:1] == b"\x00":
+            self._subscriptions.pop(msg[1:], None)
+        else:
+            return
+        self._subscribed.clear()
+        self._subscriptions_changed = True
+
+    async def _publish_subscriptions(self):
+        self._subscriptions_changed = False
+        event = Event(
+            "aiodistbus.eventbus.subscriptions",
+            encode(self.subscriptions, "json"),
+            dtype="builtins.list",
+        )
+        await self._control(event)
+
+    def _has_subscribers(self, topic: bytes) -> bool:
+        subscribed = self._subscribed.get(topic)
+        if subscribed is None:
+            subscribed = any(topic.startswith(p) for p in self._subscriptions)
+            if len(self._subscribed) >= self._subscribed_size:
+                self._subscribed.clear()
+            self._subscribed[topic] = subscribed
+        return subscribed
+
+    async def _collector_reactor(self, frames: List[bytes]):
+
+        # Broadcast via socket, only if subscribed
+        local = len(self._lbuses_wildcard) != 0 or len(self._lbuses_subs) != 0
+        if self._has_subscribers(frames[0]):
+            await self._emit(frames)
+            self.stats.published += 1
+        elif not local:
+            self.stats.dropped += 1
+
+        # Only perform this if we have local buses
+        if local:
+            await self._forward_local(frames)
+
+    async def _forward_local(self, frames: List[bytes]):
+
+        # If local buses, send them the data
+        [topic, header, *payload, checksum] = frames
+        dtopic = decode_topic(topic)
+        bus_to_emit = self._local_buses(dtopic)
+
+        # Only verify and decode (and decompress) the data if needed
+        if not bus_to_emit:
+            return
+        if not bus_verified(header) and not verify_checksum(
+            [header, *payload], checksum
+        ):
+            logger.error(f"aiodistbus: Checksum failed: {dtopic}")
+            return
+
         # Identify if any bus has the dtype
         known_type: Optional[Type] = None
         for bus in bus_to_emit:
@@ -136,11 +368,18 @@ class DEventBus(AEventBus):
                 known_type = bus._dtypes[dtopic]
 
         # Reconstruct the data
-        event = await reconstruct(msg.decode(), known_type)
+        try:
+            event = await reconstruct(topic, header, payload, known_type)
+        except Exception as e:
+            logger.error(f"aiodistbus: Failed to reconstruct: {dtopic} - {e}")
+            return
 
-        # Emit the event
+        # Emit the event, without letting a handler stop the forwarding
         for bus in bus_to_emit:
-            await bus._emit(event)
+            try:
+                await bus._emit(event)
+            except Exception as e:
+                logger.error(f"aiodistbus: Failed to forward: {dtopic} - {e}")
 
     async def _run(self):
         while self._running:
@@ -153,27 +392,79 @@ class DEventBus(AEventBus):
                 self._flush_flag.set()
                 continue
 
+            if self.publisher in events:
+                await self._drain_publisher()
+
             if self.snapshot in events:
-                [id, msg] = await self.snapshot.recv_multipart()
-                await self._snapshot_reactor(id, msg)
+                await self._drain_snapshot()
 
             if self.collector in events:
-                [topic, data, checksum] = await self.collector.recv_multipart()
+                await self._drain_collector()
+
+            if self._leader in events:
+                await self._leader_reactor(await self._leader.recv_multipart())
+
+    async def _drain_publisher(self):
+        while self.publisher.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+            self._xpub_reactor(await self.publisher.recv())
+        if self._subscriptions_changed:
+            await self._publish_subscriptions()
+
+    async def _drain_snapshot(self):
+        for _ in range(self._batch_size):
+            [id, *msg] = await self.snapshot.recv_multipart()
+            await self._snapshot_reactor(id, msg)
+            if not self.snapshot.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                break
+
+    async def _drain_collector(self):
+
+        # Read (and publish) the ready messages, without polling between them
+        self.stats.batches += 1
+        for _ in range(self._batch_size):
+            # Forward the payload as a view of the received zmq.Frame
+            frames = await self.collector.recv_multipart(copy=False)
+            frames = unpack_frames(frames)
+            self.stats.received += 1
+
+            # Unless only verified here, the checksum is forwarded as-is
+            if not bus_verified(frames[1]) or verify_checksum(frames[1:-1], frames[-1]):
+                await self._collector_reactor(frames)
+            else:
+                logger.error(
+                    "aiodistbus: Checksum failed for %s", decode_topic(frames[0])
+                )
 
-                # Check if the checksum is correct
-                if verify_checksum(data, checksum):
-                    await self._collector_reactor(topic, data, checksum)
-                else:
-                    logger.error("aiodistbus: Checksum failed for %s", topic.decode())
+            if not self.collector.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                break
 
     async def _pulse(self):
-        event_d = Event("aiodistbus.eventbus.pulse").to_json().encode()
-        await self._emit(b"aiodistbus.eventbus.pulse", event_d)
+        await self._control(Event("aiodistbus.eventbus.pulse"))
 
     ####################################################################
     ## Front-Facing API
     ####################################################################
 
+    @property
+    def subscriptions(self) -> List[str]:
+        """Live subscription prefixes of the DEntryPoints, see ``subscription_prefix``"""
+        return [p.decode("utf-8", "surrogateescape") for p in self._subscriptions]
+
+    def has_subscribers(self, event_type: str) -> bool:
+        """Check if a DEntryPoint would receive an event type
+
+        Args:
+            event_type (str): Event type
+
+        Returns:
+            bool: True if the event would be published
+
+        """
+        topic = event_type.encode("utf-8")
+        if self._agreement.version >= 3:
+            topic += TOPIC_TERMINATOR
+        return self._has_subscribers(topic)
+
     async def flush(self):
         """Flush the eventbus"""
         self._flush_flag.clear()
@@ -199,9 +490,10 @@ class DEventBus(AEventBus):
         # Link
         for event_type in event_types:
             if "*" in event_type:
-                self._lbuses_wildcard[event_type].append(bus)
+                self._lbuses_wildcard.setdefault(event_type, []).append(bus)
+                self._lbuses_router.insert(event_type)
             else:
-                self._lbuses_subs[event_type].append(bus)
+                self._lbuses_subs.setdefault(event_type, []).append(bus)
 
     async def close(self):
         """Close the eventbus"""
@@ -209,8 +501,7 @@ class DEventBus(AEventBus):
         if self._running:
 
             # Inform to stop
-            event_d = Event("aiodistbus.eventbus.close").to_json().encode()
-            await self._emit(b"aiodistbus.eventbus.close", event_d)
+            await self._control(Event("aiodistbus.eventbus.close"))
 
             # Stop the main routine
             self._running = False
@@ -220,6 +511,8 @@ class DEventBus(AEventBus):
             await self.timer.stop()
 
             # Close sockets
+            if self._leader:
+                self._leader.close()
             self.snapshot.close()
             self.publisher.close()
             self.collector.close()
@@ -1,11 +1,12 @@
 import asyncio
 import logging
 import typing
-from collections import defaultdict
-from typing import Coroutine, Dict, Iterable, List, Optional, Type, Union
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Type, Union
 
-from ..protocols import Event, Handler, Subscriptions
-from ..utils import wildcard_search
+from ..protocols import Event, Handler, Route, RouteCacheStats, Subscriptions, _skip
+from ..router import TopicRouter
+from ..utils import wildcard_filtering
 from .aeventbus import AEventBus
 
 logger = logging.getLogger(__name__)
@@ -14,6 +15,64 @@ if typing.TYPE_CHECKING:
     from ..entrypoint import DEntryPoint
 
 
+def _sync_plan(sync: List[Callable]) -> Callable[[Event], None]:
+    if not sync:
+        return _skip
+    if len(sync) == 1:
+        func = sync[0]
+
+        def run_one(event: Event) -> None:
+            func(event)
+
+        return run_one
+
+    def run(event: Event) -> None:
+        for func in sync:
+            func(event)
+
+    return run
+
+
+def dispatch_plan(
+    sync: List[Callable], coroutines: List[Callable]
+) -> Callable[[Event], Optional[Awaitable]]:
+    """Compile the handlers of a topic into a single call
+
+    Sync handlers are run inline, a single async handler's coroutine is
+    returned as-is, and only multiple async handlers are gathered.
+
+    Args:
+        sync (List[Callable]): Sync handlers
+        coroutines (List[Callable]): Async handlers
+
+    Returns:
+        Callable[[Event], Optional[Awaitable]]: Runs the sync handlers and
+            returns the awaitable of the async ones (None if there are none)
+
+    """
+    if not coroutines:
+        return _sync_plan(sync)
+
+    if len(coroutines) == 1:
+        coro = coroutines[0]
+        if not sync:
+            return coro
+
+        def run_await(event: Event) -> Awaitable:
+            for func in sync:
+                func(event)
+            return coro(event)
+
+        return run_await
+
+    def run_gather(event: Event) -> Awaitable:
+        for func in sync:
+            func(event)
+        return asyncio.gather(*[coro(event) for coro in coroutines])
+
+    return run_gather
+
+
 class EventBus(AEventBus):
     """Eventbus
 
@@ -22,34 +81,104 @@ class EventBus(AEventBus):
 
     """
 
-    def __init__(self, debug: bool = False):
+    def __init__(
+        self,
+        debug: bool = False,
+        route_cache_size: int = 1024,
+        compact_interval: int = 10000,
+    ):
+        """Initialize the eventbus
+
+        Args:
+            debug (bool, optional): Log every event. Defaults to False.
+            route_cache_size (int, optional): Number of topics whose handlers are
+                cached (least recently used are evicted). Defaults to 1024.
+            compact_interval (int, optional): Emitted events between compaction
+                passes, see ``compact``. Defaults to 10000.
+
+        """
         super().__init__()
         self._running = True
         self._debug = debug
-        self._wildcard_subs: Dict[str, Dict[str, Subscriptions]] = defaultdict(dict)
+        self._routes: OrderedDict[str, Route] = OrderedDict()
+        self._route_cache_size = route_cache_size
+        self.route_stats = RouteCacheStats()
+        self._wildcard_subs: Dict[str, Dict[str, Subscriptions]] = {}
+        self._wildcard_router = TopicRouter()
         self._dtypes: Dict[str, Union[Type, None]] = {}
         self._dentrypoints: Dict[str, DEntryPoint] = {}
+        self._compact_interval = compact_interval
+        self._compact_countdown = compact_interval
+
+    def _invalidate(self, event_type: str):
+        if "*" in event_type:
+            topics = [t for t in self._routes if wildcard_filtering(t, event_type)]
+        else:
+            topics = [event_type] if event_type in self._routes else []
+
+        for topic in topics:
+            del self._routes[topic]
+        self.route_stats.invalidations += len(topics)
+
+    def _route(self, topic: str) -> Route:
+        route = self._routes.get(topic)
+        if route is not None:
+            self.route_stats.hits += 1
+            self._routes.move_to_end(topic)
+            return route
+        self.route_stats.misses += 1
+
+        # Wildcard subscriptions first, then the topic's subscriptions
+        subs: List[Subscriptions] = []
+        for match in self._wildcard_router.match(topic):
+            subs.extend(self._wildcard_subs[match].values())
+        if topic in self._subs:
+            subs.extend(self._subs[topic].values())
+
+        route = Route()
+        for sub in subs:
+            if asyncio.iscoroutinefunction(sub.handler.function):
+                route.coroutines.append(sub.handler.function)
+            else:
+                route.sync.append(sub.handler.function)
+        route.dispatch = dispatch_plan(route.sync, route.coroutines)
+
+        # Cache it, evicting the least recently used
+        self._routes[topic] = route
+        if len(self._routes) > self._route_cache_size:
+            self._routes.popitem(last=False)
+            self.route_stats.evictions += 1
+        return route
 
     async def _on(self, id: str, handler: Handler):
+        self._invalidate(handler.event_type)
         sub = Subscriptions(id, handler)
         if "*" in handler.event_type:
-            self._wildcard_subs[handler.event_type][id] = sub
+            self._wildcard_subs.setdefault(handler.event_type, {})[id] = sub
+            self._wildcard_router.insert(handler.event_type)
         else:
-            self._subs[handler.event_type][id] = sub
+            self._subs.setdefault(handler.event_type, {})[id] = sub
             self._dtypes[handler.event_type] = handler.dtype
 
     async def _off(self, id: str, event_type: str):
+        self._invalidate(event_type)
         if "*" in event_type:
             del self._wildcard_subs[event_type][id]
+            if len(self._wildcard_subs[event_type]) == 0:
+                del self._wildcard_subs[event_type]
+                self._wildcard_router.remove(event_type)
         else:
             del self._subs[event_type][id]
-            del self._dtypes[event_type]
+            if len(self._subs[event_type]) == 0:
+                del self._subs[event_type]
+                del self._dtypes[event_type]
 
     def _remove(self, id: str):
         to_be_removed: List[str] = []
         for route, subs in self._subs.items():
             if id in subs:
                 del self._subs[route][id]
+                self._invalidate(route)
                 if len(self._subs[route]) == 0:
                     to_be_removed.append(route)
 
@@ -57,40 +186,74 @@ class EventBus(AEventBus):
             del self._subs[route]
             del self._dtypes[route]
 
-    async def _exec(
-        self, coros: List[Coroutine], event: Event, subs: Iterable[Subscriptions]
-    ):
-
-        for sub in subs:
-            # If async function, await it
-            if asyncio.iscoroutinefunction(sub.handler.function):
-                coros.append(sub.handler.function(event))
-            else:
-                sub.handler.function(event)
+        # Including wildcard subscriptions
+        for event_type, subs in list(self._wildcard_subs.items()):
+            if id in subs:
+                del subs[id]
+                self._invalidate(event_type)
+                if len(subs) == 0:
+                    del self._wildcard_subs[event_type]
+                    self._wildcard_router.remove(event_type)
 
     async def _emit(self, event: Event):
 
-        coros: List[Coroutine] = []
-
         # Debug
         if self._debug:
             logger.debug(f"aiodistbus: Event={event}")
 
-        # Handle wildcard subscriptions
-        for match in wildcard_search(event.type, self._wildcard_subs.keys()):
-            await self._exec(coros, event, self._wildcard_subs[match].values())
-
-        # Else, normal subscriptions
-        await self._exec(coros, event, self._subs[event.type].values())
+        # Periodic compaction
+        self._compact_countdown -= 1
+        if self._compact_countdown <= 0:
+            self.compact()
 
-        # Wait for all async functions to finish
-        if len(coros) > 0:
-            await asyncio.gather(*coros)
+        # Handlers of the wildcard and normal subscriptions
+        awaitable = self._route(event.type).dispatch(event)
+        if awaitable is not None:
+            try:
+                await awaitable
+            except asyncio.QueueFull as e:
+                # Already counted as dropped by the handler's queue
+                logger.error(f"aiodistbus: {e}")
 
     ####################################################################
     ## Front-Facing API
     ####################################################################
 
+    def compact(self) -> int:
+        """Remove the routing entries left without handlers
+
+        Lookups never add entries to the subscription tables (only the
+        bounded route cache), so this mostly drops the cached routes of
+        unsubscribed topics. Runs every ``compact_interval`` emitted events.
+
+        Returns:
+            int: Number of removed entries
+
+        """
+        self._compact_countdown = self._compact_interval
+        removed = 0
+
+        # Subscription tables (i.e. emptied outside of _off and _remove)
+        for topic in [t for t, subs in self._subs.items() if not subs]:
+            del self._subs[topic]
+            removed += 1
+        for pattern in [p for p, subs in self._wildcard_subs.items() if not subs]:
+            del self._wildcard_subs[pattern]
+            self._wildcard_router.remove(pattern)
+            removed += 1
+        for topic in [t for t in self._dtypes if t not in self._subs]:
+            del self._dtypes[topic]
+            removed += 1
+
+        # Cached routes without handlers
+        for topic in [
+            t for t, r in self._routes.items() if not (r.sync or r.coroutines)
+        ]:
+            del self._routes[topic]
+            removed += 1
+
+        return removed
+
     async def forward(
         self, ip: str, port: int, event_types: Optional[List[str]] = None
     ):
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Optional
+
+import asyncio_atexit
+
+from ..protocols import Agreement, BrokerStats
+from .deventbus import DEventBus
+
+logger = logging.getLogger("aiodistbus")
+
+
+def _serve_shard(ip: str, port: int, kwargs: Dict[str, Any], conn: Connection):
+    asyncio.run(_shard_main(ip, port, kwargs, conn))
+
+
+async def _shard_main(ip: str, port: int, kwargs: Dict[str, Any], conn: Connection):
+    loop = asyncio.get_running_loop()
+
+    # Report the bound port, then wait for the ports of all the shards
+    dbus = DEventBus(ip, port, **kwargs)
+    conn.send(dbus.port)
+    ports = await loop.run_in_executor(None, conn.recv)
+
+    # The first shard negotiates the formats, the others follow its agreement
+    if dbus.port != ports[0]:
+        await dbus._follow(ip, ports[0])
+    dbus._shards = ports
+    conn.send(None)
+
+    # Serve the requests of the ShardedEventBus until closed
+    while True:
+        command = await loop.run_in_executor(None, conn.recv)
+        if command == "stats":
+            conn.send(dbus.stats)
+        elif command == "agreement":
+            conn.send(dbus._agreement)
+        elif command == "flush":
+            await dbus.flush()
+            conn.send(None)
+        elif command == "close":
+            break
+
+    await dbus.close()
+    conn.send(None)
+
+
+class ShardedEventBus:
+    """Distributed eventbus sharded across processes
+
+    Each shard is a DEventBus running in its own (spawned) process, with its
+    own sockets. The DEntryPoints connect to the first shard, receive the
+    ports of all the shards during the handshake, then subscribe to all of
+    them and send each event type to the shard of its topic hash (see
+    ``utils.shard_index``). The checksum, decoding and publishing work is
+    then spread over the cores, while the events of a topic stay ordered.
+    The first shard negotiates the formats with the DEntryPoints, and the
+    other shards follow its agreement. ``DEntryPoint.connect`` returns once
+    every shard reports its subscriptions, so that none drops its events.
+
+    Older DEntryPoints (and other clients unaware of the shards) only
+    connect to the first shard. While any is connected, the agreement has
+    every DEntryPoint send all the events to the first shard, so that they
+    are still received by all the clients (without spreading the load).
+
+    Forwarding to local eventbuses isn't supported, as the shards run in
+    other processes: use a DEntryPoint instead. The shards are started by
+    ``start``, without blocking the event loop while they bind.
+
+    Args:
+        ip (str): IP address to bind to. Defaults to '127.0.0.1'
+        port (int, optional): Port of the first shard, the others bind to the
+            following ports (3 per shard). Defaults to 0 (random ports).
+        shards (int, optional): Number of shards. Defaults to 2.
+        **kwargs: Other arguments of the DEventBus of each shard
+
+    Raises:
+        ValueError: If the number of shards is not positive
+
+    Examples:
+        >>> sbus = await ShardedEventBus("127.0.0.1", shards=4).start()
+        >>> e1 = DEntryPoint()
+        >>> await e1.connect(sbus.ip, sbus.port)
+        >>> await sbus.close()
+
+    """
+
+    def __init__(
+        self, ip: str = "127.0.0.1", port: int = 0, shards: int = 2, **kwargs: Any
+    ):
+        if shards < 1:
+            raise ValueError(f"Invalid number of shards: {shards}")
+        self._ip: str = ip
+        self._base_port: int = port
+        self._shards: int = shards
+        self._kwargs: Dict[str, Any] = kwargs
+        self._running: bool = True
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._conns: List[Connection] = []
+        self._processes: List[Any] = []
+        self._ports: List[int] = []
+
+    async def _recv_all(self) -> List[Any]:
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(
+            *[loop.run_in_executor(None, conn.recv) for conn in self._conns]
+        )
+
+    async def _request(self, command: str) -> List[Any]:
+        async with self._lock:
+            for conn in self._conns:
+                conn.send(command)
+            return await self._recv_all()
+
+    ####################################################################
+    ## Front-Facing API
+    ####################################################################
+
+    async def start(self) -> "ShardedEventBus":
+        """Start the shards, once they all follow the first one
+
+        Returns:
+            ShardedEventBus: Started eventbus
+
+        """
+        if self._processes:
+            return self
+
+        # The workers are spawned, as the zmq context is not fork-safe
+        ctx = multiprocessing.get_context("spawn")
+        for i in range(self._shards):
+            conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_serve_shard,
+                args=(
+                    self._ip,
+                    self._base_port + 3 * i if self._base_port else 0,
+                    self._kwargs,
+                    child_conn,
+                ),
+                name=f"aiodistbus-shard-{i}",
+                daemon=True,
+            )
+            process.start()
+            self._conns.append(conn)
+            self._processes.append(process)
+
+        # Share the shard map, sent to the DEntryPoints during the handshake,
+        # then wait for the shards to follow the first one
+        self._ports = await self._recv_all()
+        for conn in self._conns:
+            conn.send(self._ports)
+        await self._recv_all()
+
+        asyncio_atexit.register(self.close)
+        return self
+
+    @property
+    def ip(self) -> str:
+        return self._ip
+
+    @property
+    def port(self) -> int:
+        """Port of the first shard, to connect the DEntryPoints to (once started)"""
+        if not self._ports:
+            raise RuntimeError("ShardedEventBus not started")
+        return self._ports[0]
+
+    @property
+    def ports(self) -> List[int]:
+        """Ports of all the shards, empty until started"""
+        return self._ports
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def shard_stats(self) -> List[BrokerStats]:
+        """Stats of each shard
+
+        Returns:
+            List[BrokerStats]: Stats, in the order of the shards
+
+        """
+        return await self._request("stats")
+
+    async def agreements(self) -> List[Agreement]:
+        """Agreement of each shard, the same once the first one's is followed
+
+        Returns:
+            List[Agreement]: Agreements, in the order of the shards
+
+        """
+        return await self._request("agreement")
+
+    async def stats(self) -> BrokerStats:
+        """Stats summed over the shards
+
+        Returns:
+            BrokerStats: Received, published and dropped events, and batches
+
+        """
+        total = BrokerStats()
+        for stats in await self.shard_stats():
+            total.received += stats.received
+            total.published += stats.published
+            total.dropped += stats.dropped
+            total.batches += stats.batches
+        return total
+
+    async def flush(self):
+        """Flush the shards"""
+        await self._request("flush")
+
+    async def close(self, timeout: Optional[float] = 5):
+        """Close the shards and stop their processes
+
+        Args:
+            timeout (Optional[float], optional): Time to wait for each process
+                to exit, before terminating it. Defaults to 5.
+
+        """
+        if not self._running:
+            return
+        self._running = False
+
+        try:
+            await asyncio.wait_for(self._request("close"), timeout)
+        except (asyncio.TimeoutError, EOFError, OSError) as e:
+            logger.error(f"aiodistbus: Failed to close the shards: {e}")
+
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+        for conn in self._conns:
+            conn.close()
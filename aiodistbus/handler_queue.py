@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from typing import Callable, List
+
+from .protocols import Event, QueueConfig, QueueStats
+
+logger = logging.getLogger("aiodistbus")
+
+
+class HandlerQueue:
+    """Bounded queue of a subscription, consumed by its worker coroutines
+
+    With ``ordered`` delivery, each worker owns a queue and the events of a
+    topic are always handled by the same worker, in the order they arrived.
+    Otherwise, the workers share a single queue. When a queue is full, the
+    ``overflow`` policy either waits for room ("block"), drops the oldest
+    queued event ("drop_oldest"), drops the new event ("drop_newest") or
+    raises ``asyncio.QueueFull`` ("error", logged by the eventbuses). Once closed, the new events
+    are dropped until the queue is opened again.
+
+    Args:
+        func (Callable): Wrapped handler, called with each event
+        config (QueueConfig): Size, workers, ordering and overflow policy
+
+    Examples:
+        >>> queue = HandlerQueue(handler, QueueConfig(size=100, workers=4))
+        >>> await queue.put(Event("test", "Hello"))
+        >>> await queue.join()
+        >>> queue.stats
+        QueueStats(depth=0, max_depth=1, processed=1, dropped=0)
+
+    """
+
+    def __init__(self, func: Callable, config: QueueConfig):
+        self.func = func
+        self.config = config
+        self.stats = QueueStats()
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._closed: bool = False
+
+    def _start(self):
+        if self.config.ordered:
+            self._queues = [
+                asyncio.Queue(self.config.size) for _ in range(self.config.workers)
+            ]
+            for queue in self._queues:
+                self._workers.append(asyncio.create_task(self._worker(queue)))
+        else:
+            self._queues = [asyncio.Queue(self.config.size)]
+            for _ in range(self.config.workers):
+                self._workers.append(asyncio.create_task(self._worker(self._queues[0])))
+
+    async def _worker(self, queue: asyncio.Queue):
+        # Until closed, which the handler itself can do
+        while queue in self._queues:
+            event = await queue.get()
+            self.stats.depth -= 1
+            try:
+                awaitable = self.func(event)
+                if awaitable is not None:
+                    await awaitable
+            except Exception as e:
+                logger.error(f"aiodistbus: Error in queued handler ({event.type}): {e}")
+            self.stats.processed += 1
+            queue.task_done()
+
+    async def put(self, event: Event):
+        """Queue an event, applying the overflow policy if full
+
+        Args:
+            event (Event): Event to handle
+
+        Raises:
+            asyncio.QueueFull: If full, with the "error" overflow policy
+
+        """
+        # Closed queues never restart their workers
+        if self._closed:
+            self.stats.dropped += 1
+            return
+
+        # Workers are created on first use, within the running loop
+        if not self._workers:
+            self._start()
+
+        queue = self._queues[hash(event.type) % len(self._queues)]
+        if queue.full():
+            if self.config.overflow == "drop_newest":
+                self.stats.dropped += 1
+                return
+            elif self.config.overflow == "drop_oldest":
+                queue.get_nowait()
+                queue.task_done()
+                self.stats.dropped += 1
+                self.stats.depth -= 1
+            elif self.config.overflow == "error":
+                self.stats.dropped += 1
+                raise asyncio.QueueFull(f"Queue of {event.type} is full")
+
+        await queue.put(event)
+        self.stats.depth += 1
+        self.stats.max_depth = max(self.stats.max_depth, self.stats.depth)
+
+    async def join(self):
+        """Wait until the queued events have been handled"""
+        for queue in self._queues:
+            await queue.join()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def open(self):
+        """Accept events again after being closed, restarting the workers"""
+        self._closed = False
+
+    async def close(self):
+        """Stop the workers, dropping the queued (and later) events"""
+        self._closed = True
+        current = asyncio.current_task()
+        workers = [worker for worker in self._workers if worker is not current]
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+        self.stats.depth = 0
@@ -1,18 +1,247 @@
+import itertools
+import json
+import os
+import time
 import uuid
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Any, Callable, Optional, Type
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
 
 from dataclasses_json import DataClassJsonMixin
 
+# Events are identified by their process (origin) and a sequence number
+EPOCH = datetime(1970, 1, 1)
+_sequence = itertools.count(1)
+_origin = uuid.uuid4().int >> 64
+
+
+def _reset_origin():
+    global _sequence, _origin
+    _sequence = itertools.count(1)
+    _origin = uuid.uuid4().int >> 64
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_origin)
+
+
+class Event:
+    """Event, with its id and timestamp only rendered to strings on request
+
+    Args:
+        type (str): Event type
+        data (Optional[Any], optional): Data. Defaults to None.
+        dtype (Optional[str], optional): Data type. Defaults to None.
+        id (Optional[str], optional): Event ID. Defaults to the next sequence
+            number of this process (``origin``, ``seq``).
+        timestamp (Optional[str], optional): ISO timestamp (UTC). Defaults to
+            now (``timestamp_ns``).
+
+    """
+
+    __slots__ = (
+        "type",
+        "data",
+        "dtype",
+        "origin",
+        "seq",
+        "_id",
+        "_timestamp",
+        "_timestamp_ns",
+    )
+
+    def __init__(
+        self,
+        type: str,
+        data: Optional[Any] = None,
+        dtype: Optional[str] = None,
+        id: Optional[str] = None,
+        timestamp: Optional[str] = None,
+    ):
+        self.type = type
+        self.data = data
+        self.dtype = dtype
+
+        # Remote (or user provided) events keep their ids and timestamps
+        self._id = id
+        self.origin: int = 0 if id else _origin
+        self.seq: int = 0 if id else next(_sequence)
+        self._timestamp = timestamp
+        self._timestamp_ns: Optional[int] = None if timestamp else time.time_ns()
+
+    @property
+    def id(self) -> str:
+        if self._id is None:
+            self._id = f"{self.origin:016x}{self.seq:016x}"
+        return self._id
+
+    @id.setter
+    def id(self, value: str):
+        self._id = value
+
+    @property
+    def timestamp(self) -> str:
+        if self._timestamp is None:
+            delta = timedelta(microseconds=self.timestamp_ns // 1000)
+            self._timestamp = (EPOCH + delta).isoformat()
+        return self._timestamp
+
+    @timestamp.setter
+    def timestamp(self, value: str):
+        self._timestamp = value
+        self._timestamp_ns = None
+
+    @property
+    def timestamp_ns(self) -> int:
+        if self._timestamp_ns is None:
+            delta = datetime.fromisoformat(self.timestamp) - EPOCH
+            self._timestamp_ns = (delta // timedelta(microseconds=1)) * 1000
+        return self._timestamp_ns
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Event):
+            return NotImplemented
+        return self.to_tuple() == other.to_tuple()
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(type={self.type!r}, data={self.data!r}, "
+            f"dtype={self.dtype!r}, id={self.id!r}, timestamp={self.timestamp!r})"
+        )
+
+    def to_tuple(self) -> tuple:
+        return (self.type, self.data, self.dtype, self.id, self.timestamp)
+
+    # Compatibility with the previous DataClassJsonMixin API
+
+    def to_dict(self, encode_json: bool = False) -> Dict[str, Any]:
+        return {
+            "type": self.type,
+            "data": self.data,
+            "dtype": self.dtype,
+            "id": self.id,
+            "timestamp": self.timestamp,
+        }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+    @classmethod
+    def from_dict(cls, kvs: Dict[str, Any], **kwargs) -> "Event":
+        return cls(**kvs)
+
+    @classmethod
+    def from_json(cls, s: str, **kwargs) -> "Event":
+        return cls.from_dict(json.loads(s))
+
+
+class LazyEvent(Event):
+    """Event whose data is only decoded when first accessed
+
+    Args:
+        type (str): Event type
+        loader (Callable[[], Any]): Decodes the data, called at most once
+        dtype (Optional[str], optional): Data type. Defaults to None.
+        id (Optional[str], optional): Event ID. Defaults to None.
+        timestamp (Optional[str], optional): Timestamp. Defaults to None.
+        encoded (Optional[Tuple[Header, List[Any]]], optional): Header and
+            payload frame(s) the data is decoded from, until loaded (i.e. to
+            decode them in another process). Defaults to None.
+
+    """
+
+    __slots__ = ("_loader", "_data", "encoded")
+
+    def __init__(
+        self,
+        type: str,
+        loader: Callable[[], Any],
+        dtype: Optional[str] = None,
+        id: Optional[str] = None,
+        timestamp: Optional[str] = None,
+        encoded: Optional[Tuple["Header", List[Any]]] = None,
+    ):
+        super().__init__(type, None, dtype, id, timestamp)
+        self._loader: Optional[Callable[[], Any]] = loader
+        self.encoded = encoded
+
+    @property  # type: ignore
+    def data(self) -> Any:
+        if self._loader is not None:
+            self._data = self._loader()
+            self._loader = None
+            self.encoded = None
+        return self._data
+
+    @data.setter
+    def data(self, value: Any):
+        self._data = value
+        self._loader = None
+        self.encoded = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loader is None
+
 
 @dataclass
-class Event(DataClassJsonMixin):
-    type: str
-    data: Optional[Any] = None
+class Header:
+    id: str
     dtype: Optional[str] = None
-    id: str = field(default_factory=lambda: str(uuid.uuid4()))
-    timestamp: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    timestamp: str = ""
+    flags: int = 0
+    serializer: int = 0
+
+
+@dataclass
+class Capabilities(DataClassJsonMixin):
+    version: int
+    serializers: List[str] = field(default_factory=lambda: ["json"])
+    compression: List[str] = field(default_factory=lambda: ["none"])
+    checksum: List[str] = field(default_factory=lambda: ["crc32"])
+    control: bool = False  # Receives the control events over the handshake socket
+    shards: bool = False  # Sends each event type to the shard of its topic
+
+
+@dataclass
+class Agreement(DataClassJsonMixin):
+    version: int
+    serializer: str = "json"
+    compression: str = "none"
+    checksum: str = "crc32"
+    shards: bool = False  # Else, all the events are sent to the first shard
+
+
+@dataclass
+class CompressionStats:
+    compressed: int = 0
+    decompressed: int = 0
+    skipped: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    compress_time: float = 0.0
+    decompress_time: float = 0.0
+
+    @property
+    def ratio(self) -> float:
+        """Uncompressed over compressed size of the compressed payloads"""
+        return self.bytes_in / self.bytes_out if self.bytes_out else 1.0
+
+
+@dataclass
+class QueueConfig:
+    size: int = 1000
+    workers: int = 1
+    ordered: bool = True
+    overflow: str = "block"
+
+
+@dataclass
+class QueueStats:
+    depth: int = 0
+    max_depth: int = 0
+    processed: int = 0
+    dropped: int = 0
 
 
 @dataclass
@@ -20,6 +249,62 @@ class Handler:
     event_type: str
     function: Callable
     dtype: Optional[Type] = None
+    unpack: bool = True
+    mode: str = "inline"
+    emit_result: Optional[str] = None
+    queue: Optional[QueueConfig] = None
+
+
+@dataclass
+class HandlerStats:
+    calls: int = 0
+    errors: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    @property
+    def mean_time(self) -> float:
+        """Mean latency of the handler calls, in seconds"""
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+def _skip(event: Event) -> None:
+    return None
+
+
+@dataclass
+class Route:
+    sync: List[Callable] = field(default_factory=list)
+    coroutines: List[Callable] = field(default_factory=list)
+    # Runs the sync handlers, returning the awaitable of the async ones (if any)
+    dispatch: Callable[[Event], Optional[Awaitable]] = _skip
+
+
+@dataclass
+class RouteCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of the emitted events whose route was cached"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class BrokerStats:
+    received: int = 0
+    published: int = 0
+    dropped: int = 0
+    batches: int = 0
+
+    @property
+    def mean_batch(self) -> float:
+        """Mean number of messages read from the collector per wakeup"""
+        return self.received / self.batches if self.batches else 0.0
 
 
 @dataclass
@@ -1,7 +1,8 @@
 from dataclasses import dataclass, field
 from typing import Callable, Dict, Optional, Type
 
-from .protocols import Handler
+from .cfg import HANDLER_MODES, global_config
+from .protocols import Handler, QueueConfig
 from .singleton import Singleton
 
 
@@ -17,7 +18,13 @@ class Registry(Singleton):
         self.namespaces: Dict[str, Namespace] = {}
 
     def on(
-        self, event: str, dtype: Optional[Type] = None, namespace: str = "default"
+        self,
+        event: str,
+        dtype: Optional[Type] = None,
+        namespace: str = "default",
+        mode: str = "inline",
+        emit_result: Optional[str] = None,
+        queue: Optional[QueueConfig] = None,
     ) -> Callable:
         """Decorator to register a handler
 
@@ -25,6 +32,15 @@ class Registry(Singleton):
             event (str): Event type
             dtype (Optional[Type], optional): Data type. Defaults to None.
             namespace (str, optional): Namespace. Defaults to "default".
+            mode (str, optional): Execution mode of sync handlers, see
+                ``AEntryPoint.on``. Defaults to "inline".
+            emit_result (Optional[str], optional): Event type of the results of
+                "process" handlers, see ``AEntryPoint.on``. Defaults to None.
+            queue (Optional[QueueConfig], optional): Bounded queue of the
+                handler, see ``AEntryPoint.on``. Defaults to None.
+
+        Raises:
+            ValueError: If the mode is unknown
 
         Returns:
             Callable: Decorator
@@ -39,13 +55,22 @@ class Registry(Singleton):
             {'test': Handler(event_type='test', function=<function test_handler at 0x7f8b1c0b9d30>, dtype=None)}
 
         """
+        if mode not in HANDLER_MODES:
+            raise ValueError(f"Unknown handler mode: {mode}")
+
         # Store the handler information
         if namespace not in self.namespaces:
             self.namespaces[namespace] = Namespace()
 
+        # Known dtypes are resolved without locating them
+        if dtype:
+            global_config.register_dtype(dtype)
+
         def decorator(func: Callable):
             # Add handler
-            handler = Handler(event, func, dtype)  # <-- Missing func
+            handler = Handler(
+                event, func, dtype, mode=mode, emit_result=emit_result, queue=queue
+            )
             self.namespaces[namespace].handlers[event] = handler
             return func
 
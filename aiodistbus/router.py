@@ -0,0 +1,123 @@
+from typing import Dict, Iterator, List, Optional
+
+from .cfg import EVENT_BLACKLIST
+
+
+class _Node:
+    __slots__ = ("children", "patterns")
+
+    def __init__(self):
+        self.children: Dict[str, _Node] = {}
+        self.patterns: Dict[str, None] = {}  # Ordered set
+
+
+class TopicRouter:
+    """Index of wildcard patterns, as a trie of their topic segments
+
+    A pattern matches the topics that share its segments up to the first
+    ``*``, which stands for one or more segments (i.e. ``"a.*"`` matches
+    ``"a.b"`` and ``"a.b.c"``, but not ``"a"``). Matching a topic walks
+    its segments once, regardless of the number of patterns.
+
+    Examples:
+        >>> router = TopicRouter()
+        >>> router.insert("sensor.*")
+        >>> router.match("sensor.imu.data")
+        ['sensor.*']
+
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._patterns: Dict[str, None] = {}
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def __contains__(self, pattern: str) -> bool:
+        return pattern in self._patterns
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._patterns)
+
+    @staticmethod
+    def _prefix(pattern: str) -> Optional[List[str]]:
+        segments = pattern.split(".")
+        if "*" not in segments:
+            return None
+        return segments[: segments.index("*")]
+
+    def insert(self, pattern: str):
+        """Add a wildcard pattern
+
+        Args:
+            pattern (str): Wildcard pattern (i.e. "sensor.*")
+
+        """
+        if pattern in self._patterns:
+            return
+        self._patterns[pattern] = None
+
+        # Patterns without a "*" segment never match
+        prefix = self._prefix(pattern)
+        if prefix is None:
+            return
+
+        node = self._root
+        for segment in prefix:
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = _Node()
+            node = child
+        node.patterns[pattern] = None
+
+    def remove(self, pattern: str):
+        """Remove a wildcard pattern, pruning the unused branches
+
+        Args:
+            pattern (str): Wildcard pattern
+
+        """
+        if pattern not in self._patterns:
+            return
+        del self._patterns[pattern]
+
+        prefix = self._prefix(pattern)
+        if prefix is None:
+            return
+
+        path = [self._root]
+        for segment in prefix:
+            path.append(path[-1].children[segment])
+        del path[-1].patterns[pattern]
+
+        # Remove the nodes left without patterns or children
+        for i in reversed(range(len(prefix))):
+            node = path[i + 1]
+            if node.patterns or node.children:
+                break
+            del path[i].children[prefix[i]]
+
+    def match(self, topic: str) -> List[str]:
+        """Find the patterns matching a topic
+
+        Args:
+            topic (str): Topic to match
+
+        Returns:
+            List[str]: Matching patterns, shortest prefix first
+
+        """
+        if topic in EVENT_BLACKLIST:
+            return []
+
+        matches: List[str] = []
+        node = self._root
+        for segment in topic.split("."):
+            if node.patterns:
+                matches.extend(node.patterns)
+            child = node.children.get(segment)
+            if child is None:
+                break
+            node = child
+        return matches
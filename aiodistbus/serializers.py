@@ -0,0 +1,66 @@
+import json
+from abc import ABC, abstractmethod
+from typing import Any
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None  # type: ignore
+
+
+class Serializer(ABC):
+    """Serializer backend for JSON-like data
+
+    ``DataClassJsonMixin`` payloads are converted to JSON-like data by their
+    compiled codec (see ``global_config.get_dataclass_codec``) first.
+
+    Each backend has a unique ``id`` (sent in the frame header) and ``name``
+    (used to select it in ``global_config``, ``DEventBus`` and ``DEntryPoint``).
+    During the handshake, the supported backend with the highest ``priority``
+    is used.
+
+    """
+
+    id: int
+    name: str
+    priority: int = 0
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> bytes:
+        ...
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Any:
+        ...
+
+
+class JsonSerializer(Serializer):
+    """Default serializer, using the standard library's ``json``"""
+
+    id = 0
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(str(data, "utf-8"))
+
+
+class MsgpackSerializer(Serializer):
+    """Compact binary serializer, requires the optional ``msgpack`` package
+
+    Only used if selected, as it doesn't accept all the JSON-like data (i.e.
+    integers above 64 bits), while non-string keys are kept as they are.
+
+    """
+
+    id = 1
+    name = "msgpack"
+    priority = -10
+
+    def dumps(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
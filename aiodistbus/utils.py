@@ -1,12 +1,25 @@
 import logging
+import struct
+import time
 import zlib
-from pydoc import locate
-from typing import Any, Coroutine, Iterable, List, Optional, Type
+from dataclasses import is_dataclass
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 from dataclasses_json import DataClassJsonMixin
 
-from .cfg import EVENT_BLACKLIST, global_config
-from .protocols import Event
+from .cfg import EVENT_BLACKLIST, Frames, global_config
+from .compressors import Compressor
+from .protocols import Agreement, Capabilities, Event, Header, LazyEvent
 
 logger = logging.getLogger("aiodistbus")
 
@@ -73,70 +86,443 @@ async def safe_coro(coro: Coroutine, error_msg: Optional[str] = None):
             logger.error(f"aiodistbus: Error in coroutine {coro}: {e}")
 
 
+#############################################################################
+## Framing
+#############################################################################
+
+# Wire layout: [topic, header, *payload, checksum], where the payload is
+# usually one frame but codecs can split it (i.e. metadata + raw buffer)
+# Header layout: version (u8), flags (u8), serializer id (u8), len(id) (u16),
+# len(dtype) (u16), followed by the id, dtype and timestamp strings (utf-8).
+# Version 1 headers (without the serializer id) are still decoded as JSON.
+# The lower bits of the flags hold the id of the payload's compressor, and
+# the next two bits the checksum algorithm (0 being CRC32, for older peers).
+# Since version 3, the topic frame ends with TOPIC_TERMINATOR, so that the
+# SUB prefix filtering matches whole segments (see ``subscription_prefix``).
+WIRE_VERSION = 3
+TOPIC_TERMINATOR = b"\0"
+HEADER_STRUCT = struct.Struct("!BBBHH")
+HEADER_STRUCT_V1 = struct.Struct("!BBHH")
+COMPRESSION_MASK = 0x0F
+CHECKSUM_MASK = 0x30
+CHECKSUM_SHIFT = 4
+CHECKSUM_IDS = {"crc32": 0, "adler32": 1, "sender": 2, "none": 3}
+
+
+def encode_header(
+    event: Event, flags: int = 0, serializer: int = 0, version: int = WIRE_VERSION
+) -> bytes:
+    """Encode the metadata of an event into a header frame
+
+    Args:
+        event (Event): Event to encode
+        flags (int, optional): Header flags. Defaults to 0.
+        serializer (int, optional): Id of the serializer backend. Defaults to 0.
+        version (int, optional): Highest wire version the receivers understand.
+            Defaults to WIRE_VERSION.
+
+    Returns:
+        bytes: Header frame
+
+    """
+    id = event.id.encode("utf-8")
+    dtype = (event.dtype or "").encode("utf-8")
+
+    # Version 1 can only be used for the default (json) serializer
+    if version == 1 and serializer == 0:
+        prefix = HEADER_STRUCT_V1.pack(1, flags, len(id), len(dtype))
+    else:
+        prefix = HEADER_STRUCT.pack(
+            max(version, 2), flags, serializer, len(id), len(dtype)
+        )
+    return prefix + id + dtype + event.timestamp.encode("utf-8")
+
+
+def decode_header(header: bytes) -> Header:
+    """Decode a header frame
+
+    Args:
+        header (bytes): Header frame
+
+    Raises:
+        ValueError: If the header has an unsupported version
+
+    Returns:
+        Header: Header information
+
+    """
+    version = header[0]
+    if 2 <= version <= WIRE_VERSION:
+        _, flags, serializer, id_len, dtype_len = HEADER_STRUCT.unpack_from(header)
+        start = HEADER_STRUCT.size
+    elif version == 1:
+        _, flags, id_len, dtype_len = HEADER_STRUCT_V1.unpack_from(header)
+        serializer = 0
+        start = HEADER_STRUCT_V1.size
+    else:
+        raise ValueError(f"Unsupported wire version: {version}")
+
+    id = header[start : start + id_len].decode("utf-8")
+    start += id_len
+    dtype = header[start : start + dtype_len].decode("utf-8") or None
+    start += dtype_len
+    timestamp = header[start:].decode("utf-8")
+    return Header(id, dtype, timestamp, flags, serializer)
+
+
+def encode_frames(
+    event: Event, serializer: int = 0, version: int = WIRE_VERSION, flags: int = 0
+) -> List[bytes]:
+    """Encode an event (with already encoded data) into frames
+
+    Args:
+        event (Event): Event whose data is already encoded to bytes (or a
+            list of bytes for multipart payloads)
+        serializer (int, optional): Id of the serializer backend. Defaults to 0.
+        version (int, optional): Highest wire version the receivers understand.
+            Defaults to WIRE_VERSION.
+        flags (int, optional): Header flags (i.e. from ``compress``). Defaults to 0.
+
+    Returns:
+        List[bytes]: Topic, header, payload(s) and checksum frames
+
+    """
+    header = encode_header(event, flags, serializer, version)
+    if event.data is None:
+        payload = [b""]
+    elif isinstance(event.data, list):
+        payload = event.data
+    else:
+        payload = [event.data]
+    topic = event.type.encode("utf-8")
+    if version >= 3:
+        topic += TOPIC_TERMINATOR
+    return [
+        topic,
+        header,
+        *payload,
+        compute_checksum([header, *payload]),
+    ]
+
+
+def unpack_frames(frames: List[Any]) -> List[Any]:
+    """Unpack frames received with ``copy=False``
+
+    The small frames are copied to bytes, while the payload is kept as a
+    memoryview of its ``zmq.Frame`` to avoid copying it.
+
+    Args:
+        frames (List[zmq.Frame]): Topic, header, payload(s) and checksum frames
+
+    Returns:
+        List[Any]: Topic, header, payload(s) (memoryview) and checksum
+
+    """
+    [topic, header, *payload, checksum] = frames
+    return [topic.bytes, header.bytes, *[p.buffer for p in payload], checksum.bytes]
+
+
+def decode_topic(topic: bytes) -> str:
+    """Decode a topic frame, with or without its terminator
+
+    Args:
+        topic (bytes): Topic frame
+
+    Returns:
+        str: Topic
+
+    """
+    if topic[-1:] == TOPIC_TERMINATOR:
+        topic = topic[:-1]
+    return topic.decode("utf-8")
+
+
+def subscription_prefix(event_type: str, precise: bool = True) -> bytes:
+    """ZeroMQ subscription (topic frame prefix) for an event type or pattern
+
+    Wildcard patterns subscribe to whole segments: ``"sensor.*"`` to
+    ``"sensor."``, which does not match ``"sensors_raw.big"``. Exact event
+    types need terminated topic frames (wire version 3) to not also match
+    longer topics (i.e. ``"test"`` and ``"test.a"``).
+
+    Args:
+        event_type (str): Event type or wildcard pattern
+        precise (bool, optional): If the topic frames are terminated.
+            Defaults to True.
+
+    Returns:
+        bytes: Subscription prefix
+
+    """
+    if "*" not in event_type:
+        topic = event_type.encode("utf-8")
+        return topic + TOPIC_TERMINATOR if precise else topic
+
+    segments = event_type.split(".")
+    if "*" in segments:
+        prefix = ".".join(segments[: segments.index("*")])
+        return (prefix + ".").encode("utf-8") if prefix else b""
+
+    # Partial segments (i.e. "sensor*") are never matched by the handlers
+    return event_type.split("*")[0].encode("utf-8")
+
+
+def shard_index(event_type: str, shards: int) -> int:
+    """Shard of a sharded DEventBus that forwards an event type
+
+    The CRC32 of the event type is used (rather than ``hash``) so that all
+    the processes agree on the shard, keeping the events of a topic ordered.
+
+    Args:
+        event_type (str): Event type
+        shards (int): Number of shards
+
+    Returns:
+        int: Index of the shard
+
+    """
+    return zlib.crc32(event_type.encode("utf-8")) % shards
+
+
+#############################################################################
+## Handshake
+#############################################################################
+
+# Clients of the wire version 1, that connect without sending their capabilities.
+# Clients from before the binary wire format (sending the event as a single JSON
+# frame) aren't supported.
+LEGACY_CAPABILITIES = Capabilities(version=1)
+
+
+def local_capabilities() -> Capabilities:
+    """Capabilities of this process, in order of preference
+
+    Returns:
+        Capabilities: Supported wire version, serializers, compression, checksum,
+            control channel and sharding
+
+    """
+    serializers = sorted(
+        global_config.serializers.values(), key=lambda x: x.priority, reverse=True
+    )
+    compressors = sorted(
+        global_config.compressors.values(), key=lambda x: x.priority, reverse=True
+    )
+    return Capabilities(
+        WIRE_VERSION,
+        [x.name for x in serializers],
+        [x.name for x in compressors] + ["none"],
+        INTEGRITY_MODES,
+        control=True,
+        shards=True,
+    )
+
+
+def negotiate(
+    server: Capabilities,
+    clients: Iterable[Capabilities],
+    serializer: Optional[str] = None,
+    compression: Optional[str] = None,
+    integrity: Optional[str] = None,
+) -> Agreement:
+    """Select the fastest formats understood by the server and all the clients
+
+    Since the DEventBus broadcasts every message to all subscribers, the
+    agreement has to be understood by every connected client. Compression
+    trades CPU time for bandwidth, so it is only used if requested. The
+    events are only spread over the shards (if sharded) if every client
+    receives from all of them.
+
+    Args:
+        server (Capabilities): Capabilities of the DEventBus
+        clients (Iterable[Capabilities]): Capabilities of the connected clients
+        serializer (Optional[str], optional): Preferred serializer. Defaults to None.
+        compression (Optional[str], optional): Requested compression. Defaults
+            to None (no compression).
+        integrity (Optional[str], optional): Requested integrity mode. Defaults
+            to None (end-to-end CRC32).
+
+    Returns:
+        Agreement: Agreed wire version, serializer, compression, checksum and
+            sharding
+
+    """
+    clients = list(clients)
+
+    def choose(options: List[str], key: str, default: str) -> str:
+        for option in options:
+            if all(option in getattr(c, key) for c in clients):
+                return option
+        return default
+
+    serializers = server.serializers
+    if serializer in serializers:
+        serializers = [serializer] + [s for s in serializers if s != serializer]
+
+    return Agreement(
+        version=min([server.version] + [c.version for c in clients]),
+        serializer=choose(serializers, "serializers", "json"),
+        compression=choose([compression] if compression else [], "compression", "none"),
+        checksum=choose([integrity] if integrity else [], "checksum", "crc32"),
+        shards=all(c.shards for c in [server, *clients]),
+    )
+
+
 #############################################################################
 ## Decoding
 #############################################################################
 
 
-def decode(event_str: str) -> Event:
-    """Decode an event from a string
+def decode(topic: bytes, header: bytes, payload: List[bytes]) -> Tuple[Event, Header]:
+    """Decode an event from its frames
 
     Args:
-        event_str (str): Event string
+        topic (bytes): Topic frame
+        header (bytes): Header frame
+        payload (List[bytes]): Payload frame(s)
 
     Returns:
-        Event: Event object
+        Tuple[Event, Header]: Event object (with still encoded data) and header
 
     """
-    event = Event.from_json(event_str)
-    if isinstance(event.data, list):
-        event.data = bytes(event.data)
-    return event
+    h = decode_header(header)
+    data = decode_payload(h, payload)
+    return Event(decode_topic(topic), data, h.dtype, h.id, h.timestamp), h
+
+
+def decode_payload(h: Header, payload: List[bytes]) -> Any:
+    """Decompress and unpack the payload frame(s) of an event
+
+    Args:
+        h (Header): Header of the event
+        payload (List[bytes]): Payload frame(s)
+
+    Returns:
+        Any: Still encoded data, None if the event has no dtype
+
+    """
+    if h.flags & COMPRESSION_MASK:
+        payload = decompress(payload, h.flags)
+
+    # Events without a dtype (i.e. control events) carry no data
+    if not h.dtype:
+        return None
+    elif len(payload) == 1:
+        return payload[0]
+    else:
+        return payload
 
 
-def reconstruct_event_data(event: Event, dtype: Type) -> Event:
+def reconstruct_event_data(
+    event: Event, dtype: Type, serializer: Union[str, int, None] = None
+) -> Event:
     """Reconstruct the data of an event
 
     Args:
         event (Event): Event to reconstruct
         dtype (Type): Type to reconstruct to
+        serializer (Union[str, int, None], optional): Serializer backend used to
+            encode the data. Defaults to None (the default serializer).
+
+    Raises:
+        ValueError: If no decoder is found for the dtype
 
     Returns:
         Event: Reconstructed event
 
     """
-    if hasattr(dtype, "__annotations__"):
-        decoder = lambda x: dtype.from_json(bytes(x).decode())  # noqa: E731
+    if is_dataclass(dtype):
+        backend = global_config.get_serializer(serializer)
+        codec = global_config.get_dataclass_codec(dtype)
+        decoder = lambda x: codec.decode(backend.loads(x))  # noqa: E731
     else:
         try:
-            decoder = global_config.get_decoder(dtype)
+            decoder = global_config.get_decoder(dtype, serializer)
         except ValueError:
             logger.error(f"Could not find decoder for {dtype}")
+            raise
 
     event.data = decoder(event.data)
 
     return event
 
 
-async def reconstruct(event_str: str, dtype: Optional[Type] = None) -> Event:
-    """Reconstruct an event from a string
+async def reconstruct(
+    topic: bytes,
+    header: bytes,
+    payload: List[bytes],
+    dtype: Optional[Type] = None,
+    lazy: bool = False,
+) -> Event:
+    """Reconstruct an event from its frames
 
     Args:
-        event_str (str): Event string
+        topic (bytes): Topic frame
+        header (bytes): Header frame
+        payload (List[bytes]): Payload frame(s)
         dtype (Optional[Type], optional): Type to reconstruct to. Defaults to None.
+        lazy (bool, optional): Only decode the data when first accessed, errors
+            are then raised by ``event.data``. Defaults to False.
 
     Returns:
         Event: Reconstructed event
 
     """
-    event = decode(event_str)  # str -> Event
+    if lazy:
+        h = decode_header(header)
+        return LazyEvent(
+            decode_topic(topic),
+            lambda: reconstruct_payload(h, payload, dtype),
+            h.dtype,
+            h.id,
+            h.timestamp,
+            (h, payload),
+        )
+
+    event, h = decode(topic, header, payload)  # frames -> Event
+    event.data = reconstruct_data(event, h.serializer, dtype)
+    return event
+
+
+def reconstruct_payload(
+    h: Header, payload: List[Any], dtype: Optional[Type] = None
+) -> Any:
+    """Reconstruct the data from the payload frame(s) of an event
+
+    Args:
+        h (Header): Header of the event
+        payload (List[Any]): Payload frame(s)
+        dtype (Optional[Type], optional): Type to reconstruct to. Defaults to None.
+
+    Returns:
+        Any: Reconstructed data
+
+    """
+    event = Event("", decode_payload(h, payload), h.dtype)
+    return reconstruct_data(event, h.serializer, dtype)
+
+
+def reconstruct_data(
+    event: Event, serializer: int, dtype: Optional[Type] = None
+) -> Any:
+    """Reconstruct the data of a decoded event, to its dtype if not given
+
+    Args:
+        event (Event): Event with still encoded data
+        serializer (int): Id of the serializer backend
+        dtype (Optional[Type], optional): Type to reconstruct to. Defaults to None.
+
+    Returns:
+        Any: Reconstructed data
+
+    """
     if dtype:
-        event = reconstruct_event_data(event, dtype)
+        event = reconstruct_event_data(event, dtype, serializer)
     elif event.dtype and event.dtype != "builtins.NoneType":
-        l_dtype = locate(event.dtype)
-        event = reconstruct_event_data(event, l_dtype)  # type: ignore
+        l_dtype = global_config.locate_dtype(event.dtype)
+        event = reconstruct_event_data(event, l_dtype, serializer)
 
-    return event
+    return event.data
 
 
 #############################################################################
@@ -144,40 +530,210 @@ async def reconstruct(event_str: str, dtype: Optional[Type] = None) -> Event:
 #############################################################################
 
 
-def encode(data: Any) -> bytes:
+def encode(data: Any, serializer: Optional[str] = None) -> Union[bytes, List[bytes]]:
     """Encode data to bytes
 
     Args:
         data (Any): Data to encode
+        serializer (Optional[str], optional): Serializer backend for JSON-like
+            data and dataclasses. Defaults to None (the default serializer).
 
     Returns:
-        bytes: Encoded data
+        Union[bytes, List[bytes]]: Encoded data (multiple frames for some codecs)
 
     """
     # Serialize the data
+    encoder: Callable[[Any], Frames]
     if isinstance(data, DataClassJsonMixin):
-        encoder = lambda x: x.to_json().encode("utf-8")  # noqa: E731
+        backend = global_config.get_serializer(serializer)
+        codec = global_config.get_dataclass_codec(type(data))
+        encoder = lambda x: backend.dumps(codec.encode(x))  # noqa: E731
     else:
-        encoder = global_config.get_encoder(type(data))
+        encoder = global_config.get_encoder(type(data), serializer)
 
     # Encode the data
     return encoder(data)
 
 
+#############################################################################
+## Compression
+#############################################################################
+
+
+def compression_threshold(topic: str) -> Optional[int]:
+    """Payload size above which a topic is compressed
+
+    Args:
+        topic (str): Topic of the event
+
+    Returns:
+        Optional[int]: Threshold in bytes, None if the topic is never compressed
+
+    """
+    thresholds = global_config.compression_thresholds
+    if topic in thresholds:
+        return thresholds[topic]
+
+    # The most specific wildcard pattern wins, matched once per topic
+    if topic not in thresholds.matches:
+        if len(thresholds.matches) >= thresholds.size:
+            thresholds.matches.clear()
+        thresholds.matches[topic] = next(
+            (x for x in thresholds.patterns if wildcard_filtering(topic, x)), None
+        )
+    pattern = thresholds.matches[topic]
+    if pattern is None:
+        return global_config.compression_threshold
+    return thresholds[pattern]
+
+
+def compress(topic: str, data: Frames, compressor: Compressor) -> Tuple[Frames, int]:
+    """Compress encoded data, if large enough and worth it
+
+    Args:
+        topic (str): Topic of the event
+        data (Frames): Encoded data
+        compressor (Compressor): Compression backend
+
+    Returns:
+        Tuple[Frames, int]: (Possibly) compressed data and its header flags
+
+    """
+    threshold = compression_threshold(topic)
+    frames = data if isinstance(data, list) else [data]
+    size = sum(memoryview(f).nbytes for f in frames)
+    if threshold is None or size < threshold:
+        return data, 0
+
+    tic = time.perf_counter()
+    compressed = [compressor.compress(f) for f in frames]
+    compressor.stats.compress_time += time.perf_counter() - tic
+
+    # Incompressible data (i.e. already compressed) is sent as-is
+    compressed_size = sum(len(f) for f in compressed)
+    if compressed_size >= size:
+        compressor.stats.skipped += 1
+        return data, 0
+
+    compressor.stats.compressed += 1
+    compressor.stats.bytes_in += size
+    compressor.stats.bytes_out += compressed_size
+    return (compressed if isinstance(data, list) else compressed[0]), compressor.id
+
+
+def decompress(payload: List[bytes], flags: int) -> List[bytes]:
+    """Decompress payload frames
+
+    Args:
+        payload (List[bytes]): Compressed payload frame(s)
+        flags (int): Header flags, holding the compressor's id
+
+    Raises:
+        ValueError: If the compressor is not available
+
+    Returns:
+        List[bytes]: Decompressed payload frame(s)
+
+    """
+    compressor = global_config.get_compressor(flags & COMPRESSION_MASK)
+    assert compressor
+
+    tic = time.perf_counter()
+    payload = [compressor.decompress(p) for p in payload]
+    compressor.stats.decompress_time += time.perf_counter() - tic
+    compressor.stats.decompressed += 1
+    return payload
+
+
 #############################################################################
 ## Checksum
 #############################################################################
 
+# Integrity modes, negotiated during the handshake:
+# - crc32: computed by the sender, verified by every receiver
+# - adler32: same as crc32, with a faster (but weaker) checksum
+# - sender: CRC32 computed by the sender, only verified by the DEventBus
+# - none: no checksum, relying on the transport (i.e. TCP or IPC)
+# The mode of each message is recorded in its header, so that an entrypoint
+# overriding the negotiated mode is still verified. The DEventBus forwards the
+# checksum frame as-is, and only verifies it for the messages in the sender
+# mode or before delivering events to its local buses.
+INTEGRITY_MODES = ["crc32", "adler32", "sender", "none"]
+
+
+def checksum_flags(integrity: str) -> int:
+    """Header flags of the checksum algorithm used by an integrity mode
+
+    Args:
+        integrity (str): Integrity mode
+
+    Returns:
+        int: Header flags
+
+    """
+    return CHECKSUM_IDS.get(integrity, 0) << CHECKSUM_SHIFT
+
+
+def compute_checksum(frames: List[bytes]) -> bytes:
+    """Compute the checksum of a sequence of frames
+
+    The algorithm is selected by the flags of the header (the first frame).
+
+    Args:
+        frames (List[bytes]): Header and payload frames to checksum
+
+    Raises:
+        ValueError: If the checksum algorithm is unknown
+
+    Returns:
+        bytes: Checksum (4 bytes, big endian), empty if disabled
 
-def verify_checksum(data: bytes, checksum: bytes) -> bool:
-    """Verify the checksum of data
+    """
+    algorithm = (frames[0][1] & CHECKSUM_MASK) >> CHECKSUM_SHIFT
+    if algorithm in (CHECKSUM_IDS["crc32"], CHECKSUM_IDS["sender"]):
+        crc = 0
+        for frame in frames:
+            crc = zlib.crc32(frame, crc)
+        return crc.to_bytes(4, "big")
+    elif algorithm == CHECKSUM_IDS["adler32"]:
+        adler = 1
+        for frame in frames:
+            adler = zlib.adler32(frame, adler)
+        return adler.to_bytes(4, "big")
+    elif algorithm == CHECKSUM_IDS["none"]:
+        return b""
+    raise ValueError(f"Unknown checksum algorithm: {algorithm}")
+
+
+def bus_verified(header: bytes) -> bool:
+    """Check if the checksum of a message is only verified by the DEventBus
 
     Args:
-        data (bytes): Data to verify
+        header (bytes): Header frame of the message
+
+    Returns:
+        bool: True if sent in the sender integrity mode
+
+    """
+    try:
+        algorithm = (header[1] & CHECKSUM_MASK) >> CHECKSUM_SHIFT
+    except IndexError:
+        return False
+    return algorithm == CHECKSUM_IDS["sender"]
+
+
+def verify_checksum(frames: List[bytes], checksum: bytes) -> bool:
+    """Verify the checksum of a sequence of frames
+
+    Args:
+        frames (List[bytes]): Header and payload frames to verify
         checksum (bytes): Checksum to verify against
 
     Returns:
-        bool: True if checksum is correct
+        bool: True if checksum is correct (or disabled)
 
     """
-    return zlib.crc32(data) == int.from_bytes(checksum, "big")
+    try:
+        return compute_checksum(frames) == checksum
+    except (IndexError, ValueError):
+        return False
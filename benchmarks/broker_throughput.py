@@ -0,0 +1,60 @@
+"""Compare the DEventBus throughput with and without batch draining
+
+Usage:
+    python benchmarks/broker_throughput.py
+
+"""
+import asyncio
+import time
+from typing import List
+
+from aiodistbus import DEntryPoint, DEventBus
+
+PUBLISHERS = 8
+N = 5000
+BATCH_SIZES = [1, 16, 256]
+
+
+def handler(data: bytes):
+    ...
+
+
+async def publish(e: DEntryPoint):
+    for _ in range(N):
+        await e.emit("sensor.imu", b"\x00" * 64)
+
+
+async def run(batch_size: int) -> List[float]:
+    dbus = DEventBus(ip="127.0.0.1", batch_size=batch_size)
+    sub = DEntryPoint()
+    await sub.on("sensor.imu", handler, bytes)
+    await sub.connect(dbus.ip, dbus.port)
+    publishers = [DEntryPoint() for _ in range(PUBLISHERS)]
+    for e in publishers:
+        await e.connect(dbus.ip, dbus.port)
+    await asyncio.sleep(0.5)
+
+    # Time until the DEventBus has published every event
+    total = PUBLISHERS * N
+    tic = time.perf_counter()
+    await asyncio.gather(*[publish(e) for e in publishers])
+    while dbus.stats.published < total:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - tic
+
+    for e in [sub, *publishers]:
+        await e.close()
+    await dbus.close()
+    return [total / elapsed, dbus.stats.mean_batch]
+
+
+async def main():
+    print(f"{PUBLISHERS} publishers, {N} events each")
+    print(f"{'batch size':<12}{'events/s':>12}{'mean batch':>12}")
+    for batch_size in BATCH_SIZES:
+        rate, mean_batch = await run(batch_size)
+        print(f"{batch_size:<12}{rate:>12.0f}{mean_batch:>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""Compare compiled dataclass codecs against dataclasses_json's to_json/from_json
+
+Usage:
+    python benchmarks/dataclass_codec.py
+
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from dataclasses_json import DataClassJsonMixin
+
+from aiodistbus import global_config
+
+N = 10000
+
+
+@dataclass
+class ExampleEvent(DataClassJsonMixin):
+    msg: str
+
+
+@dataclass
+class StressTestEvent(DataClassJsonMixin):
+    extra_id: str
+
+
+@dataclass
+class Reading:
+    value: float
+    unit: str
+
+
+@dataclass
+class NestedEvent(DataClassJsonMixin):
+    sensor: str
+    readings: List[Reading] = field(default_factory=list)
+    tags: Dict[str, str] = field(default_factory=dict)
+    last: Optional[Reading] = None
+
+
+PAYLOADS: Dict[str, DataClassJsonMixin] = {
+    "ExampleEvent": ExampleEvent("hello"),
+    "StressTestEvent": StressTestEvent("0f4c8e1a-4b4e-4c1e-9b7a-2b1d6b0f9c31"),
+    "NestedEvent": NestedEvent(
+        "imu",
+        [Reading(float(i), "m/s^2") for i in range(16)],
+        {"axis": "xyz"},
+        Reading(1.0, "m/s^2"),
+    ),
+}
+
+
+def timeit(func: Callable) -> float:
+    tic = time.perf_counter()
+    for _ in range(N):
+        func()
+    toc = time.perf_counter()
+    return (toc - tic) / N * 1e6
+
+
+def main():
+    backend = global_config.get_serializer("json")
+    print(f"{'payload':<16}{'codec':<12}{'enc us':>10}{'dec us':>10}")
+    for name, data in PAYLOADS.items():
+        dtype = type(data)
+        codec = global_config.get_dataclass_codec(dtype)
+        raw = data.to_json().encode("utf-8")
+
+        enc = timeit(lambda data=data: data.to_json().encode("utf-8"))
+        dec = timeit(lambda dtype=dtype, raw=raw: dtype.from_json(str(raw, "utf-8")))
+        print(f"{name:<16}{'to/from_json':<12}{enc:>10.2f}{dec:>10.2f}")
+
+        enc = timeit(lambda codec=codec, data=data: backend.dumps(codec.encode(data)))
+        dec = timeit(lambda codec=codec, raw=raw: codec.decode(backend.loads(raw)))
+        print(f"{name:<16}{'compiled':<12}{enc:>10.2f}{dec:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Compare the compiled dispatch plans against gathering every handler
+
+Usage:
+    python benchmarks/dispatch.py
+
+"""
+import asyncio
+import time
+from typing import Callable, Coroutine, List
+
+from aiodistbus import EntryPoint, Event, EventBus
+
+N = 100000
+
+
+def sync_handler(data: int):
+    ...
+
+
+async def async_handler(data: int):
+    ...
+
+
+async def gather_emit(bus: EventBus, event: Event):
+    # Previous dispatch: every async handler is gathered, even a single one
+    route = bus._route(event.type)
+    coros: List[Coroutine] = []
+    for func in route.sync:
+        func(event)
+    for func in route.coroutines:
+        coros.append(func(event))
+    if len(coros) > 0:
+        await asyncio.gather(*coros)
+
+
+async def timeit(func: Callable) -> float:
+    tic = time.perf_counter()
+    for _ in range(N):
+        await func()
+    toc = time.perf_counter()
+    return (toc - tic) / N * 1e6
+
+
+async def main():
+    cases = {
+        "1 sync": [sync_handler],
+        "1 async": [async_handler],
+        "1 sync, 1 async": [sync_handler, async_handler],
+        "2 async": [async_handler, async_handler],
+    }
+    print(f"{'handlers':<18}{'gather us':>12}{'plan us':>12}")
+    for name, handlers in cases.items():
+        bus = EventBus()
+        for handler in handlers:
+            e = EntryPoint()
+            await e.connect(bus)
+            await e.on("test", handler, int)
+        event = Event("test", 1)
+
+        gather = await timeit(lambda bus=bus, event=event: gather_emit(bus, event))
+        plan = await timeit(lambda bus=bus, event=event: bus._emit(event))
+        print(f"{name:<18}{gather:>12.2f}{plan:>12.2f}")
+        await bus.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+"""Compare the topic router against the linear wildcard search
+
+Usage:
+    python benchmarks/router.py
+
+"""
+import time
+from typing import Callable
+
+from aiodistbus.router import TopicRouter
+from aiodistbus.utils import wildcard_search
+
+N = 10000
+TOPIC = "sensor.17.imu.data"
+
+
+def timeit(func: Callable) -> float:
+    tic = time.perf_counter()
+    for _ in range(N):
+        func()
+    toc = time.perf_counter()
+    return (toc - tic) / N * 1e6
+
+
+def main():
+    print(f"{'patterns':<12}{'linear us':>12}{'router us':>12}")
+    for n in [10, 100, 1000]:
+        patterns = [f"sensor.{i}.*" for i in range(n)]
+        router = TopicRouter()
+        for pattern in patterns:
+            router.insert(pattern)
+        assert router.match(TOPIC) == wildcard_search(TOPIC, patterns)
+
+        linear = timeit(lambda patterns=patterns: wildcard_search(TOPIC, patterns))
+        trie = timeit(lambda router=router: router.match(TOPIC))
+        print(f"{n:<12}{linear:>12.2f}{trie:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
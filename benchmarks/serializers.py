@@ -0,0 +1,66 @@
+"""Compare the serializer backends on the encode -> frames -> reconstruct path
+
+Usage:
+    python benchmarks/serializers.py
+
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from dataclasses_json import DataClassJsonMixin
+
+from aiodistbus import Event, global_config
+from aiodistbus.utils import encode, encode_frames, reconstruct
+
+N = 10000
+
+
+@dataclass
+class ExampleEvent(DataClassJsonMixin):
+    msg: str
+
+
+@dataclass
+class TelemetryEvent(DataClassJsonMixin):
+    sensor: str
+    values: List[float] = field(default_factory=list)
+    tags: Dict[str, str] = field(default_factory=dict)
+
+
+PAYLOADS: Dict[str, Any] = {
+    "ExampleEvent": ExampleEvent("hello"),
+    "TelemetryEvent": TelemetryEvent(
+        "imu", [float(i) for i in range(64)], {"unit": "m/s^2", "axis": "xyz"}
+    ),
+    "dict": {"id": 1, "values": list(range(64)), "name": "sensor"},
+}
+
+
+async def roundtrip(data: Any, serializer: str) -> int:
+    backend = global_config.get_serializer(serializer)
+    dtype = type(data)
+    dtype_str = f"{dtype.__module__}.{dtype.__name__}"
+
+    event = Event("bench", encode(data, serializer), dtype=dtype_str)
+    [topic, header, *payload, _] = encode_frames(event, backend.id)
+    await reconstruct(topic, header, payload, dtype)
+    return sum(len(p) for p in payload)
+
+
+async def main():
+    print(f"{'payload':<16}{'serializer':<12}{'size (B)':>10}{'us/msg':>10}")
+    for name, data in PAYLOADS.items():
+        for serializer in global_config.serializers:
+            size = await roundtrip(data, serializer)
+            tic = time.perf_counter()
+            for _ in range(N):
+                await roundtrip(data, serializer)
+            toc = time.perf_counter()
+            us = (toc - tic) / N * 1e6
+            print(f"{name:<16}{serializer:<12}{size:>10}{us:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
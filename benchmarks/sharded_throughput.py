@@ -0,0 +1,84 @@
+"""Compare the aggregate throughput of a ShardedEventBus with more shards
+
+The publishers run in their own processes, each emitting to its own topics,
+so that the shards (and not the publishers) are the bottleneck. The gain is
+bounded by the number of cores.
+
+Usage:
+    python benchmarks/sharded_throughput.py
+
+"""
+import asyncio
+import multiprocessing
+import time
+from typing import Any
+
+from aiodistbus import DEntryPoint, ShardedEventBus
+
+PUBLISHERS = 4
+TOPICS = 4
+N = 5000
+SHARDS = [1, 2, 4]
+
+
+def handler(data: bytes):
+    ...
+
+
+async def publish(ip: str, port: int, i: int, start: Any):
+    e = DEntryPoint()
+    await e.connect(ip, port)
+    await asyncio.get_running_loop().run_in_executor(None, start.wait)
+    for j in range(N):
+        await e.emit(f"sensor.{i}.{j % TOPICS}", b"\x00" * 64)
+    await asyncio.sleep(1)
+    await e.close()
+
+
+def publisher(ip: str, port: int, i: int, start: Any):
+    asyncio.run(publish(ip, port, i, start))
+
+
+async def run(shards: int) -> float:
+    sbus = await ShardedEventBus(ip="127.0.0.1", shards=shards).start()
+    sub = DEntryPoint()
+    await sub.on("sensor.*", handler, bytes)
+    await sub.connect(sbus.ip, sbus.port)
+
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    publishers = [
+        ctx.Process(target=publisher, args=(sbus.ip, sbus.port, i, start))
+        for i in range(PUBLISHERS)
+    ]
+    for p in publishers:
+        p.start()
+    await asyncio.sleep(3)
+
+    # Time until the shards have published every event
+    total = PUBLISHERS * N
+    tic = time.perf_counter()
+    start.set()
+    while (await sbus.stats()).published < total:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - tic
+
+    for p in publishers:
+        p.join()
+    await sub.close()
+    await sbus.close()
+    return total / elapsed
+
+
+async def main():
+    print(
+        f"{PUBLISHERS} publishers, {N} events each, {multiprocessing.cpu_count()} cores"
+    )
+    print(f"{'shards':<12}{'events/s':>12}")
+    for shards in SHARDS:
+        rate = await run(shards)
+        print(f"{shards:<12}{rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
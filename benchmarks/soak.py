@@ -0,0 +1,47 @@
+"""Track the memory of an EventBus while emitting to unique topics
+
+Usage:
+    python benchmarks/soak.py
+
+"""
+import asyncio
+import time
+import tracemalloc
+
+from aiodistbus import EntryPoint, EventBus
+
+N = 2000000
+REPORT = 250000
+
+
+def handler(data: int):
+    ...
+
+
+async def main():
+    bus = EventBus()
+    e1, e2 = EntryPoint(), EntryPoint()
+    await e1.connect(bus)
+    await e2.connect(bus)
+    await e1.on("worker.*", handler)
+
+    tracemalloc.start()
+    tic = time.perf_counter()
+    print(f"{'emits':>10}{'KiB':>10}{'subs':>8}{'routes':>8}{'s':>8}")
+    for i in range(1, N + 1):
+        # ID-suffixed topics, half of them without subscribers
+        await e2.emit(f"worker.{i}.status", i)
+        await e2.emit(f"status.{i}", i)
+        if i % REPORT == 0:
+            size = tracemalloc.get_traced_memory()[0] / 1024
+            elapsed = time.perf_counter() - tic
+            print(
+                f"{i:>10}{size:>10.1f}{len(bus._subs):>8}"
+                f"{len(bus._routes):>8}{elapsed:>8.1f}"
+            )
+    tracemalloc.stop()
+    await bus.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""Compare the traffic received with plain prefix and segment subscriptions
+
+Usage:
+    python benchmarks/topic_filtering.py
+
+"""
+import asyncio
+from typing import Dict, List
+
+import zmq
+import zmq.asyncio
+
+from aiodistbus import DEntryPoint, DEventBus
+from aiodistbus.utils import subscription_prefix
+
+N = 1000
+PATTERN = "sensor.*"
+TRAFFIC: Dict[str, bytes] = {
+    "sensor.imu": b"\x00" * 64,
+    "sensors_raw.big": b"\x00" * 16384,
+    "sensor_status": b"\x00" * 256,
+}
+
+
+async def drain(sub: zmq.asyncio.Socket) -> List[int]:
+    messages, size = 0, 0
+    while await sub.poll(timeout=500):
+        frames = await sub.recv_multipart()
+        messages += 1
+        size += sum(len(f) for f in frames)
+    return [messages, size]
+
+
+async def main():
+    dbus = DEventBus(ip="127.0.0.1")
+    e = DEntryPoint()
+    await e.connect(dbus.ip, dbus.port)
+
+    # Subscribers for the same pattern, with and without segment precision
+    ctx = zmq.asyncio.Context()
+    subs: Dict[str, zmq.asyncio.Socket] = {}
+    prefixes = {
+        "prefix": PATTERN.replace(".*", "").encode("utf-8"),
+        "segment": subscription_prefix(PATTERN),
+    }
+    for mode, prefix in prefixes.items():
+        sub = ctx.socket(zmq.SUB)
+        sub.linger = 0
+        sub.rcvhwm = 0
+        sub.connect(f"tcp://{dbus.ip}:{dbus.port+1}")
+        sub.setsockopt(zmq.SUBSCRIBE, prefix)
+        subs[mode] = sub
+    await asyncio.sleep(0.5)
+
+    for _ in range(N):
+        for topic, data in TRAFFIC.items():
+            await e.emit(topic, data)
+    await dbus.flush()
+
+    print(f"{'subscription':<14}{'messages':>10}{'KiB':>12}")
+    for mode, sub in subs.items():
+        messages, size = await drain(sub)
+        print(f"{mode:<14}{messages:>10}{size / 1024:>12.1f}")
+        sub.close()
+    ctx.term()
+
+    await e.close()
+    await dbus.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,6 @@
 import logging
+import os
+import pathlib
 import platform
 from dataclasses import dataclass
 from typing import List
@@ -70,6 +72,18 @@ async def wildcard_func(event: Event):
     logger.info(f"Received event {event}")
 
 
+def process_func(event: ExampleEvent) -> str:
+    # Run by the process pool, with the data decoded in the worker
+    assert isinstance(event, ExampleEvent)
+    return f"{event.msg} from {os.getpid()}"
+
+
+def process_path(path: pathlib.PurePosixPath) -> str:
+    # Run by the process pool, with the data decoded by the custom decoder
+    assert isinstance(path, pathlib.PurePosixPath)
+    return f"{path.name} from {os.getpid()}"
+
+
 @pytest.fixture
 async def bus():
     bus = EventBus()
@@ -1,8 +1,13 @@
+import asyncio
+import os
+import threading
+import time
+import tracemalloc
 from typing import List
 
 import pytest
 
-from aiodistbus import Event
+from aiodistbus import Event, EventBus, QueueConfig
 
 from .conftest import (
     ExampleEvent,
@@ -15,6 +20,7 @@ from .conftest import (
     func_list,
     func_none,
     func_str,
+    process_func,
     wildcard_func,
 )
 
@@ -163,3 +169,367 @@ async def test_local_bus_off(bus, entrypoints):
     # Assert
     assert event.id not in e1._received
     assert len(e1._received) == 0
+
+
+async def test_local_bus_route_cache(bus, entrypoints):
+
+    # Create resources
+    e1, e2 = entrypoints
+
+    # Add funcs
+    await e1.on("test", func, ExampleEvent)
+
+    # Connect
+    await e1.connect(bus)
+    await e2.connect(bus)
+
+    # Routes are computed once per topic
+    for _ in range(4):
+        await e2.emit("test", ExampleEvent("Hello"))
+    assert len(e1._received) == 4
+    assert bus.route_stats.misses == 1
+    assert bus.route_stats.hit_rate == 0.75
+
+    # New subscriptions invalidate the matching routes
+    await e2.on("test.*", wildcard_func, Event)
+    await e2.emit("test.a", ExampleEvent("Hello"))
+    assert len(e2._received) == 1
+    await e2.off("test.*")
+    event = await e2.emit("test.a", ExampleEvent("Hello"))
+    assert event and event.id not in e2._received
+
+    # Closed entrypoints are removed from the routes
+    await e1.close()
+    event = await e2.emit("test", ExampleEvent("Hello"))
+    assert event and event.id not in e1._received
+
+
+async def test_local_bus_route_cache_eviction(entrypoints):
+
+    # Create resources
+    bus = EventBus(route_cache_size=2)
+    e1, e2 = entrypoints
+
+    # Connect
+    await e1.on("test.*", wildcard_func, Event)
+    await e1.connect(bus)
+    await e2.connect(bus)
+
+    # Only the most recent topics are kept
+    for i in range(4):
+        await e2.emit(f"test.{i}", ExampleEvent("Hello"))
+    assert len(e1._received) == 4
+    assert list(bus._routes) == ["test.2", "test.3"]
+    assert bus.route_stats.evictions == 2
+
+    await bus.close()
+
+
+async def test_local_bus_dispatch_plan(bus, entrypoints):
+
+    # Create resources
+    e1, e2 = entrypoints
+    calls: List[str] = []
+
+    async def async_func(data: str):
+        calls.append(f"async {data}")
+
+    def sync_func(data: str):
+        calls.append(f"sync {data}")
+
+    # Connect
+    await e1.on("sync", sync_func, str)
+    await e1.on("async", async_func, str)
+    await e1.on("both", sync_func, str)
+    await e2.on("both", async_func, str)
+    await e1.connect(bus)
+    await e2.connect(bus)
+
+    # Sync handlers run inline, without creating a coroutine
+    assert bus._route("sync").dispatch(Event("sync", "a")) is None
+    assert calls == ["sync a"]
+
+    # A single async handler is awaited directly
+    coro = bus._route("async").dispatch(Event("async", "b"))
+    assert asyncio.iscoroutine(coro)
+    await coro
+    assert calls[-1] == "async b"
+
+    # And through emit
+    await e2.emit("both", "c")
+    assert calls[-2:] == ["sync c", "async c"]
+    await e2.emit("missing", "d")
+    assert len(calls) == 4
+
+
+async def test_local_bus_unique_topics_soak(entrypoints):
+
+    # Create resources
+    bus = EventBus(route_cache_size=128, compact_interval=1000)
+    e1, e2 = entrypoints
+    received: List[str] = []
+
+    # Connect
+    await e1.on("worker.*", lambda event: received.append(event.type))
+    await e1.on("test", func, ExampleEvent)
+    await e1.connect(bus)
+    await e2.connect(bus)
+
+    # Emitting to new topics, subscribed or not, doesn't grow the bus
+    tracemalloc.start()
+    sizes: List[int] = []
+    for batch in range(4):
+        for i in range(10000):
+            await e2.emit(f"worker.{batch}-{i}.status")
+            await e2.emit(f"status.{batch}-{i}")
+        received.clear()
+        sizes.append(tracemalloc.get_traced_memory()[0])
+    tracemalloc.stop()
+
+    assert sorted(bus._subs) == ["aiodistbus.eventbus.close", "test"]
+    assert len(bus._routes) <= 128
+    assert sizes[-1] - sizes[0] < 64 * 1024
+
+    # Compaction drops the cached routes without handlers
+    await e2.emit("status.last")
+    assert "status.last" in bus._routes
+    assert bus.compact() >= 1
+    assert "status.last" not in bus._routes
+
+
+async def test_local_bus_thread_handler(bus, entrypoints):
+
+    # Create resources
+    e1, e2 = entrypoints
+    threads: List[str] = []
+
+    def blocking_func(data: str):
+        time.sleep(0.2)
+        threads.append(threading.current_thread().name)
+
+    # Async handlers always run on the event loop
+    with pytest.raises(ValueError):
+        await e1.on("test", func, ExampleEvent, mode="thread")
+    with pytest.raises(ValueError):
+        await e1.on("test", blocking_func, str, mode="unknown")
+
+    # Connect
+    await e1.on("blocking", blocking_func, str, mode="thread")
+    await e1.connect(bus)
+    await e2.connect(bus)
+
+    # The event loop keeps running while the handler blocks
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(tick())
+    event = await e2.emit("blocking", "Hello")
+    task.cancel()
+    assert event and event.id in e1._received
+    assert threads[0].startswith("aiodistbus")
+    assert ticks >= 5
+
+    # Latency is tracked per mode
+    stats = e1.handler_stats["thread"]
+    assert stats.calls == 1 and stats.errors == 0
+    assert stats.mean_time >= 0.2
+    assert e1.handler_stats["inline"].calls == 0
+
+
+async def test_local_bus_process_handler(bus, entrypoints):
+
+    # Create resources
+    e1, e2 = entrypoints
+    results: List[str] = []
+
+    async def collect(data: str):
+        results.append(data)
+
+    # Handlers are pickled to the workers, and only their results are emitted
+    with pytest.raises(ValueError):
+        await e1.on("work", lambda data: data, ExampleEvent, mode="process")
+    with pytest.raises(ValueError):
+        await e1.on("work", process_func, ExampleEvent, emit_result="result")
+
+    # Add funcs
+    await e1.on(
+        "work", process_func, ExampleEvent, mode="process", emit_result="result"
+    )
+    await e1.on("error", process_func, str, mode="process")
+    await e2.on("result", collect, str)
+
+    # Connect
+    await e1.connect(bus)
+    await e2.connect(bus)
+
+    # Results are emitted back onto the bus
+    event = await e2.emit("work", ExampleEvent(msg="Hello"))
+    assert event and event.id in e1._received
+    assert len(results) == 1 and results[0].startswith("Hello from ")
+    assert results[0] != f"Hello from {os.getpid()}"
+
+    # Errors in the worker are logged
+    await e2.emit("error", "Hello")
+    stats = e1.handler_stats["process"]
+    assert stats.calls == 2 and stats.errors == 1
+    assert len(results) == 1
+
+
+@pytest.mark.parametrize(
+    "overflow, expected",
+    [
+        ("drop_newest", [0, 1]),
+        ("drop_oldest", [3, 4]),
+        ("block", [0, 1, 2, 3, 4]),
+    ],
+)
+async def test_local_bus_queue_overflow(bus, entrypoints, overflow, expected):
+
+    # Create resources
+    e1, e2 = entrypoints
+    gate = asyncio.Event()
+    received: List[int] = []
+
+    async def slow_func(data: int):
+        await gate.wait()
+        received.append(data)
+
+    # Add funcs
+    queue = QueueConfig(size=2, overflow=overflow)
+    await e1.on("test", slow_func, int, queue=queue)
+
+    # Connect
+    await e1.connect(bus)
+    await e2.connect(bus)
+
+    # Emitting doesn't wait for the handler, until the queue is full
+    for i in range(2):
+        await e2.emit("test", i)
+    assert e1.queue_stats()["test"].depth == 2
+    asyncio.get_running_loop().call_later(0.1, gate.set)
+    for i in range(2, 5):
+        await e2.emit("test", i)
+
+    # The events are handled in order
+    await e1.join()
+    stats = e1.queue_stats()["test"]
+    assert received == expected
+    assert stats.depth == 0 and stats.max_depth == 2
+    assert stats.processed == len(expected) and stats.dropped == 5 - len(expected)
+
+
+async def test_local_bus_queue_workers(bus, entrypoints):
+
+    # Create resources
+    e1, e2 = entrypoints
+    gate = asyncio.Event()
+    received: List[str] = []
+    active = 0
+    peak = 0
+
+    async def slow_func(event: Event):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await gate.wait()
+        received.append(event.data)
+        active -= 1
+
+    # Invalid queues are rejected
+    with pytest.raises(ValueError):
+        await e1.on("test", func_int, int, queue=QueueConfig(overflow="unknown"))
+    with pytest.raises(ValueError):
+        await e1.on("test", func_int, int, True, queue=QueueConfig())
+
+    # Add funcs
+    await e1.on(
+        "error", slow_func, unpack=False, queue=QueueConfig(size=1, overflow="error")
+    )
+    await e1.on("ordered.*", slow_func, queue=QueueConfig(workers=4))
+    await e1.on(
+        "unordered",
+        slow_func,
+        unpack=False,
+        queue=QueueConfig(workers=4, ordered=False),
+    )
+
+    # Connect
+    await e1.connect(bus)
+    await e2.connect(bus)
+
+    # Unordered events are handled concurrently by the workers
+    for i in range(8):
+        await e2.emit("unordered", f"{i}")
+    await asyncio.sleep(0.01)
+    assert peak == 4
+
+    # Ordered events are handled in order within their topic
+    for i in range(8):
+        await e2.emit(f"ordered.{i % 2}", f"{i % 2}.{i}")
+    gate.set()
+    await e1.join()
+    ordered = [x for x in received if "." in x]
+    assert [x for x in ordered if x.startswith("0.")] == ["0.0", "0.2", "0.4", "0.6"]
+    assert [x for x in ordered if x.startswith("1.")] == ["1.1", "1.3", "1.5", "1.7"]
+
+    # Full queues log an error with the error policy, without raising
+    gate.clear()
+    await e2.emit("error", "0")
+    await asyncio.sleep(0.01)
+    await e2.emit("error", "1")
+    await e2.emit("error", "2")
+    assert e1.queue_stats()["error"].dropped == 1
+
+    # Closing drops the queued events
+    await e1.close()
+    assert e1.queue_stats() == {}
+
+
+async def test_local_bus_queue_closed(bus, entrypoints):
+
+    # Create resources
+    e1, e2 = entrypoints
+    received: List[int] = []
+
+    async def func(data: int):
+        received.append(data)
+
+    # Add funcs
+    await e1.on("test", func, int, queue=QueueConfig())
+    queue = e1._queues["test"]
+
+    # Connect
+    await e1.connect(bus)
+    await e1.close()
+
+    # Closed queues drop the events, without restarting their workers
+    await queue.put(Event("test", 0))
+    assert queue.closed and not queue._workers
+    assert queue.stats.dropped == 1
+
+    # Reconnecting opens them again
+    await e1.connect(bus)
+    await e2.connect(bus)
+    await e2.emit("test", 1)
+    await e1.join()
+    assert received == [1]
+
+
+async def test_local_bus_create_task(bus, entrypoints):
+
+    # Create resources
+    e1, e2 = entrypoints
+    await e1.on("test", func_int, int, create_task=True)
+    await e1.connect(bus)
+    await e2.connect(bus)
+
+    # Finished tasks are not kept
+    for i in range(10):
+        await e2.emit("test", i)
+    await asyncio.sleep(0.01)
+    assert len(e1._tasks) == 0
@@ -1,9 +1,36 @@
+import asyncio
 import logging
+import os
+import pathlib
+import time
 from typing import List
 
 import pytest
+import zmq
+import zmq.asyncio
 
-from aiodistbus import DEntryPoint, Event
+from aiodistbus import (
+    BrokerThread,
+    DEntryPoint,
+    DEventBus,
+    EntryPoint,
+    Event,
+    EventBus,
+    QueueConfig,
+    ShardedEventBus,
+    global_config,
+)
+from aiodistbus.eventbus.broker_thread import _ThreadsafeBus
+from aiodistbus.protocols import Agreement, Capabilities, LazyEvent
+from aiodistbus.utils import (
+    WIRE_VERSION,
+    checksum_flags,
+    decode_topic,
+    encode,
+    encode_frames,
+    shard_index,
+    subscription_prefix,
+)
 
 from .conftest import (
     ExampleEvent,
@@ -16,6 +43,8 @@ from .conftest import (
     func_list,
     func_none,
     func_str,
+    process_func,
+    process_path,
     wildcard_func,
 )
 
@@ -200,3 +229,941 @@ async def test_dbus_off(dbus, dentrypoints):
 
     # Assert
     assert event1 and event1.id not in e1._received
+
+
+@pytest.mark.parametrize("copy", [True, False])
+async def test_dbus_emit_zero_copy(dbus, copy):
+
+    # Create resources
+    e1, e2 = DEntryPoint(copy=copy), DEntryPoint(copy=copy)
+    data = bytearray(b"x" * 1024 * 1024)
+    received: List[memoryview] = []
+
+    async def func_view(event: memoryview):
+        assert isinstance(event, memoryview)
+        received.append(event)
+
+    # Add funcs
+    await e1.on("test_view", func_view, memoryview)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+
+    # Send message
+    event1 = await e2.emit("test_view", memoryview(data))
+
+    # Need to flush
+    await dbus.flush()
+
+    # Assert
+    assert event1 and event1.id in e1._received
+    assert received[0] == data
+
+    await e1.close()
+    await e2.close()
+
+
+async def test_dbus_emit_ndarray(dbus, dentrypoints):
+    np = pytest.importorskip("numpy")
+
+    # Create resources
+    e1, e2 = dentrypoints
+    data = np.random.rand(256, 256)
+    received: List = []
+
+    async def func_ndarray(event):
+        received.append(event)
+
+    # Add funcs
+    await e1.on("test_ndarray", func_ndarray, np.ndarray)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+
+    # Send message
+    event1 = await e2.emit("test_ndarray", data)
+
+    # Need to flush
+    await dbus.flush()
+
+    # Assert
+    assert event1 and event1.id in e1._received
+    assert np.array_equal(received[0], data)
+
+
+@pytest.mark.parametrize(
+    "bus_serializer, e1_serializer, e2_serializer",
+    [
+        ("msgpack", None, None),
+        ("json", None, "msgpack"),
+        ("msgpack", "json", None),
+    ],
+)
+async def test_dbus_emit_serializer(bus_serializer, e1_serializer, e2_serializer):
+    pytest.importorskip("msgpack")
+
+    # Create resources
+    dbus = DEventBus(ip="127.0.0.1", serializer=bus_serializer)
+    e1 = DEntryPoint(serializer=e1_serializer)
+    e2 = DEntryPoint(serializer=e2_serializer)
+
+    # Add funcs
+    await e1.on("test", func, ExampleEvent)
+    await e1.on("test_dict", func_dict, dict)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+    assert e2._serializer.name == (e2_serializer or bus_serializer)
+
+    # Send message
+    event1 = await e2.emit("test", ExampleEvent("Hello"))
+    event2 = await e2.emit("test_dict", {"hello": "world"})
+
+    # Need to flush
+    await dbus.flush()
+
+    # Assert
+    assert event1 and event1.id in e1._received
+    assert event2 and event2.id in e1._received
+
+    await e1.close()
+    await e2.close()
+    await dbus.close()
+
+
+@pytest.mark.parametrize("serializer", [None, "msgpack"])
+async def test_dbus_emit_json_like(serializer):
+    if serializer:
+        pytest.importorskip("msgpack")
+
+    # Create resources
+    dbus = DEventBus(ip="127.0.0.1", serializer=serializer)
+    e1, e2 = DEntryPoint(), DEntryPoint()
+    received: List[dict] = []
+
+    # Add funcs
+    await e1.on("test", received.append, dict)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+    assert e2._serializer.name == (serializer or "json")
+
+    # Non-string keys are kept by msgpack, big integers only supported by json
+    await e2.emit("test", {1: "a"})
+    big = await e2.emit("test", {"big": 2**70})
+    await dbus.flush()
+    for _ in range(20):
+        if len(received) == (1 if serializer else 2):
+            break
+        await asyncio.sleep(0.05)
+    if serializer:
+        assert big is None
+        assert received == [{1: "a"}]
+    else:
+        assert received == [{"1": "a"}, {"big": 2**70}]
+
+    await e1.close()
+    await e2.close()
+    await dbus.close()
+
+
+async def test_dbus_negotiation_with_legacy_client(dentrypoints):
+    pytest.importorskip("msgpack")
+
+    # Create resources, with a fast pulse
+    dbus = DEventBus(ip="127.0.0.1", pulse=0.1, serializer="msgpack")
+    e1, e2 = dentrypoints
+
+    # Add funcs
+    await e1.on("test", func, ExampleEvent)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+    assert e2._serializer.name == "msgpack"
+
+    # Legacy client, without capabilities in its handshake
+    ctx = zmq.asyncio.Context()
+    legacy = ctx.socket(zmq.DEALER)
+    legacy.linger = 0
+    legacy.connect(f"tcp://{dbus.ip}:{dbus.port}")
+    await legacy.send(b"aiodistbus.eventbus.connect")
+    reply = await legacy.recv_multipart()
+    while reply[0] != b"aiodistbus.eventbus.handshake":  # Ignored by legacy clients
+        reply = await legacy.recv_multipart()
+    assert reply[:2] == [b"aiodistbus.eventbus.handshake", b"json"]
+
+    # Upgraded clients fall back to the legacy formats
+    await dbus.flush()
+    assert e2._serializer.name == "json"
+    assert e2._agreement.version == 1
+    event1 = await e2.emit("test", ExampleEvent("Hello"))
+    await dbus.flush()
+    assert event1 and event1.id in e1._received
+
+    # Legacy clients leave without disconnecting, and are expired on a pulse
+    legacy.close()
+    ctx.term()
+    for _ in range(50):
+        if e1._agreement.version == WIRE_VERSION:
+            break
+        await asyncio.sleep(0.05)
+    assert len(dbus._clients) == 2
+
+    # Once the legacy client left, the fastest formats are used again
+    assert e2._serializer.name == "msgpack"
+    assert e1._agreement.version == WIRE_VERSION
+    event2 = await e2.emit("test", ExampleEvent("Hello"))
+    await dbus.flush()
+    assert event2 and event2.id in e1._received
+    await dbus.close()
+
+
+async def test_dbus_precise_wildcard_filtering(dbus, dentrypoints):
+    e1, e2 = dentrypoints
+
+    # Add funcs
+    await e1.on("sensor.*", wildcard_func)
+    await e1.on("test", func, ExampleEvent)
+
+    # Connect, along with a raw socket using the same subscriptions
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+    ctx = zmq.asyncio.Context()
+    sub = ctx.socket(zmq.SUB)
+    sub.linger = 0
+    sub.connect(f"tcp://{dbus.ip}:{dbus.port+1}")
+    for event_type in ["sensor.*", "test"]:
+        sub.setsockopt(zmq.SUBSCRIBE, subscription_prefix(event_type))
+    await dbus.flush()
+
+    # Send messages
+    await e2.emit("sensors_raw.big", b"\x00" * 4096)
+    await e2.emit("test.child", ExampleEvent("Hello"))
+    event = await e2.emit("sensor.imu", "data")
+    await dbus.flush()
+
+    # Only the matching topics were sent to the subscribers
+    assert event and event.id in e1._received
+    topics = []
+    while await sub.poll(timeout=100):
+        topics.append((await sub.recv_multipart())[0])
+    assert topics == [b"sensor.imu\0"]
+    sub.close()
+    ctx.term()
+
+
+async def test_dbus_drop_unsubscribed(dbus):
+    e1 = DEntryPoint()
+    e2 = DEntryPoint(track_subscriptions=True)
+
+    # Add funcs
+    await e1.on("sensor.*", wildcard_func)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+    await dbus.flush()
+
+    # Subscriptions are tracked by the DEventBus, and shared with the producers
+    assert e1.has_subscribers("telemetry")  # Unknown, without tracking
+    assert "sensor." in dbus.subscriptions
+    assert dbus.has_subscribers("sensor.imu")
+    assert not dbus.has_subscribers("telemetry")
+    assert e2.has_subscribers("sensor.imu")
+    assert not e2.has_subscribers("telemetry")
+
+    # Events without subscribers are dropped by the DEventBus
+    await e2.emit("telemetry", "data")
+    event = await e2.emit("sensor.imu", "data")
+    await dbus.flush()
+    assert event and event.id in e1._received
+    assert (dbus.stats.published, dbus.stats.dropped) == (1, 1)
+
+    # Until subscribed
+    await e1.on("telemetry", func_str, str)
+    await dbus.flush()
+    assert e2.has_subscribers("telemetry")
+    event = await e2.emit("telemetry", "data")
+    await dbus.flush()
+    assert event and event.id in e1._received
+    assert dbus.stats.dropped == 1
+
+    # The subscriptions of a closed DEntryPoint are removed
+    await e1.close()
+    await dbus.flush()
+    assert not dbus.has_subscribers("sensor.imu")
+    await e2.close()
+
+
+async def test_dbus_process_handler(dbus, dentrypoints):
+
+    # Create resources
+    e1, e2 = dentrypoints
+    events: List[Event] = []
+    results: List[str] = []
+
+    async def collect(data: str):
+        results.append(data)
+
+    # Add funcs
+    await e1.on(
+        "work", process_func, ExampleEvent, mode="process", emit_result="result"
+    )
+    await e1.on("*", events.append, unpack=False)
+    await e2.on("result", collect, str)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+
+    # The still encoded data is only decoded by the worker
+    event = await e2.emit("work", ExampleEvent(msg="Hello"))
+    for _ in range(100):
+        if results:
+            break
+        await asyncio.sleep(0.05)
+    assert event and event.id in e1._received
+    assert len(results) == 1 and results[0].startswith("Hello from ")
+    assert results[0] != f"Hello from {os.getpid()}"
+    lazy = [e for e in events if e.type == "work"]
+    assert isinstance(lazy[0], LazyEvent) and not lazy[0].loaded
+
+
+async def test_dbus_process_handler_custom_decoder(dbus, dentrypoints):
+
+    # Create resources, with codecs the workers of the pool don't have
+    e1, e2 = dentrypoints
+    results: List[str] = []
+    global_config.encoders[pathlib.PurePosixPath] = lambda x: str(x).encode()
+    global_config.decoders[pathlib.PurePosixPath] = lambda x: pathlib.PurePosixPath(
+        bytes(x).decode()
+    )
+
+    async def collect(data: str):
+        results.append(data)
+
+    # Add funcs
+    await e1.on(
+        "work",
+        process_path,
+        pathlib.PurePosixPath,
+        mode="process",
+        emit_result="result",
+    )
+    await e2.on("result", collect, str)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+
+    # The data is decoded before being sent to the worker
+    try:
+        event = await e2.emit("work", pathlib.PurePosixPath("/tmp/data.bin"))
+        for _ in range(100):
+            if results:
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        del global_config.encoders[pathlib.PurePosixPath]
+        del global_config.decoders[pathlib.PurePosixPath]
+    assert event and event.id in e1._received
+    assert e1.handler_stats["process"].errors == 0
+    assert len(results) == 1 and results[0].startswith("data.bin from ")
+
+
+async def test_dbus_queue_overflow(dbus, dentrypoints):
+
+    # Create resources
+    e1, e2 = dentrypoints
+    gate = asyncio.Event()
+    received: List[str] = []
+
+    async def slow_func(data: str):
+        await gate.wait()
+        received.append(data)
+
+    # Add funcs
+    await e1.on("test", slow_func, str, queue=QueueConfig(size=2, overflow="error"))
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+
+    # Overflows are logged, without stopping the DEntryPoint
+    for i in range(4):
+        await e2.emit("test", f"{i}")
+    stats = e1.queue_stats()["test"]
+    for _ in range(100):
+        if stats.depth + stats.dropped + 1 >= 4:
+            break
+        await asyncio.sleep(0.05)
+    gate.set()
+    await e1.join()
+    assert stats.dropped >= 1 and stats.processed + stats.dropped == 4
+    assert received[:2] == ["0", "1"]
+
+    event = await e2.emit("test", "4")
+    await dbus.flush()
+    await e1.join()
+    assert event and event.id in e1._received
+    assert received[-1] == "4"
+
+
+async def test_dbus_batch_draining():
+
+    # Create resources
+    with pytest.raises(ValueError):
+        DEventBus(ip="127.0.0.1", batch_size=0)
+    dbus = DEventBus(ip="127.0.0.1", batch_size=16)
+    e1 = DEntryPoint()
+    e2 = DEntryPoint()
+    received: List[int] = []
+
+    # Add funcs
+    await e1.on("test", received.append, int)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+
+    # The queued messages are read in batches, without polling for each
+    for i in range(200):
+        await e2.emit("test", i)
+    time.sleep(0.2)  # Queue them all before the DEventBus wakes up
+    for _ in range(100):
+        if len(received) == 200:
+            break
+        await asyncio.sleep(0.05)
+    assert received == list(range(200))
+    assert dbus.stats.received >= 200
+    assert dbus.stats.mean_batch > 8
+
+    await e1.close()
+    await e2.close()
+    await dbus.close()
+
+
+async def test_dbus_dispatchers(dbus):
+
+    # Create resources
+    with pytest.raises(ValueError):
+        DEntryPoint(dispatchers=-1)
+    e1 = DEntryPoint(dispatchers=4, ordered=False)
+    e2 = DEntryPoint()
+    e3 = DEntryPoint(dispatchers=2)
+    gate = asyncio.Event()
+    received: List[str] = []
+    ordered: List[int] = []
+
+    async def slow_func(data: str):
+        await gate.wait()
+        received.append(data)
+
+    async def jitter_func(data: int):
+        await asyncio.sleep(0.01 * (data % 3))
+        ordered.append(data)
+
+    # Add funcs
+    await e1.on("slow", slow_func, str)
+    await e1.on("fast", received.append, str)
+    await e3.on("ordered", jitter_func, int)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+    await e3.connect(dbus.ip, dbus.port)
+
+    # A slow handler doesn't stop the next events from being received
+    await e2.emit("slow", "slow")
+    await e2.emit("fast", "fast")
+    for _ in range(100):
+        if received:
+            break
+        await asyncio.sleep(0.05)
+    assert received == ["fast"]
+    assert e1.dispatch_stats and e1.dispatch_stats.processed >= 1
+    gate.set()
+    await e1.join()
+    assert received == ["fast", "slow"]
+
+    # The events of a topic are dispatched in order
+    for i in range(10):
+        await e2.emit("ordered", i)
+    for _ in range(100):
+        if len(ordered) == 10:
+            break
+        await asyncio.sleep(0.05)
+    assert ordered == list(range(10))
+
+    await e1.close()
+    await e2.close()
+    await e3.close()
+
+
+async def test_dbus_forward_full_queue(dbus):
+
+    # Create resources
+    bus = EventBus()
+    e1, e2 = DEntryPoint(), DEntryPoint()
+    e3 = EntryPoint()
+    gate = asyncio.Event()
+
+    async def blocked_func(data: str):
+        await gate.wait()
+
+    # Add funcs
+    await e1.on("after", func_str, str)
+    await e3.on("test", blocked_func, str, queue=QueueConfig(size=1, overflow="error"))
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+    await e3.connect(bus)
+    await dbus.forward(bus)
+
+    # Overflowing the local handler's queue doesn't stop the forwarding
+    for _ in range(5):
+        await e2.emit("test", "Hello")
+    await asyncio.sleep(0.5)
+    assert not dbus.run_task.done()
+    assert e3.queue_stats()["test"].dropped > 0
+    event = await e2.emit("after", "Hello")
+    await dbus.flush()
+    assert event and event.id in e1._received
+
+    gate.set()
+    await e1.close()
+    await e2.close()
+    await e3.close()
+    await bus.close()
+
+
+async def test_broker_thread():
+
+    # Create resources
+    broker = BrokerThread(ip="127.0.0.1")
+    bus = EventBus()
+    e1 = DEntryPoint()
+    e2 = DEntryPoint()
+    e3 = EntryPoint()
+    received: List[str] = []
+
+    # Add funcs
+    await e1.on("test", func_str, str)
+    await e3.on("test", received.append, str)
+
+    # Connect
+    await e1.connect(broker.ip, broker.port)
+    await e2.connect(broker.ip, broker.port)
+    await e3.connect(bus)
+    await broker.forward(bus)
+
+    # Events are forwarded even while the application's loop is blocked
+    event = await e2.emit("test", "Hello")
+    time.sleep(0.5)
+    assert broker.dbus.stats.published == 1
+    await broker.flush()
+    for _ in range(100):
+        if received:
+            break
+        await asyncio.sleep(0.05)
+    assert event and event.id in e1._received
+    assert received == ["Hello"]
+
+    # Closing stops the broker's thread
+    await e1.close()
+    await e2.close()
+    await broker.close()
+    assert not broker.running
+    assert not broker._thread.is_alive()
+    await bus.close()
+
+
+async def test_broker_thread_pending(caplog):
+
+    # Create resources
+    broker = BrokerThread(ip="127.0.0.1")
+    bus = EventBus()
+
+    class FailingBus:
+        _dtypes: dict = {}
+
+        async def _emit(self, event: Event):
+            raise RuntimeError("Handler failed")
+
+    def emit(tbus: _ThreadsafeBus):
+        return asyncio.run_coroutine_threadsafe(
+            tbus._emit(Event("test", "Hello")), broker._loop
+        )
+
+    # Past the limit, the broker waits for the application's loop
+    tbus = _ThreadsafeBus(bus, asyncio.get_running_loop(), 1)
+    emit(tbus).result(timeout=1)
+    future = emit(tbus)
+    time.sleep(0.2)
+    assert not future.done()
+    await asyncio.wrap_future(future)
+
+    # The errors of the local eventbus are logged
+    tbus = _ThreadsafeBus(FailingBus(), asyncio.get_running_loop(), 1)  # type: ignore[arg-type]
+    with caplog.at_level(logging.ERROR, logger="aiodistbus"):
+        await asyncio.wrap_future(emit(tbus))
+        for _ in range(100):
+            if "Handler failed" in caplog.text:
+                break
+            await asyncio.sleep(0.01)
+    assert "Failed to forward (test): Handler failed" in caplog.text
+
+    with pytest.raises(ValueError):
+        BrokerThread(ip="127.0.0.1", max_pending=0)
+
+    await broker.close()
+    await bus.close()
+
+
+async def test_sharded_dbus():
+
+    # Create resources, without blocking the event loop while the shards start
+    sbus = ShardedEventBus(ip="127.0.0.1", shards=2)
+    e1, e2 = DEntryPoint(), DEntryPoint()
+    events: List[Event] = []
+    ticks: List[float] = []
+
+    async def tick():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    with pytest.raises(RuntimeError):
+        assert sbus.port
+    task = asyncio.create_task(tick())
+    await sbus.start()
+    task.cancel()
+    assert len(sbus.ports) == 2
+    assert max(ticks[i + 1] - ticks[i] for i in range(len(ticks) - 1)) < 0.2
+
+    # Add funcs
+    await e1.on("shard.*", events.append, unpack=False)
+
+    # Connect, with the shard map received during the handshake, until all the
+    # shards have the subscriptions
+    await e1.connect(sbus.ip, sbus.port)
+    await e2.connect(sbus.ip, sbus.port)
+    assert len(e2._publishers) == 2
+
+    # The shards follow the agreement of the first one
+    assert await sbus.agreements() == [e2._agreement] * 2
+    ctx = zmq.asyncio.Context()
+    client = ctx.socket(zmq.DEALER)
+    client.linger = 0
+    client.connect(f"tcp://{sbus.ip}:{sbus.port}")
+    capabilities = Capabilities(WIRE_VERSION, ["json"], control=True, shards=True)
+    await client.send_multipart(
+        [b"aiodistbus.eventbus.connect", capabilities.to_json().encode()]
+    )
+    for _ in range(100):
+        agreements = await sbus.agreements()
+        if all(a.serializer == "json" for a in agreements):
+            break
+        await asyncio.sleep(0.05)
+    assert agreements == [Agreement(WIRE_VERSION, "json", shards=True)] * 2
+    assert e2._agreement == agreements[0]
+    client.close()
+    ctx.term()
+
+    # Each event type is forwarded by its shard
+    event_types = [f"shard.{i}" for i in range(8)]
+    for event_type in event_types:
+        await e2.emit(event_type, "Hello")
+    for _ in range(100):
+        if len(events) == len(event_types):
+            break
+        await asyncio.sleep(0.05)
+    assert sorted(e.type for e in events) == event_types
+    stats = await sbus.shard_stats()
+    for i, shard in enumerate(stats):
+        assert shard.published == sum(shard_index(t, 2) == i for t in event_types)
+    assert (await sbus.stats()).published == len(event_types)
+
+    # Closing stops the shards' processes
+    await e1.close()
+    await e2.close()
+    await sbus.close()
+    assert not sbus.running
+    assert not any(p.is_alive() for p in sbus._processes)
+
+
+async def test_sharded_dbus_legacy_client():
+
+    # Create resources, with a fast pulse
+    sbus = await ShardedEventBus(ip="127.0.0.1", shards=2, pulse=0.1).start()
+    e1 = DEntryPoint(track_subscriptions=True)
+    event_types = [f"shard.{i}" for i in range(8)]
+
+    # Legacy client, only connected to the first shard
+    ctx = zmq.asyncio.Context()
+    legacy = ctx.socket(zmq.DEALER)
+    legacy.linger = 0
+    legacy.connect(f"tcp://{sbus.ip}:{sbus.port}")
+    sub = ctx.socket(zmq.SUB)
+    sub.linger = 0
+    sub.connect(f"tcp://{sbus.ip}:{sbus.port+1}")
+    sub.setsockopt(zmq.SUBSCRIBE, b"shard.")
+    await legacy.send(b"aiodistbus.eventbus.connect")
+    reply = await legacy.recv_multipart()
+    while reply[0] != b"aiodistbus.eventbus.handshake":  # Ignored by legacy clients
+        reply = await legacy.recv_multipart()
+
+    # All the events are sent to the first shard, to reach the legacy client
+    await e1.connect(sbus.ip, sbus.port)
+    assert len(e1._publishers) == 2 and not e1._agreement.shards
+    for _ in range(100):
+        if e1.has_subscribers("shard.0"):
+            break
+        await asyncio.sleep(0.05)
+    for event_type in event_types:
+        await e1.emit(event_type, "Hello")
+    received = [await asyncio.wait_for(sub.recv_multipart(), 5) for _ in event_types]
+    assert sorted(decode_topic(msg[0]) for msg in received) == event_types
+    assert [s.published for s in await sbus.shard_stats()] == [len(event_types), 0]
+
+    # Once the legacy client left, the events are spread over the shards again
+    legacy.close()
+    sub.close()
+    ctx.term()
+    for _ in range(50):
+        if e1._agreement.shards:
+            break
+        await asyncio.sleep(0.05)
+    assert e1._agreement.shards
+    assert all(a.shards for a in await sbus.agreements())
+
+    await e1.close()
+    await sbus.close()
+
+
+async def test_dbus_control_channel():
+
+    # Create resources, with a fast pulse
+    dbus = DEventBus(ip="127.0.0.1", pulse=0.1)
+    e1 = DEntryPoint(pulse_ttl=0.2, pulse_limit=2, dispatchers=1, dispatch_queue_size=1)
+    e2 = DEntryPoint()
+    gate = asyncio.Event()
+
+    async def blocked_func(data: str):
+        await gate.wait()
+
+    # Add funcs
+    await e1.on("test", blocked_func, str)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+    await asyncio.sleep(0.2)
+
+    # The pulses aren't queued behind the data, which isn't received anymore
+    for _ in range(10):
+        await e2.emit("test", "Hello")
+    await asyncio.sleep(1.5)
+    assert e1.dispatch_stats and e1.dispatch_stats.processed == 0
+    assert e1.running
+
+    # Close
+    gate.set()
+    await e1.close()
+    await e2.close()
+    await dbus.close()
+
+
+async def test_dbus_control_channel_with_legacy_client():
+
+    # Create resources, with a fast pulse
+    dbus = DEventBus(ip="127.0.0.1", pulse=0.1)
+    e1 = DEntryPoint()
+    agreements: List[dict] = []
+
+    async def capabilities_sub(agreement: dict):
+        agreements.append(agreement)
+
+    # Connect, then wait for a control event over the handshake socket
+    e1._capabilities_sub = capabilities_sub  # type: ignore[method-assign]
+    await e1.connect(dbus.ip, dbus.port)
+    for _ in range(50):
+        if e1._control_channel:
+            break
+        await asyncio.sleep(0.05)
+    assert "aiodistbus.eventbus.capabilities" not in e1._subscriptions
+
+    # Legacy client, which also gets the control events over the XPUB socket
+    ctx = zmq.asyncio.Context()
+    legacy = ctx.socket(zmq.DEALER)
+    legacy.linger = 0
+    legacy.connect(f"tcp://{dbus.ip}:{dbus.port}")
+    sub = ctx.socket(zmq.SUB)
+    sub.linger = 0
+    sub.connect(f"tcp://{dbus.ip}:{dbus.port+1}")
+    sub.setsockopt(zmq.SUBSCRIBE, b"aiodistbus.eventbus.capabilities")
+    await dbus.flush()
+    await legacy.send(b"aiodistbus.eventbus.connect")
+    await asyncio.wait_for(sub.recv_multipart(), 5)
+
+    # The new agreement is only received once
+    await asyncio.sleep(0.5)
+    assert agreements == [Agreement(1).to_dict()]
+
+    legacy.close()
+    sub.close()
+    ctx.term()
+    await e1.close()
+    await dbus.close()
+
+
+async def test_dbus_emit_compressed():
+    # Create resources
+    dbus = DEventBus(ip="127.0.0.1", compression="zlib")
+    bus = EventBus()
+    e1 = DEntryPoint()
+    e2 = DEntryPoint()
+    e3 = EntryPoint()
+
+    # Add funcs
+    await e1.on("telemetry", func_dict, dict)
+    await e3.connect(bus)
+    await e3.on("telemetry", func_dict, dict)
+    await dbus.forward(bus, ["telemetry"])
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+    assert e2._agreement.compression == "zlib"
+
+    # Send message, large enough to be compressed
+    stats = global_config.compressors["zlib"].stats
+    compressed = stats.compressed
+    data = {"values": [0.0] * 1024}
+    event = await e2.emit("telemetry", data)
+    await dbus.flush()
+
+    # Assert
+    assert stats.compressed == compressed + 1
+    assert stats.ratio > 1
+    assert event and event.data == encode(data, e2._serializer.name)
+    assert event.id in e1._received
+    assert event.id in e3._received
+
+    await e1.close()
+    await e2.close()
+    await dbus.close()
+
+
+@pytest.mark.parametrize("integrity", ["crc32", "adler32", "sender", "none"])
+async def test_dbus_integrity(integrity):
+    # Create resources
+    dbus = DEventBus(ip="127.0.0.1", integrity=integrity)
+    e1 = DEntryPoint()
+    e2 = DEntryPoint()
+
+    # Add funcs
+    await e1.on("test", func, ExampleEvent)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+    assert e2._agreement.checksum == integrity
+
+    # Send message
+    event1 = await e2.emit("test", ExampleEvent("Hello"))
+    await dbus.flush()
+    assert event1 and event1.id in e1._received
+
+    # Corrupted messages are dropped, by the DEventBus or the DEntryPoint
+    assert e2.publisher
+    event2 = Event(
+        "test", ExampleEvent("Hello").to_json().encode(), "conftest.ExampleEvent"
+    )
+    [topic, header, payload, checksum] = encode_frames(
+        event2, flags=checksum_flags(e2._agreement.checksum)
+    )
+    await e2.publisher.send_multipart([topic, header, payload + b" ", checksum])
+    await dbus.flush()
+    assert (event2.id in e1._received) == (integrity == "none")
+
+    await e1.close()
+    await e2.close()
+    await dbus.close()
+
+
+async def test_dbus_integrity_sender_override():
+    # Create resources, e1 only relying on the DEventBus for its messages
+    dbus = DEventBus(ip="127.0.0.1")
+    e1 = DEntryPoint(integrity="sender")
+    e2 = DEntryPoint()
+
+    # Add funcs
+    await e1.on("test", func, ExampleEvent)
+    await e2.on("test", func, ExampleEvent)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+    assert dbus._agreement.checksum == "crc32"
+    assert e1._agreement.checksum == "sender"
+
+    # Send messages
+    event1 = await e1.emit("test", ExampleEvent("Hello"))
+    event2 = await e2.emit("test", ExampleEvent("Hello"))
+    await dbus.flush()
+    assert event1 and event1.id in e2._received
+    assert event2 and event2.id in e1._received
+
+    # Corrupted messages are still dropped, verified by the DEventBus (sender
+    # mode) or the receiving DEntryPoint (crc32), whatever the mode of the other
+    for sender, receiver in [(e1, e2), (e2, e1)]:
+        assert sender.publisher
+        event = Event(
+            "test", ExampleEvent("Hello").to_json().encode(), "conftest.ExampleEvent"
+        )
+        [topic, header, payload, checksum] = encode_frames(
+            event, flags=checksum_flags(sender._agreement.checksum)
+        )
+        await sender.publisher.send_multipart([topic, header, payload + b" ", checksum])
+        await dbus.flush()
+        assert event.id not in receiver._received
+
+    await e1.close()
+    await e2.close()
+    await dbus.close()
+
+
+async def test_dbus_lazy_decoding(dbus, dentrypoints):
+    # Create resources
+    e1, e2 = dentrypoints
+    received: List[Event] = []
+
+    async def metadata_handler(event: Event):
+        received.append(event)
+
+    # Add funcs, "test" also matches "test_other" with prefix subscriptions
+    await e1.on("test", metadata_handler, ExampleEvent, unpack=False)
+
+    # Connect
+    await e1.connect(dbus.ip, dbus.port)
+    await e2.connect(dbus.ip, dbus.port)
+
+    # Send message
+    event1 = await e2.emit("test", ExampleEvent("Hello"))
+    event2 = await e2.emit("test_other", ExampleEvent("Hello"))
+    await dbus.flush()
+
+    # Assert, the data was never decoded
+    assert event1 and event1.id in e1._received
+    assert event2 and event2.id not in e1._received
+    assert len(received) == 1
+    assert isinstance(received[0], LazyEvent)
+    assert not received[0].loaded
+    assert received[0].data == ExampleEvent("Hello")
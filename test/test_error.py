@@ -18,8 +18,7 @@ class CrashDEventBus(DEventBus):
 
             # IMITATE A CRASH
             # Inform to stop
-            # event_d = Event("aiodistbus.eventbus.close").to_json().encode()
-            # await self._emit(b"aiodistbus.eventbus.close", event_d)
+            # await self._emit(encode_frames(Event("aiodistbus.eventbus.close")))
 
             # Stop the main routine
             self._running = False
@@ -0,0 +1,44 @@
+from aiodistbus import Event
+from aiodistbus.protocols import LazyEvent
+
+
+def test_event_ids():
+    e1 = Event("test")
+    e2 = Event("test")
+
+    # Same process, increasing sequence
+    assert e1.origin == e2.origin
+    assert e2.seq == e1.seq + 1
+    assert e1.id != e2.id
+    assert e1.id is e1.id  # rendered once
+
+
+def test_event_timestamp():
+    event = Event("test")
+    assert isinstance(event.timestamp_ns, int)
+
+    # Rendered in the previous (ISO, UTC) format, and back
+    copy = Event("test", timestamp=event.timestamp)
+    assert copy.timestamp == event.timestamp
+    assert copy.timestamp_ns == event.timestamp_ns // 1000 * 1000
+
+
+def test_event_compatibility():
+    event = Event("test", {"hello": "world"}, "builtins.dict")
+    assert not hasattr(event, "__dict__")
+    assert Event.from_json(event.to_json()) == event
+    assert Event.from_dict(event.to_dict()) == event
+    assert event.to_dict()["id"] == event.id
+
+    # Explicit ids are kept
+    event = Event("test", id="custom")
+    assert event.id == "custom"
+    event.id = "other"
+    assert event.id == "other"
+
+
+def test_lazy_event():
+    event = LazyEvent("test", lambda: 1, "builtins.int", "id", "2024-01-01T00:00:00")
+    assert not event.loaded
+    assert event == Event("test", 1, "builtins.int", "id", "2024-01-01T00:00:00")
+    assert event.loaded
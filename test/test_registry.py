@@ -1,4 +1,5 @@
 import logging
+import threading
 from typing import List
 
 import pytest
@@ -186,3 +187,55 @@ async def test_registry_class(bus, entrypoints):
     # Asserts
     assert event1.id in e1._received
     assert event2.id in e1._received
+
+
+@registry.on("blocking", str, namespace="Blocking", mode="thread")
+def blocking_func(event: str):
+    assert threading.current_thread() is not threading.main_thread()
+
+
+async def test_registry_thread_mode(bus, entrypoints):
+
+    # Resources
+    e1, e2 = entrypoints
+    await e1.connect(bus)
+    await e2.connect(bus)
+    assert registry.get_handlers("Blocking")["blocking"].mode == "thread"
+    with pytest.raises(ValueError):
+        registry.on("blocking", str, mode="unknown")
+
+    # Setup the handlers
+    await e1.use(registry, namespace="Blocking")
+    event = await e2.emit("blocking", "Hello")
+
+    # Asserts
+    assert event.id in e1._received
+    assert e1.handler_stats["thread"].calls == 1
+    assert e1.handler_stats["thread"].errors == 0
+
+
+@registry.on("scale", int, namespace="Process", mode="process", emit_result="scaled")
+def scale_func(factor: int, event: int) -> int:
+    return factor * event
+
+
+async def test_registry_process_mode(bus, entrypoints):
+
+    # Resources
+    e1, e2 = entrypoints
+    results: List[int] = []
+
+    async def collect(data: int):
+        results.append(data)
+
+    await e1.connect(bus)
+    await e2.connect(bus)
+
+    # Setup the handlers, the base arguments are pickled with the function
+    await e1.use(registry, namespace="Process", b_args=[3])
+    await e2.on("scaled", collect, int)
+    event = await e2.emit("scale", 2)
+
+    # Asserts
+    assert event.id in e1._received
+    assert results == [6]
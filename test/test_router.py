@@ -0,0 +1,37 @@
+import pytest
+
+from aiodistbus.router import TopicRouter
+from aiodistbus.utils import wildcard_search
+
+PATTERNS = ["*", "a.*", "a.b.*", "a.*.c", "b.*", "a.b", "a*"]
+
+
+@pytest.mark.parametrize(
+    "topic",
+    ["a", "a.b", "a.b.c", "a.c.d", "b", "b.a", "c.d", "aiodistbus.eventbus.pulse"],
+)
+def test_router_match(topic):
+    router = TopicRouter()
+    for pattern in PATTERNS:
+        router.insert(pattern)
+
+    # Same matches as the linear wildcard search
+    assert sorted(router.match(topic)) == sorted(wildcard_search(topic, PATTERNS))
+
+
+def test_router_remove():
+    router = TopicRouter()
+    for pattern in PATTERNS:
+        router.insert(pattern)
+    assert len(router) == len(PATTERNS)
+
+    router.remove("a.b.*")
+    assert "a.b.*" not in router
+    assert router.match("a.b.c") == ["*", "a.*", "a.*.c"]
+
+    # Unused branches are pruned
+    for pattern in PATTERNS:
+        router.remove(pattern)
+    assert len(router) == 0
+    assert not router._root.children
+    assert router.match("a.b.c") == []
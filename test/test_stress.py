@@ -8,6 +8,7 @@ import pytest
 from dataclasses_json import DataClassJsonMixin
 
 from aiodistbus import DEntryPoint, DEventBus
+from aiodistbus.utils import reconstruct_event_data
 
 logger = logging.getLogger("aiodistbus")
 
@@ -108,8 +109,10 @@ async def test_dbus_emit_stress(dbus, dentrypoints):
     # Assert
     fails: List = []
     for event in events:
-        if StressTestEvent.from_json(event.data.decode()).extra_id not in container:
-            fails.append(event.data.extra_id)
+        # Data was encoded with the negotiated serializer
+        data = reconstruct_event_data(event, StressTestEvent, e2._serializer.id).data
+        if data.extra_id not in container:
+            fails.append(data.extra_id)
 
     logger.debug(f"fails: {len(fails)/M}")
     assert len(fails) == 0
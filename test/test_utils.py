@@ -0,0 +1,422 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+from dataclasses_json import DataClassJsonMixin
+
+import aiodistbus.cfg as cfg
+from aiodistbus import EntryPoint, Event, EventBus, global_config
+from aiodistbus.protocols import Capabilities, LazyEvent
+from aiodistbus.utils import (
+    HEADER_STRUCT_V1,
+    LEGACY_CAPABILITIES,
+    TOPIC_TERMINATOR,
+    WIRE_VERSION,
+    bus_verified,
+    checksum_flags,
+    compress,
+    compression_threshold,
+    decode_header,
+    encode,
+    encode_frames,
+    negotiate,
+    reconstruct,
+    subscription_prefix,
+    verify_checksum,
+    wildcard_search,
+)
+
+from .conftest import ExampleEvent
+
+
+def test_encode_frames_layout():
+    data = b"\x00\x01" * 1024
+    event = Event("test", encode(data), dtype="builtins.bytes")
+    [topic, header, payload, checksum] = encode_frames(event)
+
+    # Payload is transmitted as-is, no JSON escaping
+    assert topic == b"test" + TOPIC_TERMINATOR
+    assert payload == data
+    assert header[0] == WIRE_VERSION
+    assert verify_checksum([header, payload], checksum)
+
+    h = decode_header(header)
+    assert h.id == event.id
+    assert h.dtype == "builtins.bytes"
+    assert h.timestamp == event.timestamp
+
+
+def test_decode_header_version_mismatch():
+    [_, header, _, _] = encode_frames(Event("test"))
+    with pytest.raises(ValueError):
+        decode_header(bytes([WIRE_VERSION + 1]) + header[1:])
+
+
+@pytest.mark.parametrize(
+    "data, dtype",
+    [
+        (ExampleEvent("Hello"), ExampleEvent),
+        ("Hello", str),
+        (b"Hello", bytes),
+        ({"hello": "world"}, dict),
+    ],
+)
+@pytest.mark.parametrize("serializer", ["json", "msgpack"])
+async def test_reconstruct_frames(data, dtype, serializer):
+    if serializer not in global_config.serializers:
+        pytest.skip(f"{serializer} not installed")
+    backend = global_config.get_serializer(serializer)
+
+    dtype_str = f"{type(data).__module__}.{type(data).__name__}"
+    event = Event("test", encode(data, serializer), dtype=dtype_str)
+    [topic, header, *payload, _] = encode_frames(event, backend.id)
+
+    # With and without a known dtype
+    assert (await reconstruct(topic, header, payload, dtype)).data == data
+    assert (await reconstruct(topic, header, payload)).data == data
+
+
+def test_encode_frames_legacy_topic():
+    [topic, header, _, _] = encode_frames(Event("test"), version=2)
+    assert topic == b"test"
+    assert header[0] == 2
+
+
+@pytest.mark.parametrize(
+    "event_type, topic",
+    [
+        ("test", "test"),
+        ("test", "test.a"),
+        ("test", "tests"),
+        ("sensor.*", "sensor.imu"),
+        ("sensor.*", "sensor.imu.data"),
+        ("sensor.*", "sensor"),
+        ("sensor.*", "sensors_raw.big"),
+        ("sensor.*.data", "sensor.imu.data"),
+        ("*", "test"),
+    ],
+)
+def test_subscription_prefix(event_type, topic):
+    # Precise subscriptions match exactly what the handlers would
+    frame = encode_frames(Event(topic))[0]
+    if "*" in event_type:
+        expected = bool(wildcard_search(topic, [event_type]))
+    else:
+        expected = topic == event_type
+    assert frame.startswith(subscription_prefix(event_type)) == expected
+
+    # Exact subscriptions can over-match unterminated frames
+    frame = encode_frames(Event(topic), version=2)[0]
+    matched = frame.startswith(subscription_prefix(event_type, precise=False))
+    assert matched == expected or (matched and topic.startswith(event_type))
+
+
+def test_decode_header_v1():
+    header = HEADER_STRUCT_V1.pack(1, 0, 2, 12) + b"idbuiltins.str" + b"now"
+    h = decode_header(header)
+    assert (h.id, h.dtype, h.timestamp, h.serializer) == (
+        "id",
+        "builtins.str",
+        "now",
+        0,
+    )
+
+
+@pytest.mark.parametrize(
+    "clients, serializer, expected",
+    [
+        ([], None, ("msgpack", 2)),
+        ([Capabilities(2, ["msgpack", "json"])], None, ("msgpack", 2)),
+        ([Capabilities(2, ["msgpack", "json"])], "json", ("json", 2)),
+        ([Capabilities(2, ["json"])], None, ("json", 2)),
+        (
+            [Capabilities(2, ["msgpack", "json"]), LEGACY_CAPABILITIES],
+            None,
+            ("json", 1),
+        ),
+    ],
+)
+def test_negotiate(clients, serializer, expected):
+    server = Capabilities(2, ["msgpack", "json"])
+    agreement = negotiate(server, clients, serializer)
+    assert (agreement.serializer, agreement.version) == expected
+    assert agreement.compression == "none"
+    assert agreement.checksum == "crc32"
+
+
+@pytest.mark.parametrize("order", ["C", "F", "sliced"])
+async def test_reconstruct_ndarray(order):
+    np = pytest.importorskip("numpy")
+    data = np.arange(24, dtype=np.float32).reshape(4, 6)
+    if order == "F":
+        data = np.asfortranarray(data)
+    elif order == "sliced":
+        data = data[::2, 1::2]
+
+    event = Event("test", encode(data), dtype="numpy.ndarray")
+    [topic, header, meta, buffer, checksum] = encode_frames(event)
+    assert verify_checksum([header, meta, buffer], checksum)
+    assert len(buffer) == data.nbytes
+
+    # Rebuilt as a view of the received buffer
+    event = await reconstruct(topic, header, [meta, buffer])
+    assert isinstance(event.data, np.ndarray)
+    assert not event.data.flags.owndata
+    assert event.data.dtype == data.dtype
+    assert np.array_equal(event.data, data)
+
+
+def test_locate_dtype_cached(monkeypatch):
+    calls = []
+
+    def locate(path):
+        calls.append(path)
+        return None
+
+    monkeypatch.setattr(cfg, "locate", locate)
+
+    # Builtins and registered types never need locating
+    assert global_config.locate_dtype("builtins.str") is str
+    assert global_config.locate_dtype("builtins.dict") is dict
+    assert not calls
+
+    # Typing aliases (without a name before Python 3.10) are skipped
+    global_config.register_dtype(List)
+    assert global_config.locate_dtype("builtins.list") is list
+
+    # Unknown dtypes are located only once
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            global_config.locate_dtype("nonexistent.Type")
+    assert calls == ["nonexistent.Type"]
+
+
+def test_is_builtin_decoding(monkeypatch):
+    json_id = global_config.get_serializer("json").id
+    zlib_id = global_config.get_compressor("zlib").id
+    assert global_config.is_builtin_decoding(ExampleEvent, json_id, zlib_id)
+    assert global_config.is_builtin_decoding(dict, json_id)
+    assert global_config.is_builtin_decoding(bytes, json_id)
+
+    # Unknown or replaced codecs are only in this process
+    assert not global_config.is_builtin_decoding(complex, json_id)
+    monkeypatch.setitem(global_config.decoders, bytes, lambda x: bytes(x))
+    assert not global_config.is_builtin_decoding(bytes, json_id)
+
+
+async def test_locate_dtype_registered():
+    @dataclass
+    class LocalEvent(DataClassJsonMixin):
+        msg: str
+
+    # Not importable, until a handler registers it
+    dtype_str = f"{LocalEvent.__module__}.{LocalEvent.__name__}"
+    with pytest.raises(ValueError):
+        global_config.locate_dtype(dtype_str)
+
+    bus = EventBus()
+    e = EntryPoint()
+    await e.connect(bus)
+    await e.on("test", lambda x: None, LocalEvent)
+    assert global_config.locate_dtype(dtype_str) == LocalEvent
+
+    event = Event("test", encode(LocalEvent("hello")), dtype=dtype_str)
+    [topic, header, *payload, _] = encode_frames(event)
+    assert (await reconstruct(topic, header, payload)).data == LocalEvent("hello")
+    await bus.close()
+
+
+@dataclass
+class Inner:
+    value: float
+
+
+@dataclass
+class Nested(DataClassJsonMixin):
+    name: str
+    inner: Inner
+    items: List[Inner] = field(default_factory=list)
+    lookup: Dict[str, Inner] = field(default_factory=dict)
+    maybe: Optional[Inner] = None
+    extra: Any = None
+    child: Optional["Nested"] = None
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        ExampleEvent("hello"),
+        Nested("a", Inner(1.0)),
+        Nested(
+            "b",
+            Inner(1.5),
+            [Inner(2.0), Inner(3.0)],
+            {"x": Inner(4.0)},
+            Inner(5.0),
+            {"list": [1, 2]},
+            Nested("c", Inner(6.0)),
+        ),
+    ],
+)
+def test_dataclass_codec(data):
+    codec = global_config.get_dataclass_codec(type(data))
+    assert codec.compiled
+    assert global_config.get_dataclass_codec(type(data)) is codec
+
+    # Same JSON-like data as dataclasses_json
+    assert codec.encode(data) == data.to_dict(encode_json=True)
+    assert codec.decode(data.to_dict(encode_json=True)) == data
+
+
+@dataclass
+class Unsupported(DataClassJsonMixin):
+    pair: Tuple[int, int]
+
+
+async def test_dataclass_codec_fallback():
+    codec = global_config.get_dataclass_codec(Unsupported)
+    assert not codec.compiled
+
+    # Still handled by dataclasses_json
+    event = Event("test", encode(Unsupported((1, 2))), dtype="builtins.bytes")
+    [topic, header, *payload, _] = encode_frames(event)
+    assert (await reconstruct(topic, header, payload, Unsupported)).data == (
+        Unsupported((1, 2))
+    )
+
+
+@pytest.mark.parametrize(
+    "clients, expected",
+    [
+        ([Capabilities(2, ["json"], ["zlib", "none"])], "zlib"),
+        ([Capabilities(2, ["json"], ["zlib", "none"]), LEGACY_CAPABILITIES], "none"),
+    ],
+)
+def test_negotiate_compression(clients, expected):
+    server = Capabilities(2, ["json"], ["zlib", "lzma", "none"])
+    assert negotiate(server, clients).compression == "none"
+    assert negotiate(server, clients, compression="zlib").compression == expected
+
+
+@pytest.mark.parametrize("compressor", ["zlib", "lzma"])
+async def test_compress_frames(monkeypatch, compressor):
+    if compressor not in global_config.compressors:
+        pytest.skip(f"{compressor} not available")
+    backend = global_config.compressors[compressor]
+    monkeypatch.setattr(global_config, "compression_thresholds", {})
+
+    # Below the threshold, or disabled for the topic
+    data = {"values": [0.0] * 1024}
+    assert compress("test", encode({"small": 1}), backend)[1] == 0
+    global_config.compression_thresholds["test.*"] = None
+    assert compress("test.a", encode(data), backend)[1] == 0
+
+    # Compressed frames are flagged in the header and decompressed on reconstruct
+    compressed = backend.stats.compressed
+    payload, flags = compress("test", encode(data), backend)
+    assert flags == backend.id
+    assert len(payload) < len(encode(data))
+    assert backend.stats.compressed == compressed + 1
+
+    event = Event("test", payload, dtype="builtins.dict")
+    [topic, header, *payload, checksum] = encode_frames(event, flags=flags)
+    assert verify_checksum([header, *payload], checksum)
+    assert (await reconstruct(topic, header, payload)).data == data
+
+
+def test_compression_threshold_cached(monkeypatch):
+    monkeypatch.setattr(global_config, "compression_thresholds", {"a.*": 10})
+    thresholds = global_config.compression_thresholds
+
+    # The most specific pattern is matched once per topic
+    assert compression_threshold("a.b.c") == 10
+    assert compression_threshold("b") == global_config.compression_threshold
+    assert thresholds.matches == {"a.b.c": "a.*", "b": None}
+
+    # Changing the thresholds invalidates the matches
+    thresholds["a.b.*"] = 20
+    assert not thresholds.matches
+    assert thresholds.patterns == ["a.b.*", "a.*"]
+    assert compression_threshold("a.b.c") == 20
+    thresholds.pop("a.b.*")
+    assert compression_threshold("a.b.c") == 10
+    thresholds.update({"a.b.c": None})
+    assert compression_threshold("a.b.c") is None
+
+
+def test_compress_incompressible():
+    backend = global_config.compressors["zlib"]
+    data = os.urandom(2048)
+    skipped = backend.stats.skipped
+    assert compress("test", data, backend) == (data, 0)
+    assert backend.stats.skipped == skipped + 1
+
+
+@pytest.mark.parametrize("integrity", ["crc32", "adler32", "sender", "none"])
+def test_checksum_modes(integrity):
+    event = Event("test", encode({"hello": "world"}), dtype="builtins.dict")
+    [_, header, payload, checksum] = encode_frames(
+        event, flags=checksum_flags(integrity)
+    )
+    assert verify_checksum([header, payload], checksum)
+    assert decode_header(header).flags == checksum_flags(integrity)
+    assert bus_verified(header) == (integrity == "sender")
+
+    # Corruption is only detected with a checksum
+    corrupted = verify_checksum([header, payload + b" "], checksum)
+    assert corrupted == (integrity == "none")
+    assert (checksum == b"") == (integrity == "none")
+
+
+@pytest.mark.parametrize(
+    "clients, expected",
+    [
+        ([Capabilities(2, ["json"], checksum=["crc32", "none"])], "none"),
+        (
+            [
+                Capabilities(2, ["json"], checksum=["crc32", "none"]),
+                LEGACY_CAPABILITIES,
+            ],
+            "crc32",
+        ),
+    ],
+)
+def test_negotiate_integrity(clients, expected):
+    server = Capabilities(2, ["json"], checksum=["crc32", "adler32", "sender", "none"])
+    assert negotiate(server, clients).checksum == "crc32"
+    assert negotiate(server, clients, integrity="none").checksum == expected
+
+
+@pytest.mark.parametrize(
+    "clients, expected",
+    [
+        ([], True),
+        ([Capabilities(3, shards=True)], True),
+        ([Capabilities(3, shards=True), LEGACY_CAPABILITIES], False),
+    ],
+)
+def test_negotiate_shards(clients, expected):
+    server = Capabilities(3, shards=True)
+    assert negotiate(server, clients).shards == expected
+
+
+async def test_reconstruct_lazy():
+    event = Event("test", encode(ExampleEvent("Hello")), dtype="conftest.ExampleEvent")
+    [topic, header, *payload, _] = encode_frames(event)
+
+    # Metadata is available without decoding the data
+    lazy = await reconstruct(topic, header, payload, ExampleEvent, lazy=True)
+    assert isinstance(lazy, LazyEvent)
+    assert (lazy.type, lazy.id, lazy.timestamp) == ("test", event.id, event.timestamp)
+    assert not lazy.loaded
+
+    # Decoded once, on first access
+    assert lazy.data == ExampleEvent("Hello")
+    assert lazy.loaded
+    assert lazy.data is lazy.data
+
+    # Errors are raised on access
+    lazy = await reconstruct(topic, header, [b"invalid"], ExampleEvent, lazy=True)
+    with pytest.raises(ValueError):
+        assert lazy.data